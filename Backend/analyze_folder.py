@@ -0,0 +1,238 @@
+"""Tag every audio file under a folder with its mood, offline.
+
+Results are appended to a JSONL file as each file finishes, so the output
+doubles as the checkpoint: running the same command again skips files that
+are already recorded and unchanged. ``--format parquet`` additionally writes
+a Parquet copy once the run completes (requires pyarrow), and
+``--feature-store`` appends every analyzed file's feature vector to a
+memory-mapped FeatureStore keyed by its relative path.
+
+    python analyze_folder.py ~/Music moods.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from utils.audio_processor import AudioProcessor
+from utils.feature_store import FeatureStore
+from models.mood_classifier import MoodClassifier
+
+PROGRESS_EVERY = 50
+
+
+def find_audio_files(root, extensions):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if '.' in name and name.rsplit('.', 1)[1].lower() in extensions:
+                yield os.path.join(dirpath, name)
+
+
+def file_key(path, root):
+    """Relative path plus size and mtime, so edited files are re-analyzed"""
+    stat = os.stat(path)
+    return os.path.relpath(path, root), stat.st_size, int(stat.st_mtime)
+
+
+def read_records(output_path):
+    """Every complete record in the JSONL output, oldest first"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A run killed mid-write can leave a partial last line
+                continue
+
+
+def load_checkpoint(output_path, include_failed=True):
+    """Keys of the files already recorded in the JSONL output"""
+    return {
+        (record['path'], record['size'], record['mtime'])
+        for record in read_records(output_path)
+        if include_failed or 'error' not in record
+    }
+
+
+def analyze_file(path, key, mode):
+    """Worker: extract features and classify one file"""
+    record = {'path': key[0], 'size': key[1], 'mtime': key[2]}
+    features = AudioProcessor.extract_features(path, mode)
+    if features is None:
+        record['error'] = 'Failed to extract audio features'
+        return record
+
+    valence, energy = AudioProcessor.estimate_valence_energy(features)
+    mood, confidence = MoodClassifier().classify_mood_simple(valence, energy, features['tempo'])
+    record.update({
+        'mood': mood,
+        'confidence': confidence,
+        'valence': valence,
+        'energy': energy,
+        'features': features
+    })
+    return record
+
+
+def table_rows(records):
+    """The latest record per file, each with every key any record has.
+
+    ``pyarrow.Table.from_pylist`` takes its columns from the first row, so
+    without this an error record first would drop the feature columns, and
+    a success first would drop ``error``.
+    """
+    latest = {record['path']: record for record in records}
+    columns = list(dict.fromkeys(key for record in latest.values() for key in record))
+    return [{key: record.get(key) for key in columns} for record in latest.values()]
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """Parquet copy of the JSONL results, keeping the latest record per file"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        print("pyarrow is not installed; skipping Parquet output", file=sys.stderr)
+        return False
+    rows = table_rows(read_records(jsonl_path))
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), parquet_path)
+    return True
+
+
+def run(root, output_path, workers=None, mode='window', retry_failed=False, feature_store=None):
+    workers = workers or os.cpu_count() or 1
+    done = load_checkpoint(output_path, include_failed=not retry_failed)
+
+    files = []
+    for path in find_audio_files(root, Config.ALLOWED_EXTENSIONS):
+        key = file_key(path, root)
+        if key not in done:
+            files.append((path, key))
+
+    print(f"{len(done)} files already analyzed, {len(files)} to go with {workers} workers")
+    if not files:
+        return 0
+
+    start = time.perf_counter()
+    finished = failed = 0
+    todo = iter(files)
+    # Files that were in flight when a worker died; rerun one at a time so
+    # only the one that kills its worker is counted as failed
+    suspects = []
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with open(output_path, 'a') as out:
+            if out.tell() and not _ends_with_newline(output_path):
+                # Start fresh after a partial line left by an interrupted run
+                out.write('\n')
+
+            # Keep a few jobs per worker in flight instead of queueing every file
+            pending = {}
+            while True:
+                if suspects:
+                    if not pending:
+                        item = suspects.pop(0)
+                        pending[pool.submit(analyze_file, item[0], item[1], mode)] = (item, True)
+                else:
+                    while len(pending) < workers * 4:
+                        item = next(todo, None)
+                        if item is None:
+                            break
+                        pending[pool.submit(analyze_file, item[0], item[1], mode)] = (item, False)
+                if not pending:
+                    break
+
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in completed:
+                    item, alone = pending.pop(future)
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if alone:
+                            # The worker died on this file; leave it for the next run
+                            print(f"Worker died analyzing {item[1][0]}", file=sys.stderr)
+                            failed += 1
+                        else:
+                            suspects.append(item)
+                        continue
+                    except Exception as e:
+                        print(f"Worker failed: {e}", file=sys.stderr)
+                        failed += 1
+                        continue
+                    out.write(json.dumps(record) + '\n')
+                    out.flush()
+                    if feature_store is not None and 'error' not in record:
+                        feature_store.append(record['path'], record['features'], record['valence'],
+                                             record['energy'], record['mood'])
+                    finished += 1
+                    failed += 'error' in record
+
+                    if finished % PROGRESS_EVERY == 0:
+                        _report(finished, len(files), failed, start)
+
+                if broken:
+                    # The rest of the pool's jobs went down with it
+                    suspects.extend(item for item, _ in pending.values())
+                    pending.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown()
+
+    _report(finished, len(files), failed, start)
+    return failed
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def _report(finished, total, failed, start):
+    elapsed = time.perf_counter() - start
+    rate = finished / elapsed if elapsed else 0.0
+    print(f"{finished}/{total} files, {failed} failed, {rate:.2f} files/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze the mood of every audio file in a folder')
+    parser.add_argument('folder', help='directory to scan recursively')
+    parser.add_argument('output', help='JSONL output file; also the resume checkpoint')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--mode', choices=['window', 'stream', 'segments'],
+                        default=getattr(Config, 'ANALYSIS_MODE', 'window'),
+                        help='how much of each track to analyze')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl',
+                        help='also write a Parquet copy of the results when done')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='re-analyze files whose earlier attempt failed')
+    parser.add_argument('--feature-store', metavar='DIR',
+                        help='also append feature vectors to the FeatureStore in DIR')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        parser.error(f"{args.folder} is not a directory")
+
+    feature_store = FeatureStore(args.feature_store, n_mfcc=Config.N_MFCC) if args.feature_store else None
+    failed = run(args.folder, args.output, args.workers, args.mode, args.retry_failed, feature_store)
+
+    if args.format == 'parquet':
+        parquet_path = os.path.splitext(args.output)[0] + '.parquet'
+        if write_parquet(args.output, parquet_path):
+            print(f"Wrote {parquet_path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,33 +1,360 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from flask_cors import CORS
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import json
+import logging
+import math
+import multiprocessing
 import os
+import time
+from tempfile import SpooledTemporaryFile
+import numpy as np
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from werkzeug.utils import secure_filename
 from config import Config
-from utils.spotify_client import SpotifyClient
-from utils.audio_processor import AudioProcessor
+from utils.spotify_client import SpotifyClient, FeatureCache
+from utils.audio_processor import AudioProcessor, REMIX_PRESETS
+from utils.analysis_cache import AnalysisCache, UploadBuffer, read_and_hash, UPLOAD_MEMORY_LIMIT
+from utils.file_store import FileStore, upload_id, remix_id
+from utils.feature_store import FeatureStore
+from utils.job_runner import JobRunner, JobRegistry, QueueFullError, JobTimeoutError
+from utils.shared_cache import SharedCache
+from utils.recommender import (
+    RecommendationPool, build_recommendations, recommend_from_index, format_track
+)
+from utils.track_index import TrackIndex
 from models.mood_classifier import MoodClassifier
+from utils import metrics
+from utils.log_format import FORMATTERS
+
+# LOG_LEVEL = 'WARNING' keeps only problems in production logs; records are
+# key=value lines, or JSON objects with LOG_FORMAT = 'json'
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(FORMATTERS[getattr(Config, 'LOG_FORMAT', 'logfmt')]())
+logging.basicConfig(level=getattr(Config, 'LOG_LEVEL', 'INFO'), handlers=[log_handler])
+logger = logging.getLogger('moodtune')
+
+upload_memory_limit = getattr(Config, 'UPLOAD_MEMORY_LIMIT', UPLOAD_MEMORY_LIMIT)
+
+# Default cache files live next to this module, whatever the working directory
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# Set by serve.py in each preforked worker: how many web workers share this
+# machine, this one's index, and its share of the audio processes
+serving_workers = int(os.environ.get('MOODTUNE_WORKERS', 1))
+worker_id = int(os.environ.get('MOODTUNE_WORKER_ID', 0))
+audio_workers = int(os.environ.get('MOODTUNE_AUDIO_WORKERS', 0)) or getattr(Config, 'AUDIO_WORKERS', None)
+
+
+class UploadRequest(Request):
+    """Keeps uploads up to ``upload_memory_limit`` in memory.
+
+    Werkzeug's default spools anything over 500 KB to a temporary file,
+    which the analysis path would then read straight back.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return SpooledTemporaryFile(max_size=upload_memory_limit, mode='rb+')
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config.from_object(Config)
 CORS(app)
 
-spotify_client = SpotifyClient(use_oauth=False)
+# Tiers shared by every worker process under serve.py; disabled otherwise
+shared_caches = {
+    name: SharedCache(name)
+    for name in ('spotify_token', 'track_features', 'analysis', 'recommendation_pool', 'jobs')
+}
+
+feature_cache = FeatureCache(
+    max_entries=getattr(Config, 'FEATURE_CACHE_SIZE', 10000),
+    ttl=getattr(Config, 'FEATURE_CACHE_TTL', 30 * 24 * 3600),
+    db_path=getattr(Config, 'FEATURE_CACHE_DB', os.path.join(cache_dir, 'track_features.db')),
+    shared=shared_caches['track_features']
+)
+spotify_client = SpotifyClient(
+    use_oauth=False, feature_cache=feature_cache,
+    rate_limit=getattr(Config, 'SPOTIFY_RATE_LIMIT', 10.0) / serving_workers,
+    rate_burst=max(1, getattr(Config, 'SPOTIFY_RATE_BURST', 20) // serving_workers),
+    token_cache=shared_caches['spotify_token']
+)
 audio_processor = AudioProcessor()
 mood_classifier = MoodClassifier()
+audio_warmup = getattr(Config, 'AUDIO_WARMUP', True)
+job_runner = JobRunner(
+    max_workers=audio_workers,
+    max_pending=getattr(Config, 'AUDIO_MAX_PENDING', None),
+    timeout=getattr(Config, 'AUDIO_JOB_TIMEOUT', 120),
+    warmup=AudioProcessor.warm_up if audio_warmup else None
+)
+remix_jobs = JobRegistry(job_runner, shared=shared_caches['jobs'])
+analysis_mode = getattr(Config, 'ANALYSIS_MODE', 'window')
+analysis_cache = AnalysisCache(
+    max_entries=getattr(Config, 'ANALYSIS_CACHE_SIZE', 512),
+    shared=shared_caches['analysis']
+)
+feature_store = FeatureStore(
+    getattr(Config, 'FEATURE_STORE_PATH', os.path.join(cache_dir, 'features')),
+    n_mfcc=Config.N_MFCC
+)
+# Another worker may serve the remix, so with several workers every upload
+# goes straight to the shared folder instead of this process's memory
+persist_uploads = serving_workers > 1
+# With several workers the first one alone evicts, honouring the others'
+# references through marker files in the folder
+file_store = FileStore(
+    Config.UPLOAD_FOLDER,
+    max_bytes=getattr(Config, 'UPLOAD_STORE_BYTES', 2 * 1024 ** 3),
+    max_age=getattr(Config, 'UPLOAD_STORE_MAX_AGE', 7 * 24 * 3600),
+    shared=serving_workers > 1,
+    owner=worker_id == 0
+)
+# Uploads pushed out of memory are written to the store, so a later
+# remix of them still finds its input
+upload_buffer = UploadBuffer(
+    max_bytes=getattr(Config, 'UPLOAD_BUFFER_BYTES', 256 * 1024 * 1024),
+    on_evict=lambda name, data: spill_upload(name, data)
+)
+download_max_age = getattr(Config, 'DOWNLOAD_MAX_AGE', 24 * 3600)
+# Render every mood preset from one decode on the first remix of an upload;
+# later moods are then served from the store instead of decoding again on
+# whichever pool worker picks them up
+remix_all_moods = getattr(Config, 'REMIX_ALL_MOODS', True)
+
+track_index = TrackIndex(
+    path=getattr(Config, 'TRACK_INDEX_PATH', os.path.join(cache_dir, 'track_index.npz'))
+)
+recommendation_pool = RecommendationPool(
+    spotify_client, mood_classifier,
+    pool_size=getattr(Config, 'RECOMMENDATION_POOL_SIZE', 60),
+    refresh_interval=getattr(Config, 'RECOMMENDATION_POOL_REFRESH', 30 * 60),
+    track_index=track_index,
+    shared=shared_caches['recommendation_pool']
+)
+
+def cache_metrics():
+    """Hit/miss counters the caches already keep, for /api/metrics"""
+    for name, stats in (('feature', feature_cache.stats()), ('analysis', analysis_cache.stats())):
+        yield 'moodtune_cache_hits_total', 'counter', {'cache': name}, stats['hits']
+        yield 'moodtune_cache_misses_total', 'counter', {'cache': name}, stats['misses']
+    spotify = spotify_client.stats()
+    yield 'moodtune_spotify_coalesced_total', 'counter', {}, spotify['coalesced']
+    yield 'moodtune_spotify_rate_limited_total', 'counter', {}, spotify['rate_limited']
+    yield 'moodtune_audio_jobs_pending', 'gauge', {}, job_runner.stats()['pending']
+    yield 'moodtune_track_index_tracks', 'gauge', {}, len(track_index)
+
+
+metrics.REGISTRY.register_collector(cache_metrics)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('moodtune_request_seconds', elapsed,
+                        endpoint=endpoint, status=response.status_code)
+        logger.info("request", extra={
+            'method': request.method, 'endpoint': endpoint,
+            'status': response.status_code, 'duration_ms': round(elapsed * 1000, 1)
+        })
+    return response
 
-os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def busy_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 429
+
+def warm_status():
+    """Which lazily loaded subsystems are ready to serve without a cold start"""
+    return {
+        'audio_workers': job_runner.warm_workers,
+        'spotify': spotify_client.ready,
+        'recommendation_pool': any(mood['size'] for mood in recommendation_pool.stats().values())
+    }
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'API is running'})
+    return jsonify({
+        'status': 'healthy',
+        'message': 'API is running',
+        'warm': warm_status(),
+        'feature_cache': feature_cache.stats(),
+        'spotify': spotify_client.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'upload_buffer': upload_buffer.stats(),
+        'file_store': file_store.stats(),
+        'feature_store': feature_store.stats(),
+        'audio_jobs': job_runner.stats(),
+        'recommendation_pool': recommendation_pool.stats(),
+        'track_index': track_index.stats(),
+        'worker': {'id': worker_id, 'pid': os.getpid(), 'workers': serving_workers},
+        'shared_cache': {name: cache.stats() for name, cache in shared_caches.items()}
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """200 once at least one audio worker is warm, 503 until then"""
+    warm = warm_status()
+    ready = warm['audio_workers'] > 0 or not audio_warmup
+    return jsonify({'ready': ready, 'warm': warm}), 200 if ready else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def classify_timeline(timeline):
+    """Mood of every window of a timeline analysis, in one batch call"""
+    valence, energy = AudioProcessor.estimate_valence_energy_batch(
+        timeline['spectral_centroid'], timeline['chroma_mean'],
+        timeline['energy'], timeline['tempo']
+    )
+    moods, confidences, _ = mood_classifier.classify_mood_batch(valence, energy, timeline['tempo'])
+    return [
+        {'start': start, 'end': end, 'mood': mood, 'confidence': confidence,
+         'valence': v, 'energy': e}
+        for start, end, mood, confidence, v, e in zip(
+            timeline['start'], timeline['end'], moods.tolist(), confidences.tolist(),
+            valence.tolist(), energy.tolist()
+        )
+    ]
+
+def spill_upload(filename, data):
+    """Write an upload leaving the memory buffer to the store"""
+    try:
+        file_store.write(filename, data)
+    except OSError as e:
+        logger.warning("Could not keep upload %s: %s", filename, e)
+        metrics.error('upload_spill')
+
+def record_analysis(digest, filename, features):
+    """Classify freshly extracted features and remember the result"""
+    valence, energy = audio_processor.estimate_valence_energy(features)
+    mood, confidence = mood_classifier.classify_mood_simple(valence, energy, features['tempo'])
+    result = {
+        'features': features,
+        'valence': valence,
+        'energy': energy,
+        'mood': mood,
+        'confidence': confidence
+    }
+    analysis_cache.set(digest, result)
+    
+    # Kept for re-classification and similarity scans without reanalysis
+    if digest not in feature_store:
+        try:
+            feature_store.append(digest, features, valence, energy, mood)
+        except OSError as e:
+            logger.warning("Could not store features for %s: %s", filename, e)
+            metrics.error('feature_store')
+    return result
+
+def attach_timeline(digest, result, timeline):
+    """Add a classified timeline to an analysis result and re-cache it.
+    A track the timeline pass can't decode gets ``timeline_error`` instead,
+    cached too, so the failing pass isn't repeated on every request."""
+    if timeline is None:
+        result = dict(result, timeline_error='Failed to extract the mood timeline')
+    else:
+        result = dict(result, timeline=classify_timeline(timeline))
+    analysis_cache.set(digest, result)
+    return result
+
+def analysis_response(result, filename, original_filename, timeline=False):
+    features = result['features']
+    response = {
+        'mood': result['mood'],
+        'confidence': result['confidence'],
+        'audio_features': {
+            'valence': result['valence'],
+            'energy': result['energy'],
+            'tempo': features['tempo'],
+            'spectral_centroid': features['spectral_centroid']
+        },
+        'filename': filename,
+        'original_filename': original_filename
+    }
+    if timeline:
+        for key in ('timeline', 'timeline_error'):
+            if key in result:
+                response[key] = result[key]
+    return response
+
+def cancel_jobs(*jobs):
+    """Withdraw jobs no one will wait for; queued ones never start, running
+    ones finish in the pool and then free their slot"""
+    for job in jobs:
+        if job is not None:
+            job.cancel()
+
+def sse_event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_analysis(digest, filename, original_filename, cached, preview_job, full_job,
+                    timeline_job=None, timeline=False):
+    """Server-sent events: a ``preliminary`` mood from the preview pass as
+    soon as it is ready, then the ``result`` of the full pass (or ``error``)"""
+    try:
+        if cached is None:
+            preview = preview_job.result(timeout=job_runner.timeout)
+            if preview is not None:
+                valence, energy = audio_processor.estimate_valence_energy(preview)
+                mood, confidence = mood_classifier.classify_mood_simple(valence, energy, preview['tempo'])
+                logger.info("Preliminary mood: %s", mood)
+                response = analysis_response({
+                    'features': preview,
+                    'valence': valence,
+                    'energy': energy,
+                    'mood': mood,
+                    'confidence': confidence
+                }, filename, original_filename)
+                response['preliminary'] = True
+                yield sse_event('preliminary', response)
+            
+            features = full_job.result(timeout=job_runner.timeout)
+            if features is None:
+                yield sse_event('error', {'error': 'Failed to extract audio features'})
+                return
+            cached = record_analysis(digest, filename, features)
+        if timeline_job is not None:
+            cached = attach_timeline(digest, cached, timeline_job.result(timeout=job_runner.timeout))
+        
+        logger.info("Detected mood: %s (confidence: %s)", cached['mood'], cached['confidence'])
+        yield sse_event('result', analysis_response(cached, filename, original_filename, timeline))
+    except FutureTimeoutError:
+        yield sse_event('error', {'error': f'Job timed out after {job_runner.timeout}s'})
+    except Exception as e:
+        logger.exception("Error in progressive analysis: %s", e)
+        metrics.error('analyze')
+        yield sse_event('error', {'error': str(e)})
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_audio():
-    """Analyze uploaded audio file for mood detection"""
+    """Analyze uploaded audio file for mood detection.
+    
+    With ``progressive=1`` (query string or form field) the answer is an
+    event stream: a preliminary mood from a cheap preview pass within a few
+    hundred milliseconds, then the full result. With ``timeline=1`` the
+    result adds ``timeline``, the mood of every consecutive window of the
+    whole track. It comes from an extra pass that runs alongside the usual
+    one and is cached with the result; the track-level mood and features
+    are the same either way.
+    """
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -40,246 +367,219 @@ def analyze_audio():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
         
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        print(f"Analyzing file: {filename}")
-        
-        features = audio_processor.extract_features(filepath)
+        progressive = (request.args.get('progressive') or request.form.get('progressive')) in ('1', 'true')
+        timeline = (request.args.get('timeline') or request.form.get('timeline')) in ('1', 'true')
+        
+        original_filename = secure_filename(file.filename)
+        # Small uploads stay in memory and only reach disk if remixed
+        spill_path = file_store.temp_path()
+        data, digest = read_and_hash(file.stream, spill_path, upload_memory_limit)
+        # Stored under its content digest, so identical uploads share a file
+        filename = upload_id(digest, original_filename)
+        filepath = file_store.path(filename)
+        if data is None:
+            file_store.commit(spill_path, filename)
+        elif not file_store.exists(filename):
+            if persist_uploads:
+                file_store.write(filename, data)
+            else:
+                upload_buffer.put(filename, data)
+        
+        source = data if data is not None else filepath
+        cached = analysis_cache.get(digest)
+        if cached is not None:
+            logger.info("Cache hit for %s (%s)", filename, digest[:12])
+        else:
+            logger.info("Analyzing file: %s", filename)
+        
+        preview_job = full_job = timeline_job = None
+        try:
+            if cached is None:
+                if progressive:
+                    # Queued first so it isn't stuck behind the full pass
+                    preview_job = job_runner.submit(
+                        AudioProcessor.extract_preview_features, source,
+                        suffix=os.path.splitext(filename)[1]
+                    )
+                if data is not None:
+                    full_job = job_runner.submit(
+                        AudioProcessor.extract_features_from_buffer, data, analysis_mode,
+                        os.path.splitext(filename)[1]
+                    )
+                else:
+                    full_job = job_runner.submit(AudioProcessor.extract_features, filepath, analysis_mode)
+            if timeline and (cached is None or not cached.keys() & {'timeline', 'timeline_error'}):
+                timeline_job = job_runner.submit(
+                    AudioProcessor.extract_timeline, source, suffix=os.path.splitext(filename)[1]
+                )
+        except QueueFullError:
+            # Nobody will wait for the passes that did get a slot
+            cancel_jobs(preview_job, full_job)
+            raise
+        
+        if progressive:
+            response = Response(
+                stream_analysis(digest, filename, original_filename, cached,
+                                preview_job, full_job, timeline_job, timeline),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+            # Runs however the stream ends, including a client hanging up
+            response.call_on_close(lambda: cancel_jobs(preview_job, full_job, timeline_job))
+            return response
+        
+        try:
+            if full_job is not None:
+                features = full_job.result(timeout=job_runner.timeout)
+                if features is None:
+                    return jsonify({'error': 'Failed to extract audio features'}), 500
+                cached = record_analysis(digest, filename, features)
+            if timeline_job is not None:
+                cached = attach_timeline(digest, cached, timeline_job.result(timeout=job_runner.timeout))
+        except FutureTimeoutError:
+            raise JobTimeoutError(f'Job timed out after {job_runner.timeout}s')
+        finally:
+            cancel_jobs(full_job, timeline_job)
+        
+        logger.info("Detected mood: %s (confidence: %s)", cached['mood'], cached['confidence'])
+        
+        return jsonify(analysis_response(cached, filename, original_filename, timeline)), 200
+        
+    except QueueFullError as e:
+        return busy_response(e)
+    except JobTimeoutError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        logger.exception("Error in analyze_audio: %s", e)
+        metrics.error('analyze')
+        return jsonify({'error': str(e)}), 500
+
+def finite_float(value):
+    """``float(value)``, refusing NaN and infinity, which would make the
+    response invalid JSON"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'{value!r} is not a finite number')
+    return number
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Classify many tracks' moods in one vectorized pass.
+
+    ``tracks`` is a list of items carrying either ``valence`` and ``energy``
+    or raw extracted features (``spectral_centroid``, ``chroma_mean``,
+    ``energy`` as RMS and ``tempo``), each with an optional ``id``. Items
+    given as valence and energy may also carry a ``tempo``.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('tracks')
         
-        if features is None:
-            return jsonify({'error': 'Failed to extract audio features'}), 500
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'tracks must be a non-empty list'}), 400
         
-        valence, energy = audio_processor.estimate_valence_energy(features)
-        mood, confidence = mood_classifier.classify_mood_simple(valence, energy)
+        max_items = getattr(Config, 'BATCH_MAX_TRACKS', 10000)
+        if len(items) > max_items:
+            return jsonify({'error': f'At most {max_items} tracks per request'}), 413
         
-        print(f"Detected mood: {mood} (confidence: {confidence})")
+        try:
+            raw = [i for i, item in enumerate(items) if 'spectral_centroid' in item]
+            scored = [i for i, item in enumerate(items) if 'spectral_centroid' not in item]
+            valence = np.empty(len(items))
+            energy = np.empty(len(items))
+            
+            if raw:
+                column = lambda key: [finite_float(items[i][key]) for i in raw]
+                valence[raw], energy[raw] = AudioProcessor.estimate_valence_energy_batch(
+                    column('spectral_centroid'), column('chroma_mean'),
+                    column('energy'), column('tempo')
+                )
+            valence[scored] = [finite_float(items[i]['valence']) for i in scored]
+            energy[scored] = [finite_float(items[i]['energy']) for i in scored]
+            # Optional for valence/energy items
+            tempo = np.array([
+                finite_float(item['tempo']) if item.get('tempo') is not None else np.nan
+                for item in items
+            ])
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid track features: {e}'}), 400
+        
+        moods, confidences, matches = mood_classifier.classify_mood_batch(valence, energy, tempo)
+        
+        results = [
+            {
+                'id': item.get('id'),
+                'mood': mood,
+                'confidence': confidence,
+                'valence': v,
+                'energy': e,
+                'matches': {name: bool(mask[i]) for name, mask in matches.items()}
+            }
+            for i, (item, mood, confidence, v, e) in enumerate(zip(
+                items, moods.tolist(), confidences.tolist(), valence.tolist(), energy.tolist()
+            ))
+        ]
+        labels, counts = np.unique(moods, return_counts=True)
         
-        response = {
-            'mood': mood,
-            'confidence': confidence,
-            'audio_features': {
-                'valence': valence,
-                'energy': energy,
-                'tempo': features['tempo'],
-                'spectral_centroid': features['spectral_centroid']
-            },
-            'filename': filename
-        }
-        
-        return jsonify(response), 200
+        return jsonify({
+            'results': results,
+            'counts': dict(zip(labels.tolist(), counts.tolist()))
+        }), 200
         
     except Exception as e:
-        print(f"Error in analyze_audio: {e}")
+        logger.exception("Error in analyze_batch: %s", e)
+        metrics.error('analyze_batch')
         return jsonify({'error': str(e)}), 500
 
+def invalid_audio_features(features):
+    """Why request ``audio_features`` can't be used, or None if they can"""
+    if not isinstance(features, dict):
+        return 'audio_features must be an object'
+    for key, value in features.items():
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return f'audio_features.{key} must be a number'
+    return None
+
 @app.route('/api/recommend', methods=['POST'])
 def get_recommendations():
     """Get highly accurate mood-matched recommendations"""
     try:
         data = request.get_json()
         mood = data.get('mood', 'Calm')
-        
-        print(f"\n{'='*50}")
-        print(f"Getting STRICT {mood} recommendations")
-        print(f"{'='*50}")
-        
-        targets = mood_classifier.get_mood_recommendations(mood)
-        
-        # Stricter criteria - both conditions must match
-        mood_criteria = {
-            'Happy': {
-                'valence_min': 0.50,
-                'energy_min': 0.50,
-                'check': lambda v, e: v >= 0.50 and e >= 0.50
-            },
-            'Sad': {
-                'valence_max': 0.50,
-                'energy_max': 0.50,
-                'check': lambda v, e: v <= 0.50 and e <= 0.50
-            },
-            'Energetic': {
-                'energy_min': 0.65,
-                'check': lambda v, e: e >= 0.65
-            },
-            'Calm': {
-                'energy_max': 0.60,
-                'valence_min': 0.30,
-                'valence_max': 0.70,
-                'check': lambda v, e: e <= 0.60 and 0.30 <= v <= 0.70
-            }
-        }
-        
-        criteria = mood_criteria.get(mood)
-        
-        # Better search queries
-        search_queries = {
-            'Happy': [
-                'bollywood happy cheerful songs',
-                'upbeat hindi party music',
-                'feel good bollywood dance',
-                'positive energy hindi songs'
-            ],
-            'Sad': [
-                'sad bollywood heartbreak songs',
-                'emotional slow hindi songs',
-                'arijit singh sad songs',
-                'melancholic romantic hindi'
-            ],
-            'Energetic': [
-                'high energy bollywood dance',
-                'workout hindi gym songs',
-                'fast tempo party bollywood',
-                'energetic dance hindi music'
-            ],
-            'Calm': [
-                'peaceful bollywood romantic',
-                'soft acoustic hindi songs',
-                'soothing relaxing bollywood',
-                'calm unplugged hindi music'
-            ]
-        }
-        
-        queries = search_queries.get(mood, ['bollywood'])
-        
-        # Collect MANY candidates (we'll filter strictly)
-        all_candidates = []
-        
-        for query in queries:
-            try:
-                print(f"Searching: {query}")
-                result = spotify_client.sp.search(q=query, type='track', limit=20, market='IN')
-                all_candidates.extend(result['tracks']['items'])
-                print(f"  Found {len(result['tracks']['items'])} songs")
-            except Exception as e:
-                print(f"  Search error: {e}")
-                continue
-        
-        print(f"\nTotal candidates: {len(all_candidates)}")
-        
-        # Strictly filter using audio features
-        verified_tracks = []
-        checked = 0
-        rejected = 0
-        
-        for track in all_candidates:
-            if len(verified_tracks) >= 20:
-                break
-            
-            # Skip duplicates
-            if any(t['id'] == track['id'] for t in verified_tracks):
-                continue
-            
-            checked += 1
-            
-            try:
-                # Get audio features
-                features = spotify_client.sp.audio_features([track['id']])[0]
-                
-                if not features:
-                    rejected += 1
-                    continue
-                
-                valence = features['valence']
-                energy = features['energy']
-                tempo = features['tempo']
-                
-                # Apply STRICT mood check
-                passes = criteria['check'](valence, energy)
-                
-                if passes:
-                    verified_tracks.append(track)
-                    print(f"✓ {track['name'][:35]:35} | V:{valence:.2f} E:{energy:.2f} T:{tempo:.0f}")
-                else:
-                    rejected += 1
-                    print(f"✗ {track['name'][:35]:35} | V:{valence:.2f} E:{energy:.2f} - Rejected")
-                    
-            except Exception as e:
-                rejected += 1
-                continue
-        
-        print(f"\nChecked: {checked}, Passed: {len(verified_tracks)}, Rejected: {rejected}")
-        
-        # If we have enough verified tracks, use them
-        if len(verified_tracks) >= 15:
-            tracks = verified_tracks[:20]
-            print(f"✅ Using {len(tracks)} strictly verified songs")
-        else:
-            # Not enough strict matches, use Spotify Recommendations API with strict filters
-            print(f"Only {len(verified_tracks)} strict matches, using Spotify Recommendations API...")
-            
-            try:
-                # Get seed from verified tracks or search
-                if verified_tracks:
-                    seed_ids = [t['id'] for t in verified_tracks[:5]]
-                else:
-                    search_result = spotify_client.sp.search(q=queries[0], type='track', limit=5, market='IN')
-                    seed_ids = [t['id'] for t in search_result['tracks']['items']][:5]
-                
-                # Use Spotify recommendations with MIN/MAX constraints
-                rec_params = {
-                    'seed_tracks': seed_ids,
-                    'target_valence': targets['valence'],
-                    'target_energy': targets['energy'],
-                    'target_tempo': targets['tempo'],
-                    'limit': 20
-                }
-                
-                # Add strict min/max based on mood
-                if mood == 'Happy':
-                    rec_params['min_valence'] = 0.50
-                    rec_params['min_energy'] = 0.50
-                elif mood == 'Sad':
-                    rec_params['max_valence'] = 0.50
-                    rec_params['max_energy'] = 0.50
-                elif mood == 'Energetic':
-                    rec_params['min_energy'] = 0.65
-                elif mood == 'Calm':
-                    rec_params['max_energy'] = 0.60
-                    rec_params['min_valence'] = 0.30
-                    rec_params['max_valence'] = 0.70
-                
-                recommendations = spotify_client.sp.recommendations(**rec_params)
-                api_tracks = recommendations['tracks']
-                
-                # Combine verified + API tracks
-                all_final = verified_tracks + api_tracks
-                
-                # Remove duplicates
-                seen = set()
-                unique = []
-                for track in all_final:
-                    if track['id'] not in seen:
-                        seen.add(track['id'])
-                        unique.append(track)
-                
-                tracks = unique[:20]
-                print(f"✅ Combined: {len(tracks)} songs")
-                
-            except Exception as e:
-                print(f"Recommendations API error: {e}")
-                # Last resort: use what we have
-                tracks = verified_tracks[:20] if verified_tracks else all_candidates[:20]
+        song_features = data.get('audio_features')
+        
+        if song_features is not None:
+            problem = invalid_audio_features(song_features)
+            if problem:
+                return jsonify({'error': problem}), 400
+        
+        # Nearest neighbours of the uploaded song come from the local index;
+        # otherwise serve the warm pool, and build live on a cold start
+        tracks = None
+        if song_features:
+            tracks = recommend_from_index(track_index, mood_classifier, mood, song_features)
+            if tracks is not None:
+                logger.info("Serving %d %s recommendations from track index", len(tracks), mood)
+        if tracks is None:
+            tracks = recommendation_pool.sample(mood, k=20)
+            if tracks is not None:
+                logger.info("Serving %d %s recommendations from pool", len(tracks), mood)
+        if tracks is None:
+            tracks = recommend_from_index(track_index, mood_classifier, mood)
+        if tracks is None:
+            tracks = build_recommendations(
+                spotify_client, mood_classifier, mood, track_index=track_index
+            )
         
         if not tracks:
             return jsonify({'error': 'No songs found matching criteria'}), 404
         
         # Format response
-        recommendations_list = []
-        for i, track in enumerate(tracks, 1):
-            recommendations_list.append({
-                'id': track['id'],
-                'name': track['name'],
-                'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                'album': track['album']['name'],
-                'preview_url': track['preview_url'],
-                'spotify_url': track['external_urls']['spotify'],
-                'image': track['album']['images'][0]['url'] if track['album']['images'] else None
-            })
-        
-        print(f"\n✅ FINAL: Returning {len(recommendations_list)} {mood} recommendations")
-        print(f"{'='*50}\n")
+        recommendations_list = [format_track(track) for track in tracks]
+        
+        logger.info("Returning %d %s recommendations", len(recommendations_list), mood)
         
         return jsonify({
             'mood': mood,
@@ -287,14 +587,13 @@ def get_recommendations():
         }), 200
         
     except Exception as e:
-        print(f"❌ ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_recommendations: %s", e)
+        metrics.error('recommend')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/remix', methods=['POST'])
 def create_remix():
-    """Create remix based on detected mood"""
+    """Start a mood remix in the background and return its job"""
     try:
         data = request.get_json()
         filename = data.get('filename')
@@ -303,46 +602,143 @@ def create_remix():
         if not filename:
             return jsonify({'error': 'Filename required'}), 400
         
-        print(f"Creating remix for {filename} with mood: {mood}")
-        
-        input_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        output_filename = f"remix_{filename}"
-        output_path = os.path.join(Config.UPLOAD_FOLDER, output_filename)
-        
-        if not os.path.exists(input_path):
-            return jsonify({'error': 'Original file not found'}), 404
-        
-        success = audio_processor.create_remix(input_path, output_path, mood)
-        
-        if not success:
-            return jsonify({'error': 'Failed to create remix'}), 500
-        
-        print(f"Remix created successfully: {output_filename}")
+        if mood not in REMIX_PRESETS:
+            return jsonify({'error': f'Unknown mood: {mood}'}), 400
+        
+        filename = secure_filename(filename)
+        input_path = file_store.path(filename)
+        output_filename = remix_id(filename, mood)
+        output_path = file_store.path(output_filename)
+        
+        # Content-addressed names never change meaning, so a stored render
+        # from an earlier request is served as-is
+        if file_store.exists(output_filename):
+            file_store.touch(output_filename)
+            return jsonify({
+                'status': 'done',
+                'remix_filename': output_filename
+            }), 200
+        # The render was evicted since its job finished
+        remix_jobs.forget(output_filename)
+        
+        # Keep the input from being evicted while the remix is queued; taken
+        # before the lookup so no process can evict it in between
+        file_store.acquire(filename)
+        try:
+            if upload_buffer.flush(filename, input_path):
+                file_store.add(filename)
+            elif not file_store.touch(filename):
+                file_store.release(filename)
+                return jsonify({'error': 'Original file not found'}), 404
+            
+            logger.info("Queueing remix for %s with mood: %s", filename, mood)
+            
+            outputs = {mood: output_filename}
+            if remix_all_moods:
+                # Only the presets not already stored or being rendered, so
+                # nothing is overwritten and no running job loses its keys
+                for preset in REMIX_PRESETS:
+                    name = remix_id(filename, preset)
+                    if name == output_filename or file_store.exists(name):
+                        continue
+                    pending = remix_jobs.find(name)
+                    if pending is None or pending['status'] not in ('queued', 'running'):
+                        outputs[preset] = name
+            
+            def finished(job):
+                file_store.release(filename)
+                if job['status'] not in ('done', 'failed'):
+                    return
+                # A batch that partly failed still keeps the remixes it wrote
+                for name in outputs.values():
+                    if os.path.exists(file_store.path(name)):
+                        file_store.add(name)
+            
+            if len(outputs) > 1:
+                job = remix_jobs.submit(
+                    output_filename, AudioProcessor.create_remixes, input_path,
+                    {preset: file_store.path(name) for preset, name in outputs.items()},
+                    result=output_filename, on_done=finished,
+                    aliases=[name for name in outputs.values() if name != output_filename]
+                )
+            else:
+                job = remix_jobs.submit(
+                    output_filename, AudioProcessor.create_remix,
+                    input_path, output_path, mood, result=output_filename, on_done=finished
+                )
+        except Exception:
+            file_store.release(filename)
+            raise
         
         return jsonify({
-            'message': 'Remix created successfully',
-            'remix_filename': output_filename
-        }), 200
-        
+            'job_id': job['id'],
+            'status': job['status'],
+            'remix_filename': output_filename,
+            'status_url': f"/api/jobs/{job['id']}"
+        }), 200 if job['status'] == 'done' else 202
+        
+    except QueueFullError as e:
+        return busy_response(e)
     except Exception as e:
-        print(f"Error in create_remix: {e}")
+        logger.exception("Error in create_remix: %s", e)
+        metrics.error('remix')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and progress of a background job"""
+    job = remix_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
-    """Download remixed audio file"""
+    """Download remixed audio file, with Range and conditional request support"""
     try:
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
+        filename = secure_filename(filename)
+        
+        job = remix_jobs.find(filename)
+        if job is not None and job['status'] in ('queued', 'running'):
+            return jsonify({'status': job['status'], 'job_id': job['id']}), 202
         
-        if not os.path.exists(filepath):
+        if not file_store.touch(filename):
             return jsonify({'error': 'File not found'}), 404
         
-        return send_file(filepath, as_attachment=True)
+        # Stored files never change under their name, so the name is the ETag
+        return send_file(
+            file_store.path(filename), as_attachment=True, conditional=True,
+            etag=filename, max_age=download_max_age
+        )
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
     except Exception as e:
-        print(f"Error in download_file: {e}")
+        logger.exception("Error in download_file: %s", e)
+        metrics.error('download')
         return jsonify({'error': str(e)}), 404
 
+def start_services():
+    """Start the background work of the module-level ``app`` and return it.
+
+    Called once per serving process (``serve.py`` calls it in each worker
+    after forking, ``gunicorn 'app:start_services()'`` works the same way), so
+    threads and process pools are never inherited across a fork. Only the
+    first worker refreshes the recommendation pool, the others reading its
+    snapshot from the shared cache, and sweeps the shared upload folder.
+    """
+    if getattr(Config, 'RECOMMENDATION_POOL_ENABLED', True) and worker_id == 0:
+        recommendation_pool.start()
+    file_store.start()
+    # Bring the audio workers up and compile librosa's kernels in the
+    # background, so the first upload doesn't pay for it. Worker processes
+    # that re-import this module (spawn start method) must not start pools
+    # of their own.
+    if audio_warmup and multiprocessing.parent_process() is None:
+        job_runner.start()
+    return app
+
 if __name__ == '__main__':
-    print("Starting Mood Music Analyzer Backend...")
-    print("Backend running on http://127.0.0.1:5000")
-    app.run(debug=True, port=5000, host='127.0.0.1')
+    logger.info("Starting Mood Music Analyzer Backend on http://127.0.0.1:5000")
+    # The reloader would run this module again in a child process, starting
+    # a second set of threads and pools
+    start_services().run(debug=True, use_reloader=False, port=5000, host='127.0.0.1')
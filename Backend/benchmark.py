@@ -0,0 +1,356 @@
+"""Benchmarks for the analysis, remix and recommendation hot paths.
+
+Synthetic audio fixtures of several lengths, sample rates and formats are
+generated into a temporary folder, and recommendations run against a local
+fake Spotify server, so results are reproducible and need no network.
+Each case runs in a fresh process so its peak RSS is its own.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import multiprocessing
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+FIXTURE_SECONDS = (10, 30, 120)
+FIXTURE_SAMPLE_RATES = (22050, 44100)
+FIXTURE_FORMATS = ('wav', 'flac', 'mp3')
+
+# Simulated round trip for every fake Spotify request
+FAKE_LATENCY = 0.02
+
+# Slower p50 than the baseline by more than this fraction is a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def synthetic_signal(seconds, sr, bpm=120, seed=0):
+    """Chord, click track and noise, so every feature has something to measure"""
+    t = np.arange(int(sr * seconds)) / sr
+    y = sum(0.2 * np.sin(2 * np.pi * f * t) for f in (220.0, 277.18, 329.63))
+    clicks = np.zeros_like(t)
+    clicks[::int(sr * 60 / bpm)] = 1.0
+    y = y + np.convolve(clicks, np.hanning(256), mode='same')
+    y = y + 0.01 * np.random.default_rng(seed).standard_normal(len(t))
+    return np.stack([y, np.roll(y, 100)], axis=1).astype(np.float32)
+
+
+def write_fixture(folder, seconds, sr, fmt):
+    """Write one stereo fixture; returns its path, or None if the format is unsupported"""
+    import soundfile as sf
+    path = os.path.join(folder, f"fixture_{seconds}s_{sr}.{fmt}")
+    samples = synthetic_signal(seconds, sr)
+    if fmt in ('wav', 'flac'):
+        sf.write(path, samples, sr)
+        return path
+
+    from utils import remix_engine
+    try:
+        remix_engine.encode_audio(samples, sr, path, format=fmt)
+    except Exception:
+        return None
+    return path
+
+
+class FakeSpotify(BaseHTTPRequestHandler):
+    """Deterministic stand-in for the search, audio-features and recommendations APIs"""
+
+    def do_GET(self):
+        time.sleep(FAKE_LATENCY)
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path.endswith('/search'):
+            seed = zlib.crc32(params.get('q', '').encode()) % 10000
+            limit = int(params.get('limit', 20))
+            body = {'tracks': {'items': [_track(f"s{seed}x{i}") for i in range(limit)]}}
+        elif url.path.endswith('/audio-features'):
+            body = {'audio_features': [_features(tid) for tid in params.get('ids', '').split(',')]}
+        elif url.path.endswith('/recommendations'):
+            limit = int(params.get('limit', 20))
+            body = {'tracks': [_track(f"r{i}") for i in range(limit)]}
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _track(track_id):
+    return {
+        'id': track_id,
+        'name': f"Track {track_id}",
+        'artists': [{'name': 'Fake Artist'}],
+        'album': {'name': 'Fake Album', 'images': [{'url': 'http://example.invalid/cover.jpg'}]},
+        'preview_url': None,
+        'external_urls': {'spotify': f"http://example.invalid/{track_id}"}
+    }
+
+
+def _features(track_id):
+    rng = np.random.default_rng(zlib.crc32(track_id.encode()))
+    return {
+        'id': track_id,
+        'valence': float(rng.random()),
+        'energy': float(rng.random()),
+        'tempo': float(rng.uniform(60, 180))
+    }
+
+
+def start_fake_spotify():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_extract_features(path, mode, iterations):
+    from utils.audio_processor import AudioProcessor
+    AudioProcessor.extract_features(path, mode)  # warm up numba kernels
+    return _timed(lambda: AudioProcessor.extract_features(path, mode), iterations)
+
+
+def bench_extract_timeline(path, iterations):
+    from utils.audio_processor import AudioProcessor
+    AudioProcessor.extract_timeline(path)  # warm up numba kernels
+    return _timed(lambda: AudioProcessor.extract_timeline(path), iterations)
+
+
+def bench_create_remix(path, mood, iterations):
+    from utils.audio_processor import AudioProcessor
+    output = os.path.join(os.path.dirname(path), f"remix_{mood.lower()}_{os.path.basename(path)}.mp3")
+
+    def remix():
+        if not AudioProcessor.create_remix(path, output, mood):
+            raise RuntimeError('create_remix failed')
+
+    return _timed(remix, iterations)
+
+
+def bench_create_remixes(path, iterations):
+    """Every mood preset from one decode, as with REMIX_ALL_MOODS"""
+    from utils.audio_processor import AudioProcessor, REMIX_PRESETS
+    outputs = {mood: os.path.join(os.path.dirname(path), f"remix_{mood.lower()}_{os.path.basename(path)}.mp3")
+               for mood in REMIX_PRESETS}
+
+    def remix():
+        if not AudioProcessor.create_remixes(path, outputs):
+            raise RuntimeError('create_remixes failed')
+
+    return _timed(remix, iterations)
+
+
+def bench_recommend(port, warm_cache, iterations):
+    """POST /api/recommend through the Flask test client on a cold pool,
+    with the app's Spotify client pointed at the fake server"""
+    import app as moodtune
+    from utils.spotify_client import FeatureCache, SpotifyClient
+    from utils.track_index import TrackIndex
+
+    moodtune.spotify_client = SpotifyClient(
+        feature_cache=FeatureCache(),
+        api_prefix=f"http://127.0.0.1:{port}/v1/",
+        access_token='benchmark',
+        # Measure the pipeline, not the client-side request budget
+        rate_limit=1e6, rate_burst=1000
+    )
+    client = moodtune.app.test_client()
+
+    def recommend():
+        if not warm_cache:
+            moodtune.spotify_client.feature_cache = FeatureCache()
+        # An empty index every time, or it would answer from the last search
+        moodtune.track_index = TrackIndex()
+        response = client.post('/api/recommend', json={'mood': 'Happy'})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/recommend returned {response.status_code}")
+
+    recommend()
+    return _timed(recommend, iterations)
+
+
+def _timed(fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _run_case(case):
+    """Runs in a fresh worker process"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    kind, params, iterations = case['kind'], case['params'], case['iterations']
+    try:
+        if kind == 'extract_features':
+            latencies = bench_extract_features(params['path'], params['mode'], iterations)
+        elif kind == 'extract_timeline':
+            latencies = bench_extract_timeline(params['path'], iterations)
+        elif kind == 'create_remix':
+            latencies = bench_create_remix(params['path'], params['mood'], iterations)
+        elif kind == 'create_remixes':
+            latencies = bench_create_remixes(params['path'], iterations)
+        else:
+            latencies = bench_recommend(params['port'], params['warm_cache'], iterations)
+    except Exception as e:
+        return {'error': str(e) or type(e).__name__}
+    return {'latencies': latencies, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def summarize(latencies):
+    values = np.asarray(latencies)
+    return {
+        'iterations': len(values),
+        'throughput_per_s': round(len(values) / values.sum(), 3),
+        'mean_s': round(float(values.mean()), 5),
+        'p50_s': round(float(np.percentile(values, 50)), 5),
+        'p95_s': round(float(np.percentile(values, 95)), 5),
+        'p99_s': round(float(np.percentile(values, 99)), 5)
+    }
+
+
+def build_cases(fixtures, port, iterations, quick=False):
+    cases = []
+    for path in fixtures:
+        name = os.path.basename(path)
+        modes = ['window'] if quick else ['window', 'stream', 'segments']
+        for mode in modes:
+            cases.append({'name': f"extract_features[{mode}] {name}", 'kind': 'extract_features',
+                          'params': {'path': path, 'mode': mode}, 'iterations': iterations})
+        if not quick:
+            cases.append({'name': f"extract_timeline {name}", 'kind': 'extract_timeline',
+                          'params': {'path': path}, 'iterations': iterations})
+        cases.append({'name': f"create_remix[Energetic] {name}", 'kind': 'create_remix',
+                      'params': {'path': path, 'mood': 'Energetic'}, 'iterations': iterations})
+        cases.append({'name': f"create_remixes[all moods] {name}", 'kind': 'create_remixes',
+                      'params': {'path': path}, 'iterations': iterations})
+    for warm in (False, True):
+        cases.append({'name': f"recommend[{'warm' if warm else 'cold'} cache]", 'kind': 'recommend',
+                      'params': {'port': port, 'warm_cache': warm}, 'iterations': iterations * 4})
+    return cases
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """Print p50 changes against an earlier run; returns the regressed case names"""
+    with open(baseline_path) as f:
+        baseline = {case['name']: case for case in json.load(f)['results']}
+
+    regressions = []
+    for case in results:
+        before = baseline.get(case['name'])
+        if not before or 'p50_s' not in before or 'p50_s' not in case:
+            continue
+        change = case['p50_s'] / before['p50_s'] - 1 if before['p50_s'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(case['name'])
+        print(f"{case['name']:55} p50 {before['p50_s']:.4f}s -> {case['p50_s']:.4f}s ({change:+.1%}){flag}")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark analysis, remix and recommendation paths')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results JSON to compare p50 latencies against')
+    parser.add_argument('--iterations', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--quick', action='store_true',
+                        help='short fixtures and window mode only')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    args = parser.parse_args(argv)
+
+    folder = tempfile.mkdtemp(prefix='moodtune-bench-')
+    server = start_fake_spotify()
+    try:
+        seconds = FIXTURE_SECONDS[:1] if args.quick else FIXTURE_SECONDS
+        fixtures = []
+        for length in seconds:
+            for sr in FIXTURE_SAMPLE_RATES:
+                for fmt in FIXTURE_FORMATS:
+                    path = write_fixture(folder, length, sr, fmt)
+                    if path is None:
+                        print(f"Skipping {fmt} fixtures (no encoder available)")
+                    else:
+                        fixtures.append(path)
+
+        cases = [case for case in build_cases(fixtures, server.server_port, args.iterations, args.quick)
+                 if args.filter in case['name']]
+
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                outcome = pool.submit(_run_case, case).result()
+            result = {'name': case['name'], 'kind': case['kind']}
+            if 'error' in outcome:
+                result['error'] = outcome['error']
+                print(f"{case['name']:55} ERROR {outcome['error']}")
+            else:
+                result.update(summarize(outcome['latencies']))
+                result['peak_rss_mb'] = outcome['peak_rss_mb']
+                print(f"{case['name']:55} p50 {result['p50_s']:.4f}s  p95 {result['p95_s']:.4f}s  "
+                      f"p99 {result['p99_s']:.4f}s  {result['throughput_per_s']:.2f}/s  "
+                      f"RSS {result['peak_rss_mb']} MB")
+            results.append(result)
+    finally:
+        server.shutdown()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,77 @@
 import numpy as np
 
+# Strict per-mood feature ranges a track must fall inside to count as that
+# mood; a track can match several moods or none
+MOOD_THRESHOLDS = {
+    'Happy': {'valence_min': 0.50, 'energy_min': 0.50},
+    'Sad': {'valence_max': 0.50, 'energy_max': 0.50},
+    'Energetic': {'energy_min': 0.65},
+    'Calm': {'energy_max': 0.60, 'valence_min': 0.30, 'valence_max': 0.70}
+}
+
+# A fast track only needs moderate energy to count as Energetic
+FAST_TEMPO = 130
+FAST_ENERGY_MIN = 0.5
+
+
+def within_thresholds(limits, valence, energy):
+    """Whether valence/energy (scalars or arrays) fall inside ``limits``"""
+    values = {'valence': np.asarray(valence), 'energy': np.asarray(energy)}
+    mask = np.ones(np.broadcast(values['valence'], values['energy']).shape, dtype=bool)
+    for feature, value in values.items():
+        if f'{feature}_min' in limits:
+            mask &= value >= limits[f'{feature}_min']
+        if f'{feature}_max' in limits:
+            mask &= value <= limits[f'{feature}_max']
+    return mask
+
+
 class MoodClassifier:
     def __init__(self):
         self.mood_labels = ['Happy', 'Sad', 'Energetic', 'Calm']
         
-    def classify_mood_simple(self, valence, energy):
+    def classify_mood_simple(self, valence, energy, tempo=None):
         """Simple rule-based mood classification"""
+        fast = tempo is not None and tempo >= FAST_TEMPO and energy >= FAST_ENERGY_MIN
         if valence >= 0.6 and energy >= 0.6:
             return 'Happy', 0.85
         elif valence < 0.4 and energy < 0.4:
             return 'Sad', 0.80
-        elif energy >= 0.6:
+        elif energy >= 0.6 or fast:
             return 'Energetic', 0.82
         else:
             return 'Calm', 0.78
     
+    def classify_mood_batch(self, valence, energy, tempo=None):
+        """Vectorized ``classify_mood_simple`` over arrays of valence/energy
+        and optionally tempo (NaN where a track's tempo is unknown).
+
+        Returns ``(moods, confidences, matches)``: an array of mood labels,
+        an array of confidences, and a dict of boolean masks saying which
+        tracks pass each mood's strict thresholds.
+        """
+        valence = np.asarray(valence, dtype=np.float64)
+        energy = np.asarray(energy, dtype=np.float64)
+        fast = False
+        if tempo is not None:
+            fast = (np.asarray(tempo, dtype=np.float64) >= FAST_TEMPO) & (energy >= FAST_ENERGY_MIN)
+        
+        conditions = [
+            (valence >= 0.6) & (energy >= 0.6),
+            (valence < 0.4) & (energy < 0.4),
+            (energy >= 0.6) | fast
+        ]
+        moods = np.select(conditions, ['Happy', 'Sad', 'Energetic'], default='Calm')
+        confidences = np.select(conditions, [0.85, 0.80, 0.82], default=0.78)
+        return moods, confidences, self.mood_matches(valence, energy)
+    
+    def mood_matches(self, valence, energy):
+        """Boolean mask per mood of the tracks inside its strict thresholds"""
+        return {
+            mood: within_thresholds(limits, valence, energy)
+            for mood, limits in MOOD_THRESHOLDS.items()
+        }
+    
     def get_mood_recommendations(self, mood):
         """Get target audio features for mood-based recommendations"""
         mood_targets = {
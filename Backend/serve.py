@@ -0,0 +1,145 @@
+"""Serve the API from several preforked worker processes.
+
+One listening socket is opened up front and each worker accepts on it, so
+requests spread across processes with no proxy in between. A cache server
+started beforehand lets the workers share Spotify tokens, track features,
+analysis results, the recommendation pool and remix job records. Each
+worker gets an equal share of the CPU cores for its audio processes, and
+dead workers are replaced. A worker that keeps dying right after it
+starts (say, a broken config) is restarted with a growing delay, and the
+server gives up after a few attempts in a row.
+
+    python serve.py --workers 4 --port 5000
+
+POSIX only (uses fork). ``gunicorn 'app:start_services()'`` works as well, but
+without the shared cache unless it is started separately.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from utils import shared_cache
+
+# Delay before restarting a dead worker, doubled after every fast failure
+RESPAWN_DELAY = 1.0
+MAX_RESPAWN_DELAY = 60.0
+
+# A worker that exits within FAST_FAILURE_SECONDS of starting failed fast;
+# after MAX_FAST_FAILURES of those in a row the server stops
+FAST_FAILURE_SECONDS = 10.0
+MAX_FAST_FAILURES = 5
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+
+def run_worker(worker_id, sock, host, port):
+    os.environ['MOODTUNE_WORKER_ID'] = str(worker_id)
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    # Imported only after the fork so no threads or pools are inherited
+    from werkzeug.serving import make_server
+    from app import start_services, job_runner
+    server = make_server(host, port, start_services(), threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        job_runner.shutdown()
+
+
+def spawn(worker_id, sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            run_worker(worker_id, sock, host, port)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            print(f"Worker {worker_id} failed:", file=sys.stderr)
+            traceback.print_exc()
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the API from preforked worker processes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='web worker processes (default: CPU count)')
+    parser.add_argument('--cache-entries', type=int, default=100000, help='entries per shared cache namespace')
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        print("serve.py needs fork(); use 'python app.py' on this platform", file=sys.stderr)
+        return 1
+
+    manager = shared_cache.start_server(args.cache_entries)
+    os.environ['MOODTUNE_WORKERS'] = str(args.workers)
+    os.environ['MOODTUNE_AUDIO_WORKERS'] = str(max(1, (os.cpu_count() or 1) // args.workers))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    workers = {spawn(i, sock, args.host, args.port): i for i in range(args.workers)}
+    started_at = dict.fromkeys(range(args.workers), time.monotonic())
+    fast_failures = dict.fromkeys(range(args.workers), 0)
+    code = 0
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            worker_id = workers.pop(pid, None)
+            if worker_id is None:
+                continue
+            if time.monotonic() - started_at[worker_id] < FAST_FAILURE_SECONDS:
+                fast_failures[worker_id] += 1
+            else:
+                fast_failures[worker_id] = 0
+            if fast_failures[worker_id] >= MAX_FAST_FAILURES:
+                print(f"Worker {worker_id} failed {MAX_FAST_FAILURES} times in a row right after "
+                      "starting; shutting down", file=sys.stderr)
+                code = 1
+                break
+            delay = min(MAX_RESPAWN_DELAY, RESPAWN_DELAY * 2 ** fast_failures[worker_id])
+            print(f"Worker {worker_id} (pid {pid}) exited with status {status}; "
+                  f"restarting in {delay:.0f}s", file=sys.stderr)
+            time.sleep(delay)
+            workers[spawn(worker_id, sock, args.host, args.port)] = worker_id
+            started_at[worker_id] = time.monotonic()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    manager.shutdown()
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from utils.analysis_cache import AnalysisCache
+
+
+class DictCache:
+    """Stands in for a SharedCache another worker process filled"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def test_hits_and_misses_are_counted():
+    cache = AnalysisCache()
+    assert cache.get('abc') is None
+    cache.set('abc', {'mood': 'Calm'})
+
+    assert cache.get('abc') == {'mood': 'Calm'}
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_least_recently_used_result_is_evicted():
+    cache = AnalysisCache(max_entries=2)
+    cache.set('a', {'mood': 'Happy'})
+    cache.set('b', {'mood': 'Sad'})
+    cache.get('a')
+    cache.set('c', {'mood': 'Calm'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'mood': 'Happy'}
+    assert cache.get('c') == {'mood': 'Calm'}
+    assert cache.stats()['entries'] == 2
+
+
+def test_results_of_other_workers_are_reused():
+    shared = DictCache()
+    AnalysisCache(shared=shared).set('abc', {'mood': 'Energetic'})
+
+    cache = AnalysisCache(shared=shared)
+    assert cache.get('abc') == {'mood': 'Energetic'}
+    shared.entries.clear()
+    # Kept locally after the first lookup
+    assert cache.get('abc') == {'mood': 'Energetic'}
+    assert cache.stats()['hits'] == 2
@@ -0,0 +1,87 @@
+import json
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+import analyze_folder
+from config import Config
+
+
+def write_clip(path, freq):
+    sr = Config.SAMPLE_RATE
+    t = np.arange(3 * sr) / sr
+    sf.write(path, (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32), sr)
+
+
+def test_resumes_from_a_partial_jsonl(tmp_path):
+    music = tmp_path / 'music'
+    music.mkdir()
+    for name, freq in (('a.wav', 220.0), ('b.wav', 330.0), ('c.wav', 440.0)):
+        write_clip(str(music / name), freq)
+    output = tmp_path / 'moods.jsonl'
+
+    # A finished record for a.wav, then a line cut off mid-write
+    path, size, mtime = analyze_folder.file_key(str(music / 'a.wav'), str(music))
+    done = {'path': path, 'size': size, 'mtime': mtime, 'mood': 'Recorded'}
+    output.write_text(json.dumps(done) + '\n{"path": "b.wav", "si')
+
+    assert analyze_folder.main([str(music), str(output), '--workers', '1']) == 0
+
+    records = list(analyze_folder.read_records(str(output)))
+    assert [r['path'] for r in records].count('a.wav') == 1
+    assert records[0] == done
+    assert sorted(r['path'] for r in records[1:]) == ['b.wav', 'c.wav']
+    assert all('mood' in r and 'error' not in r for r in records)
+
+    # Everything is recorded now, so a second run has nothing to do
+    assert analyze_folder.main([str(music), str(output), '--workers', '1']) == 0
+    assert len(list(analyze_folder.read_records(str(output)))) == 3
+
+
+def test_table_rows_keep_every_column():
+    records = [
+        {'path': 'a.wav', 'size': 1, 'mtime': 1, 'error': 'Failed to extract audio features'},
+        {'path': 'b.wav', 'size': 1, 'mtime': 1, 'mood': 'Calm', 'features': {'tempo': 90.0}},
+        {'path': 'a.wav', 'size': 2, 'mtime': 2, 'error': 'Failed to extract audio features'}
+    ]
+
+    rows = analyze_folder.table_rows(records)
+
+    assert [row['path'] for row in rows] == ['a.wav', 'b.wav']
+    assert all(list(row) == ['path', 'size', 'mtime', 'error', 'mood', 'features'] for row in rows)
+    assert rows[0]['size'] == 2 and rows[0]['features'] is None
+    assert rows[1]['error'] is None
+
+
+def test_parquet_keeps_columns_of_mixed_records(tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    jsonl = tmp_path / 'moods.jsonl'
+    jsonl.write_text(
+        json.dumps({'path': 'a.wav', 'size': 1, 'mtime': 1, 'error': 'Failed'}) + '\n'
+        + json.dumps({'path': 'b.wav', 'size': 1, 'mtime': 1, 'mood': 'Calm'}) + '\n'
+    )
+
+    assert analyze_folder.write_parquet(str(jsonl), str(tmp_path / 'moods.parquet'))
+    table = pyarrow_parquet.read_table(str(tmp_path / 'moods.parquet'))
+    assert set(table.column_names) == {'path', 'size', 'mtime', 'error', 'mood'}
+
+
+def crash_on_one_file(path, key, mode):
+    if path.endswith('crash.wav'):
+        os._exit(1)
+    return {'path': key[0], 'size': key[1], 'mtime': key[2], 'mood': 'Calm'}
+
+
+def test_a_crashing_file_fails_alone(tmp_path, monkeypatch, capsys):
+    music = tmp_path / 'music'
+    music.mkdir()
+    for name in ('a.wav', 'b.wav', 'crash.wav', 'd.wav', 'e.wav', 'f.wav'):
+        (music / name).write_bytes(b'RIFF')
+    output = tmp_path / 'moods.jsonl'
+    monkeypatch.setattr(analyze_folder, 'analyze_file', crash_on_one_file)
+
+    assert analyze_folder.run(str(music), str(output), workers=2) == 1
+
+    recorded = sorted(r['path'] for r in analyze_folder.read_records(str(output)))
+    assert recorded == ['a.wav', 'b.wav', 'd.wav', 'e.wav', 'f.wav']
+    assert '5/6 files, 1 failed' in capsys.readouterr().out
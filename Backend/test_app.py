@@ -0,0 +1,288 @@
+from concurrent.futures import Future
+import io
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+import app as moodtune
+from config import Config
+from utils.analysis_cache import AnalysisCache, UploadBuffer
+from utils.audio_processor import AudioProcessor
+from utils.feature_store import FeatureStore
+from utils.file_store import FileStore, remix_id
+from utils.job_runner import JobRegistry, QueueFullError
+from test_feature_engine import synthetic_clip
+
+
+class RecordingRunner:
+    """Keeps submitted jobs pending and remembers their arguments"""
+
+    def __init__(self):
+        self.calls = []
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append((fn, args))
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(moodtune, 'file_store', FileStore(str(tmp_path)))
+    runner = RecordingRunner()
+    monkeypatch.setattr(moodtune, 'remix_jobs', JobRegistry(runner))
+    client = moodtune.app.test_client()
+    client.runner = runner
+    return client
+
+
+def test_remix_all_moods_skips_stored_and_running_presets(client, monkeypatch):
+    monkeypatch.setattr(moodtune, 'remix_all_moods', True)
+    store = moodtune.file_store
+    store.write('input.wav', b'RIFF')
+    store.write(remix_id('input.wav', 'Happy'), b'mp3')
+    moodtune.remix_jobs.submit(remix_id('input.wav', 'Sad'), print)
+
+    response = client.post('/api/remix', json={'filename': 'input.wav', 'mood': 'Calm'})
+
+    assert response.status_code == 202
+    _, (input_path, outputs) = client.runner.calls[-1]
+    assert sorted(outputs) == ['Calm', 'Energetic']
+
+
+class InlineRunner:
+    """Answers each job at once with a canned result for its function"""
+
+    timeout = 5
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append(fn.__name__)
+        future = Future()
+        future.set_result(self.results[fn.__name__])
+        return future
+
+
+def clip_analysis():
+    sr = Config.SAMPLE_RATE
+    y = np.concatenate([0.2 * synthetic_clip(sr, seconds=10, bpm=90),
+                        synthetic_clip(sr, seconds=10, bpm=150)])
+    features = AudioProcessor.extract_features_from_signal(y, sr)
+    timeline = AudioProcessor.summarize_windows(*AudioProcessor._frame_features(y, sr), sr, 10)
+    return features, timeline
+
+
+def test_classify_timeline_labels_every_window():
+    _, timeline = clip_analysis()
+
+    windows = moodtune.classify_timeline(timeline)
+
+    assert [w['start'] for w in windows] == timeline['start']
+    assert [w['end'] for w in windows] == timeline['end']
+    for window in windows:
+        assert window['mood'] in moodtune.mood_classifier.mood_labels
+        assert 0 <= window['confidence'] <= 1
+
+
+def test_timeline_is_an_extra_pass_that_leaves_the_track_result_alone(tmp_path, monkeypatch):
+    features, timeline = clip_analysis()
+    runner = InlineRunner({'extract_features_from_buffer': features, 'extract_timeline': timeline})
+    monkeypatch.setattr(moodtune, 'job_runner', runner)
+    monkeypatch.setattr(moodtune, 'file_store', FileStore(str(tmp_path / 'uploads')))
+    monkeypatch.setattr(moodtune, 'feature_store', FeatureStore(str(tmp_path / 'features')))
+    monkeypatch.setattr(moodtune, 'analysis_cache', AnalysisCache())
+    monkeypatch.setattr(moodtune, 'upload_buffer', UploadBuffer())
+    monkeypatch.setattr(moodtune, 'persist_uploads', False)
+    client = moodtune.app.test_client()
+
+    def analyze(**query):
+        upload = {'file': (io.BytesIO(b'RIFF' + bytes(64)), 'clip.wav')}
+        response = client.post('/api/analyze', data=upload, query_string=query,
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        return response.get_json()
+
+    plain = analyze()
+    assert 'timeline' not in plain
+    assert runner.calls == ['extract_features_from_buffer']
+
+    # A cached result without a timeline only misses the timeline pass
+    with_timeline = analyze(timeline='1')
+    assert runner.calls == ['extract_features_from_buffer', 'extract_timeline']
+    assert {k: v for k, v in with_timeline.items() if k != 'timeline'} == plain
+    assert len(with_timeline['timeline']) == len(timeline['start'])
+
+    assert analyze(timeline='1') == with_timeline
+    assert analyze() == plain
+    assert len(runner.calls) == 2
+
+
+def test_upload_pushed_out_of_memory_can_still_be_remixed(client, tmp_path, monkeypatch):
+    features, _ = clip_analysis()
+    monkeypatch.setattr(moodtune, 'job_runner', InlineRunner({'extract_features_from_buffer': features}))
+    monkeypatch.setattr(moodtune, 'feature_store', FeatureStore(str(tmp_path / 'features')))
+    monkeypatch.setattr(moodtune, 'analysis_cache', AnalysisCache())
+    monkeypatch.setattr(moodtune, 'persist_uploads', False)
+    monkeypatch.setattr(moodtune, 'upload_buffer', UploadBuffer(
+        max_bytes=100, on_evict=lambda name, data: moodtune.spill_upload(name, data)
+    ))
+
+    names = []
+    for fill in (1, 2):
+        upload = {'file': (io.BytesIO(b'RIFF' + bytes([fill]) * 64), 'clip.wav')}
+        response = client.post('/api/analyze', data=upload, content_type='multipart/form-data')
+        names.append(response.get_json()['filename'])
+
+    assert moodtune.upload_buffer.stats()['spilled'] == 1
+    for name in names:
+        response = client.post('/api/remix', json={'filename': name, 'mood': 'Calm'})
+        assert response.status_code == 202
+
+
+def test_remix_rejects_unknown_mood(client):
+    moodtune.file_store.write('input.wav', b'RIFF')
+
+    response = client.post('/api/remix', json={'filename': 'input.wav', 'mood': 'Spooky'})
+
+    assert response.status_code == 400
+    assert not client.runner.calls
+
+
+class OneSlotRunner(RecordingRunner):
+    """Takes one job, then reports the queue full"""
+
+    timeout = 5
+
+    def submit(self, fn, *args, **kwargs):
+        if self.calls:
+            raise QueueFullError('Too many audio jobs in progress')
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_progressive_analysis_withdraws_the_preview_when_the_queue_fills(tmp_path, monkeypatch):
+    runner = OneSlotRunner()
+    monkeypatch.setattr(moodtune, 'job_runner', runner)
+    monkeypatch.setattr(moodtune, 'file_store', FileStore(str(tmp_path)))
+    monkeypatch.setattr(moodtune, 'analysis_cache', AnalysisCache())
+    monkeypatch.setattr(moodtune, 'upload_buffer', UploadBuffer())
+    client = moodtune.app.test_client()
+
+    upload = {'file': (io.BytesIO(b'RIFF' + bytes(64)), 'clip.wav')}
+    response = client.post('/api/analyze', data=upload, query_string={'progressive': '1'},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 429
+    assert runner.futures[0].cancelled()
+
+
+def test_progressive_analysis_cancels_its_jobs_when_the_stream_ends(tmp_path, monkeypatch):
+    runner = RecordingRunner()
+    runner.timeout = 0.05
+    monkeypatch.setattr(moodtune, 'job_runner', runner)
+    monkeypatch.setattr(moodtune, 'file_store', FileStore(str(tmp_path)))
+    monkeypatch.setattr(moodtune, 'analysis_cache', AnalysisCache())
+    monkeypatch.setattr(moodtune, 'upload_buffer', UploadBuffer())
+    client = moodtune.app.test_client()
+
+    upload = {'file': (io.BytesIO(b'RIFF' + bytes(64)), 'clip.wav')}
+    response = client.post('/api/analyze', data=upload, query_string={'progressive': '1'},
+                           content_type='multipart/form-data')
+    body = response.get_data(as_text=True)
+    response.close()
+
+    assert body.startswith('event: error')
+    assert len(runner.futures) == 2
+    assert all(future.cancelled() for future in runner.futures)
+
+
+@pytest.mark.parametrize('features', [
+    {'valence': 'high', 'energy': 0.5},
+    {'valence': 0.5, 'tempo': [120]},
+    {'energy': True},
+    ['valence', 0.5]
+])
+def test_recommend_rejects_non_numeric_audio_features(client, features):
+    response = client.post('/api/recommend', json={'mood': 'Happy', 'audio_features': features})
+
+    assert response.status_code == 400
+    assert 'audio_features' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('track', [
+    {'valence': float('nan'), 'energy': 0.5},
+    {'spectral_centroid': 2000.0, 'chroma_mean': 0.4, 'energy': float('inf'), 'tempo': 120.0}
+])
+def test_batch_analysis_rejects_non_finite_features(client, track):
+    body = json.dumps({'tracks': [{'valence': 0.5, 'energy': 0.5}, track]})
+
+    response = client.post('/api/analyze/batch', data=body, content_type='application/json')
+
+    assert response.status_code == 400
+    assert 'not a finite number' in response.get_json()['error']
+
+
+def test_failed_timeline_is_reported_and_not_retried(tmp_path, monkeypatch):
+    features, _ = clip_analysis()
+    runner = InlineRunner({'extract_features_from_buffer': features, 'extract_timeline': None})
+    monkeypatch.setattr(moodtune, 'job_runner', runner)
+    monkeypatch.setattr(moodtune, 'file_store', FileStore(str(tmp_path / 'uploads')))
+    monkeypatch.setattr(moodtune, 'feature_store', FeatureStore(str(tmp_path / 'features')))
+    monkeypatch.setattr(moodtune, 'analysis_cache', AnalysisCache())
+    monkeypatch.setattr(moodtune, 'upload_buffer', UploadBuffer())
+    client = moodtune.app.test_client()
+
+    for _ in range(2):
+        upload = {'file': (io.BytesIO(b'RIFF' + bytes(64)), 'clip.m4a')}
+        response = client.post('/api/analyze', data=upload, query_string={'timeline': '1'},
+                               content_type='multipart/form-data')
+        body = response.get_json()
+        assert response.status_code == 200
+        assert 'timeline' not in body and body['timeline_error']
+        assert body['mood']
+
+    assert runner.calls == ['extract_features_from_buffer', 'extract_timeline']
+
+
+def test_download_supports_conditional_and_range_requests(client):
+    name = remix_id('input.wav', 'Calm')
+    moodtune.file_store.write(name, bytes(range(100)))
+
+    response = client.get(f'/api/download/{name}')
+    assert response.status_code == 200
+    assert response.data == bytes(range(100))
+    etag = response.headers['ETag']
+    assert etag
+
+    response = client.get(f'/api/download/{name}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get(f'/api/download/{name}', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 10-19/100'
+    assert response.data == bytes(range(10, 20))
+
+    response = client.get(f'/api/download/{name}', headers={'Range': 'bytes=200-300'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */100'
+
+
+def test_importing_the_app_leaves_heavy_libraries_unloaded():
+    # A fresh interpreter: this one already has them from other tests
+    script = (
+        "import sys, app\n"
+        "loaded = [m for m in ('librosa', 'pydub', 'spotipy') if m in sys.modules]\n"
+        "assert not loaded, loaded\n"
+        "assert not app.spotify_client.ready\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(moodtune.__file__),
+                            env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,82 @@
+import numpy as np
+import soundfile as sf
+import librosa
+from config import Config
+from utils.audio_processor import AudioProcessor
+from test_feature_engine import synthetic_clip
+
+
+def write_clip(path, seconds=25):
+    # Halved so the clicks don't clip in 16-bit PCM
+    y = 0.5 * synthetic_clip(Config.SAMPLE_RATE, seconds=seconds)
+    sf.write(path, y, Config.SAMPLE_RATE)
+    return y
+
+
+def test_stream_mode_covers_the_whole_track(tmp_path):
+    path = str(tmp_path / 'clip.wav')
+    y = write_clip(path)
+
+    features = AudioProcessor.extract_features(path, 'stream')
+
+    whole = AudioProcessor.extract_features_from_signal(y, Config.SAMPLE_RATE)
+    assert features.keys() == whole.keys()
+    assert np.isclose(features['energy'], whole['energy'], rtol=0.05)
+    assert np.isclose(features['spectral_centroid'], whole['spectral_centroid'], rtol=0.05)
+
+
+def test_segments_mode_samples_the_track(tmp_path):
+    path = str(tmp_path / 'clip.wav')
+    y = write_clip(path)
+
+    features = AudioProcessor.extract_features(path, 'segments')
+
+    whole = AudioProcessor.extract_features_from_signal(y, Config.SAMPLE_RATE)
+    assert features.keys() == whole.keys()
+    assert np.isclose(features['energy'], whole['energy'], rtol=0.05)
+
+
+def test_stream_decode_errors_fall_back_to_segments(tmp_path, monkeypatch):
+    path = str(tmp_path / 'clip.wav')
+    write_clip(path, seconds=5)
+
+    def failing_stream(*args, **kwargs):
+        # Like soundfile on a format it can't read: nothing fails until the
+        # first block is pulled
+        raise sf.LibsndfileError(1, 'Error opening')
+        yield
+
+    segments = []
+    real_segments = AudioProcessor.extract_features_segments
+    monkeypatch.setattr(librosa, 'stream', failing_stream)
+    monkeypatch.setattr(AudioProcessor, 'extract_features_segments', staticmethod(
+        lambda file_path: segments.append(file_path) or real_segments(file_path)
+    ))
+
+    features = AudioProcessor.extract_features(path, 'stream')
+
+    assert segments == [path]
+    assert features is not None and features['energy'] > 0
+
+
+def test_bytes_fall_back_to_a_temporary_file(tmp_path, monkeypatch):
+    path = tmp_path / 'clip.wav'
+    write_clip(str(path), seconds=12)
+    real_load = librosa.load
+    opened = []
+
+    def file_only_load(source, **kwargs):
+        # Like audioread with m4a: only a real path will do
+        if not isinstance(source, str):
+            raise sf.LibsndfileError(1, 'Format not recognised')
+        opened.append(source)
+        return real_load(source, **kwargs)
+
+    monkeypatch.setattr(librosa, 'load', file_only_load)
+
+    timeline = AudioProcessor.extract_timeline(path.read_bytes(), suffix='.wav')
+    preview = AudioProcessor.extract_preview_features(path.read_bytes(), suffix='.wav')
+
+    assert timeline is not None and len(timeline['start']) == 1
+    assert preview is not None and preview['energy'] > 0
+    assert len(opened) == 2 and all(name.endswith('.wav') for name in opened)
@@ -0,0 +1,96 @@
+import sqlite3
+import pytest
+from utils import spotify_client
+from utils.spotify_client import FeatureCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spotify_client.time, 'time', clock)
+    return clock
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    cache = FeatureCache(ttl=60)
+    cache.set('a', {'valence': 0.5})
+
+    clock.now += 59
+    assert cache.get('a') == {'valence': 0.5}
+    clock.now += 2
+    assert cache.get('a') is spotify_client._MISSING
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = FeatureCache(max_entries=2)
+    cache.set('a', {'valence': 0.1})
+    cache.set('b', {'valence': 0.2})
+    cache.get('a')
+    cache.set('c', {'valence': 0.3})
+
+    assert cache.get_many(['a', 'b', 'c']) == {'a': {'valence': 0.1}, 'c': {'valence': 0.3}}
+
+
+def test_disk_tier_answers_a_new_process(tmp_path):
+    db_path = str(tmp_path / 'features.db')
+    FeatureCache(db_path=db_path).set_many({'a': {'valence': 0.4}, 'b': None})
+
+    cache = FeatureCache(db_path=db_path)
+    assert cache.get_many(['a', 'b', 'c']) == {'a': {'valence': 0.4}, 'b': None}
+    assert cache.stats()['disk_hits'] == 2
+    # Now served from memory
+    assert cache.get('a') == {'valence': 0.4}
+    assert cache.stats()['disk_hits'] == 2
+
+
+def test_tracks_without_features_are_cached_briefly(clock):
+    cache = FeatureCache(ttl=3600, negative_ttl=60)
+    cache.set_many({'a': {'valence': 0.5}, 'gone': None})
+
+    assert cache.get('gone') is None
+    clock.now += 61
+    assert cache.get('gone') is spotify_client._MISSING
+    assert cache.get('a') == {'valence': 0.5}
+
+
+class LockedDatabase:
+    """Stands in for a SQLite file another worker holds the lock on"""
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError('database is locked')
+
+    executemany = execute
+
+    def rollback(self):
+        pass
+
+
+def test_disk_errors_leave_the_memory_tier_working(tmp_path):
+    cache = FeatureCache(db_path=str(tmp_path / 'features.db'))
+    cache._db = LockedDatabase()
+
+    cache.set_many({'a': {'valence': 0.5}})
+
+    assert cache.get('a') == {'valence': 0.5}
+    assert cache.get('b') is spotify_client._MISSING
+
+
+def test_disk_tier_is_pruned_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(spotify_client, 'DB_PRUNE_EVERY', 3)
+    cache = FeatureCache(db_path=str(tmp_path / 'features.db'), max_db_entries=2)
+    count = lambda: cache._db.execute('SELECT COUNT(*) FROM track_features').fetchone()[0]
+
+    cache.set_many({'a': {}, 'b': {}})
+    cache.set('c', {})
+    assert count() == 2
+    cache.set('d', {})
+    assert count() == 3
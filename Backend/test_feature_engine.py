@@ -0,0 +1,106 @@
+import time
+import numpy as np
+import librosa
+from config import Config
+from utils.audio_processor import AudioProcessor
+
+
+def reference_features(y, sr):
+    """The original one-call-per-feature extraction, kept as ground truth"""
+    features = {}
+
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    features['tempo'] = float(np.atleast_1d(tempo)[0])
+
+    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    features['spectral_centroid'] = float(np.mean(spectral_centroids))
+
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=Config.N_MFCC)
+    features['mfcc_mean'] = float(np.mean(mfccs))
+    features['mfcc_std'] = float(np.std(mfccs))
+    features['mfcc_means'] = np.mean(mfccs, axis=1).tolist()
+
+    zcr = librosa.feature.zero_crossing_rate(y)[0]
+    features['zcr'] = float(np.mean(zcr))
+
+    rms = librosa.feature.rms(y=y)[0]
+    features['energy'] = float(np.mean(rms))
+
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    features['chroma_mean'] = float(np.mean(chroma))
+    features['chroma_means'] = np.mean(chroma, axis=1).tolist()
+
+    return features
+
+
+def synthetic_clip(sr, seconds=30, bpm=120):
+    """Chord plus a click track, so every feature has something to measure"""
+    t = np.arange(int(sr * seconds)) / sr
+    y = sum(0.2 * np.sin(2 * np.pi * f * t) for f in (220.0, 277.18, 329.63))
+    beat = int(sr * 60 / bpm)
+    clicks = np.zeros_like(t)
+    clicks[::beat] = 1.0
+    y = y + np.convolve(clicks, np.hanning(256), mode='same')
+    y = y + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    return y.astype(np.float32)
+
+
+def test_engine_matches_reference():
+    sr = Config.SAMPLE_RATE
+    y = synthetic_clip(sr)
+
+    expected = reference_features(y, sr)
+    actual = AudioProcessor.extract_features_from_signal(y, sr)
+
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert np.allclose(actual[key], value, rtol=1e-4, atol=1e-6), \
+            f"{key}: {actual[key]} != {value}"
+
+
+def test_timeline_windows_match_per_window_means():
+    sr = Config.SAMPLE_RATE
+    quiet = 0.2 * synthetic_clip(sr, seconds=20, bpm=90)
+    loud = synthetic_clip(sr, seconds=24, bpm=150)
+    y = np.concatenate([quiet, loud])
+
+    timeline = AudioProcessor.summarize_windows(*AudioProcessor._frame_features(y, sr), sr, 10)
+
+    # The trailing 4 s joins the last full window
+    assert len(timeline['start']) == 4
+    assert timeline['end'][:-1] == timeline['start'][1:]
+    assert np.isclose(timeline['end'][-1], len(y) / sr, atol=0.05)
+    rms = librosa.feature.rms(y=y)[0]
+    frames = round(10 * sr / 512)
+    assert np.isclose(timeline['energy'][0], rms[:frames].mean())
+    assert timeline['energy'][-1] > 2 * timeline['energy'][0]
+
+
+if __name__ == '__main__':
+    sr = Config.SAMPLE_RATE
+    y = synthetic_clip(sr)
+
+    # Warm up numba-compiled kernels before timing
+    reference_features(y[:sr], sr)
+    AudioProcessor.extract_features_from_signal(y[:sr], sr)
+
+    start = time.perf_counter()
+    expected = reference_features(y, sr)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = AudioProcessor.extract_features_from_signal(y, sr)
+    engine_time = time.perf_counter() - start
+
+    for key in expected:
+        if np.ndim(expected[key]):
+            continue
+        print(f"{key:18} reference={expected[key]:.6f} engine={actual[key]:.6f}")
+    print(f"Reference: {reference_time:.3f}s, shared STFT: {engine_time:.3f}s")
+
+    test_engine_matches_reference()
+    print("✅ Feature engine matches reference")
+
+    test_timeline_windows_match_per_window_means()
+    print("✅ Timeline windows match per-window means")
+
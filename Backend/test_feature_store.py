@@ -0,0 +1,83 @@
+import pytest
+import numpy as np
+from models.mood_classifier import MoodClassifier
+from utils.feature_store import FeatureStore
+
+
+def features(seed):
+    rng = np.random.default_rng(seed)
+    return {
+        'tempo': 120.0,
+        'spectral_centroid': 2000.0,
+        'zcr': 0.1,
+        'energy': 0.2,
+        'chroma_mean': 0.4,
+        'mfcc_mean': -5.0,
+        'mfcc_std': 40.0,
+        'mfcc_means': rng.normal(size=13).tolist(),
+        'chroma_means': rng.random(12).tolist()
+    }
+
+
+def test_rows_are_shared_between_instances(tmp_path):
+    writer = FeatureStore(str(tmp_path))
+    reader = FeatureStore(str(tmp_path))
+
+    writer.append('a', features(0), 0.8, 0.9, 'Happy')
+    writer.append('b', features(1), 0.2, 0.1, 'Sad')
+
+    assert len(reader) == 2
+    record = reader.get('b')
+    assert record['mood'] == 'Sad'
+    assert record['rms'] == np.float32(0.2)
+    assert np.allclose([record[f'mfcc_{i}'] for i in range(13)], features(1)['mfcc_means'])
+    assert isinstance(reader.matrix(), np.memmap)
+
+
+def test_reappended_id_uses_newest_row(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append('a', features(0), 0.8, 0.9, 'Happy')
+    store.append('b', features(1), 0.5, 0.5, 'Calm')
+    store.append('a', features(0), 0.2, 0.1, 'Sad')
+
+    assert store.get('a')['mood'] == 'Sad'
+    assert store.stats() == {'tracks': 2, 'rows': 3, 'bytes': 3 * len(store.columns) * 4}
+
+    ids, moods, _ = store.reclassify(MoodClassifier())
+    assert dict(zip(ids, moods)) == {'a': 'Sad', 'b': 'Calm'}
+
+
+def test_similar_finds_nearest_vectors(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    base = features(0)
+    near = dict(base, mfcc_means=[v + 0.01 for v in base['mfcc_means']])
+    store.append('base', base, 0.5, 0.5, 'Calm')
+    store.append('far', features(1), 0.5, 0.5, 'Calm')
+    store.append('near', near, 0.5, 0.5, 'Calm')
+
+    assert [track_id for track_id, _ in store.similar('base', k=2)] == ['near', 'far']
+
+
+def test_lookups_skip_rereading_an_unchanged_id_file(tmp_path, monkeypatch):
+    store = FeatureStore(str(tmp_path))
+    store.append('a', features(0), 0.5, 0.5, 'Calm')
+    store.append('b', features(1), 0.5, 0.5, 'Calm')
+    reads = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda path, *args, **kwargs: (
+        reads.append(path), real_open(path, *args, **kwargs))[1])
+
+    assert 'a' in store and store.get('b') is not None
+    assert store.similar('a', k=1)[0][0] == 'b'
+    assert reads == []
+
+    FeatureStore(str(tmp_path)).append('c', features(0), 0.5, 0.5, 'Calm')
+    assert 'c' in store
+    assert store.similar('a', k=1)[0][0] == 'c'
+
+
+def test_track_ids_with_newlines_are_rejected(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.append('a\nb', features(0), 0.5, 0.5, 'Calm')
+    assert len(store) == 0
@@ -0,0 +1,87 @@
+import os
+import time
+from utils.file_store import FileStore, upload_id, remix_id
+
+
+def test_names_are_content_addressed():
+    digest = 'ab' * 32
+    assert upload_id(digest, 'My Song.MP3') == 'ab' * 16 + '.mp3'
+    assert remix_id(upload_id(digest, 'a.wav'), 'Happy') == f"remix_happy_{'ab' * 16}.mp3"
+
+
+def test_evicts_least_recently_used_over_size(tmp_path):
+    store = FileStore(str(tmp_path), max_bytes=10)
+    store.write('a', b'12345')
+    store.write('b', b'12345')
+    store.touch('a')
+    store.write('c', b'12345')
+
+    assert store.exists('a') and store.exists('c')
+    assert not store.exists('b')
+    assert not os.path.exists(tmp_path / 'b')
+    assert store.stats()['bytes'] == 10
+
+
+def test_referenced_files_survive_eviction(tmp_path):
+    store = FileStore(str(tmp_path), max_bytes=10, max_age=60)
+    store.write('input', b'12345')
+    store.acquire('input')
+    store._files['input'] = (5, time.time() - 120)
+    store.evict()
+    assert store.exists('input')
+
+    store.release('input')
+    store.evict()
+    assert not store.exists('input')
+
+
+def test_scan_tracks_existing_files_and_drops_partial_uploads(tmp_path):
+    (tmp_path / 'kept.mp3').write_bytes(b'123')
+    (tmp_path / '.incoming-abc').write_bytes(b'partial')
+    (tmp_path / '.incoming-new').write_bytes(b'still uploading')
+    old = time.time() - 2 * 3600
+    os.utime(tmp_path / '.incoming-abc', (old, old))
+
+    store = FileStore(str(tmp_path))
+
+    assert store.exists('kept.mp3')
+    assert store.stats()['bytes'] == 3
+    assert not os.path.exists(tmp_path / '.incoming-abc')
+    assert os.path.exists(tmp_path / '.incoming-new')
+
+
+def test_picks_up_files_written_by_another_process(tmp_path):
+    store = FileStore(str(tmp_path))
+    other = FileStore(str(tmp_path))
+    other.write('shared.mp3', b'12345')
+
+    assert store.touch('shared.mp3')
+    assert store.stats()['bytes'] == 5
+    assert not store.exists('.shared.mp3.part')
+
+
+def test_shared_folder_honours_other_processes_references(tmp_path):
+    owner = FileStore(str(tmp_path), max_bytes=5, shared=True, owner=True)
+    other = FileStore(str(tmp_path), max_bytes=5, shared=True, owner=False)
+    other.write('input', b'12345')
+    other.acquire('input')
+    # Marker names carry the holder's pid; pretend another live process holds it
+    marker = next(p for p in os.listdir(tmp_path) if p.startswith('.ref-'))
+    os.rename(tmp_path / marker, tmp_path / marker.replace(f"-{os.getpid()}-", f"-{os.getppid()}-"))
+
+    owner.write('newer', b'12345')
+    assert os.path.exists(tmp_path / 'input')
+    assert not os.path.exists(tmp_path / 'newer')
+
+    other.write('extra', b'1')
+    assert os.path.exists(tmp_path / 'extra')
+
+
+def test_markers_of_exited_processes_are_ignored(tmp_path):
+    (tmp_path / 'input').write_bytes(b'12345')
+    (tmp_path / '.ref-999999999-abcd1234-input').write_bytes(b'')
+    store = FileStore(str(tmp_path), max_bytes=1, shared=True)
+    store.evict()
+
+    assert not os.path.exists(tmp_path / 'input')
+    assert not os.path.exists(tmp_path / '.ref-999999999-abcd1234-input')
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from utils.job_runner import JobRegistry, JobRunner, QueueFullError
+
+
+class FakeRunner:
+    """Hands out futures the test completes by hand"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+class SlowSharedCache:
+    """Shared tier stand-in that never has anything and answers slowly"""
+
+    def get(self, key, default=None):
+        time.sleep(0.02)
+        return default
+
+    def set_many(self, items, ttl=None):
+        pass
+
+
+def test_concurrent_submits_share_one_job():
+    runner = FakeRunner()
+    # A slow shared-tier lookup widens any gap between checking and inserting
+    registry = JobRegistry(runner, shared=SlowSharedCache())
+    jobs = []
+    threads = [
+        threading.Thread(target=lambda: jobs.append(registry.submit('remix', print)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(runner.futures) == 1
+    assert len({job['id'] for job in jobs}) == 1
+
+
+def test_on_done_runs_after_finish_and_for_reused_jobs():
+    runner = FakeRunner()
+    registry = JobRegistry(runner)
+    seen = []
+    job = registry.submit('remix', print, result='out.mp3', on_done=seen.append)
+    registry.submit('remix', print, on_done=seen.append)
+    assert [record['status'] for record in seen] == ['queued']
+
+    runner.futures[0].set_result(True)
+    assert seen[-1]['status'] == 'done'
+    assert registry.get(job['id'])['result'] == 'out.mp3'
+
+
+class DictSharedCache:
+    """In-process stand-in for the shared tier"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key, default=None):
+        assert key is not None
+        return self.entries.get(key, default)
+
+    def set_many(self, items, ttl=None):
+        self.entries.update(items)
+
+
+def test_shared_job_of_a_dead_worker_is_replaced():
+    shared = DictSharedCache()
+    other = JobRegistry(FakeRunner(), shared=shared)
+    lost = other.submit('remix', print)
+    # Pretend its owner exited long ago without finishing it
+    shared.entries[lost['id']]['heartbeat_at'] -= 3600
+
+    runner = FakeRunner()
+    registry = JobRegistry(runner, shared=shared)
+    assert registry.get(lost['id'])['status'] == 'failed'
+    job = registry.submit('remix', print)
+    assert job['id'] != lost['id'] and len(runner.futures) == 1
+    assert registry.find('missing') is None
+
+
+def test_live_shared_job_is_reused():
+    shared = DictSharedCache()
+    other = JobRegistry(FakeRunner(), shared=shared)
+    running = other.submit('remix', print)
+
+    runner = FakeRunner()
+    job = JobRegistry(runner, shared=shared).submit('remix', print)
+    assert job['id'] == running['id'] and not runner.futures
+
+
+def test_prune_drops_finished_jobs_behind_live_ones():
+    runner = FakeRunner()
+    registry = JobRegistry(runner, max_jobs=2)
+    live = registry.submit('live', print)
+    first = registry.submit('first', print)
+    runner.futures[1].set_result(True)
+    second = registry.submit('second', print)
+    runner.futures[2].set_result(True)
+    registry.submit('third', print)
+
+    assert registry.get(live['id'])['status'] == 'queued'
+    assert registry.get(first['id']) is None and registry.get(second['id']) is None
+    assert 'progress' not in registry.get(live['id'])
+
+
+def crash():
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    runner = JobRunner(max_workers=1, max_pending=2, timeout=0.1)
+    yield runner
+    runner.shutdown()
+
+
+def test_full_queue_is_refused_until_a_slot_frees(pool):
+    first = pool.submit(time.sleep, 0.3)
+    pool.submit(time.sleep, 0.3)
+    with pytest.raises(QueueFullError):
+        pool.submit(abs, -1)
+
+    first.result(timeout=5)
+    assert pool.submit(abs, -1).result(timeout=5) == 1
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(pool):
+    slow = pool.submit(time.sleep, 0.5)
+    with pytest.raises(FutureTimeoutError):
+        slow.result(timeout=pool.timeout)
+    assert pool.stats()['pending'] == 1
+
+    slow.result(timeout=5)
+    assert pool.stats()['pending'] == 0
+
+
+def test_pool_recovers_after_a_worker_dies(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(crash).result(timeout=10)
+
+    assert pool.submit(abs, -2).result(timeout=10) == 2
+    assert pool.submit(abs, -3).result(timeout=10) == 3
+    assert pool.stats()['pending'] == 0
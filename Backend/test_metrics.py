@@ -0,0 +1,46 @@
+import json
+import logging
+from utils.log_format import JsonFormatter, KeyValueFormatter
+from utils.metrics import Registry
+
+
+def test_render_prometheus_text():
+    registry = Registry(buckets=(0.1, 1.0))
+    registry.observe('moodtune_stage_seconds', 0.05, stage='decode')
+    registry.observe('moodtune_stage_seconds', 0.5, stage='decode')
+    registry.inc('moodtune_errors_total', where='analyze')
+    registry.inc('moodtune_errors_total', where='analyze')
+    registry.register_collector(lambda: [('moodtune_cache_hits_total', 'counter', {'cache': 'feature'}, 3)])
+
+    lines = registry.render().splitlines()
+
+    assert '# TYPE moodtune_stage_seconds histogram' in lines
+    assert 'moodtune_stage_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'moodtune_stage_seconds_bucket{stage="decode",le="1.0"} 2' in lines
+    assert 'moodtune_stage_seconds_bucket{stage="decode",le="+Inf"} 2' in lines
+    assert 'moodtune_stage_seconds_count{stage="decode"} 2' in lines
+    assert 'moodtune_errors_total{where="analyze"} 2' in lines
+    assert 'moodtune_cache_hits_total{cache="feature"} 3' in lines
+
+
+def test_failing_collector_is_logged_and_skipped(caplog):
+    registry = Registry()
+    registry.inc('moodtune_errors_total', where='analyze')
+    registry.register_collector(lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+
+    assert 'moodtune_errors_total{where="analyze"} 1' in lines
+    assert any(r.levelname == 'WARNING' and 'collector' in r.getMessage() for r in caplog.records)
+
+
+def test_log_records_are_key_value_or_json():
+    record = logging.LogRecord('moodtune', logging.INFO, __file__, 1, 'request done', (), None)
+    record.status = 200
+    record.endpoint = '/api/analyze'
+
+    line = KeyValueFormatter().format(record)
+    assert ' level=INFO logger=moodtune msg="request done" status=200 endpoint=/api/analyze' in line
+
+    fields = json.loads(JsonFormatter().format(record))
+    assert fields['msg'] == 'request done' and fields['status'] == 200
@@ -0,0 +1,34 @@
+import numpy as np
+from models.mood_classifier import MoodClassifier, MOOD_THRESHOLDS, within_thresholds
+
+
+def test_batch_matches_scalar_classifier():
+    classifier = MoodClassifier()
+    grid = np.linspace(0.0, 1.0, 21)
+    valence, energy = (a.ravel() for a in np.meshgrid(grid, grid))
+
+    moods, confidences, matches = classifier.classify_mood_batch(valence, energy)
+
+    for i, (v, e) in enumerate(zip(valence, energy)):
+        assert (moods[i], confidences[i]) == classifier.classify_mood_simple(v, e)
+        for mood, limits in MOOD_THRESHOLDS.items():
+            assert matches[mood][i] == within_thresholds(limits, float(v), float(e))
+
+    assert matches['Happy'][(valence == 0.5) & (energy == 0.5)].all()
+    assert not matches['Energetic'][energy < 0.65].any()
+
+
+def test_batch_applies_tempo_like_scalar_classifier():
+    classifier = MoodClassifier()
+    valence = np.array([0.5, 0.5, 0.5, 0.5, 0.2])
+    energy = np.array([0.55, 0.55, 0.45, 0.55, 0.3])
+    tempo = np.array([140.0, 100.0, 140.0, np.nan, 140.0])
+
+    moods, confidences, _ = classifier.classify_mood_batch(valence, energy, tempo)
+
+    assert moods.tolist() == ['Energetic', 'Calm', 'Calm', 'Calm', 'Sad']
+    for i, (v, e, t) in enumerate(zip(valence, energy, tempo)):
+        scalar_tempo = None if np.isnan(t) else t
+        assert (moods[i], confidences[i]) == classifier.classify_mood_simple(v, e, scalar_tempo)
+    # Without a tempo nothing changes
+    assert classifier.classify_mood_batch(valence, energy)[0].tolist() == ['Calm', 'Calm', 'Calm', 'Calm', 'Sad']
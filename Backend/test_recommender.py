@@ -0,0 +1,70 @@
+from models.mood_classifier import MoodClassifier
+from utils.recommender import RecommendationPool, SEARCH_QUERIES
+
+
+class FakeSpotify:
+    """Search pages of fresh tracks where every other one sounds happy"""
+
+    def __init__(self):
+        self.search_limits = []
+        self.features = {}
+
+    def search_tracks_many(self, queries, limit=20, market=None, timeout=None):
+        self.search_limits.append(limit)
+        results = {}
+        for q, query in enumerate(queries):
+            results[query] = [{'id': f'{q}-{i}', 'name': query} for i in range(limit)]
+            for i in range(limit):
+                happy = i % 2 == 0
+                self.features[f'{q}-{i}'] = {
+                    'valence': 0.8 if happy else 0.2,
+                    'energy': 0.8 if happy else 0.2,
+                    'tempo': 120.0
+                }
+        return results
+
+    def get_audio_features_batch(self, track_ids):
+        return {track_id: self.features[track_id] for track_id in track_ids}
+
+
+def test_pool_searches_enough_candidates_to_fill_itself():
+    spotify = FakeSpotify()
+    pool = RecommendationPool(spotify, MoodClassifier(), pool_size=60)
+
+    pool.refresh('Happy')
+
+    # Half the candidates pass, so the usual 20 per query would yield 40
+    assert spotify.search_limits[-1] * len(SEARCH_QUERIES['Happy']) >= 3 * 60
+    assert pool.stats()['Happy']['size'] == 60
+    assert len(pool.sample('Happy', k=20)) == 20
+
+
+class SadSpotify(FakeSpotify):
+    """Search hits that never sound happy, with the Recommendations API down"""
+
+    def __init__(self):
+        super().__init__()
+        self.sp = self
+
+    def get_audio_features_batch(self, track_ids):
+        return {track_id: {'valence': 0.2, 'energy': 0.2, 'tempo': 120.0} for track_id in track_ids}
+
+    def recommendations(self, **params):
+        raise RuntimeError('Recommendations endpoint unavailable')
+
+    def call_with_timeout(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            return None
+
+
+def test_unverified_results_do_not_replace_the_pool():
+    pool = RecommendationPool(FakeSpotify(), MoodClassifier(), pool_size=20)
+    pool.refresh('Happy')
+    previous = pool.sample('Happy', k=20)
+
+    pool.spotify_client = SadSpotify()
+    pool.refresh('Happy')
+
+    assert sorted(t['id'] for t in pool.sample('Happy', k=20)) == sorted(t['id'] for t in previous)
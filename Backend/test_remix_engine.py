@@ -0,0 +1,38 @@
+import numpy as np
+from utils import remix_engine
+
+
+def test_render_leaves_shared_samples_untouched():
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, (44100, 2)).astype(np.float32)
+    samples.flags.writeable = False
+    original = samples.copy()
+
+    for speed, volume in ((1.0, 2), (0.85, -1), (1.15, 3)):
+        rendered, _ = remix_engine.render(samples, 44100, speed, volume)
+        assert rendered is not samples
+
+    assert np.array_equal(samples, original)
+
+
+def test_decode_cache_decodes_each_file_once(tmp_path):
+    path = tmp_path / 'input.wav'
+    path.write_bytes(b'audio')
+    decodes = []
+
+    def decode(input_path):
+        decodes.append(input_path)
+        return np.zeros((100, 2), dtype=np.float32), 44100
+
+    cache = remix_engine.DecodeCache(max_bytes=10 ** 6)
+    first, _ = cache.get(str(path), decode)
+    second, _ = cache.get(str(path), decode)
+
+    assert len(decodes) == 1
+    assert first is second
+    assert not first.flags.writeable
+    assert cache.stats()['hits'] == 1
+
+    # Replaced on disk: decoded again
+    path.write_bytes(b'other audio')
+    cache.get(str(path), decode)
+    assert len(decodes) == 2
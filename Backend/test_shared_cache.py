@@ -0,0 +1,49 @@
+import os
+import pytest
+from utils import shared_cache
+from utils.shared_cache import SharedCache
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.delenv(shared_cache.ADDRESS_ENV, raising=False)
+    monkeypatch.delenv(shared_cache.AUTHKEY_ENV, raising=False)
+    manager = shared_cache.start_server(max_entries=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_disabled_without_server(monkeypatch):
+    monkeypatch.delenv(shared_cache.ADDRESS_ENV, raising=False)
+    cache = SharedCache('test')
+    cache.set('a', 1)
+    assert not cache.enabled
+    assert cache.get('a') is None
+
+
+def test_values_are_shared_across_processes(server):
+    writer = SharedCache('test')
+    writer.set_many({'a': 1, 'b': 2, 'c': 3})
+    # Oldest entry is dropped once the namespace is full
+    assert writer.get_many(['a', 'b', 'c']) == {'b': 2, 'c': 3}
+    assert SharedCache('other').get('b') is None
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if writer.get('c') == 3 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_expired_values_miss(server):
+    cache = SharedCache('test', ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_dead_server_is_a_miss(server):
+    cache = SharedCache('test')
+    cache.set('a', 1)
+    server.shutdown()
+    assert cache.get('a') is None
+    assert cache.stats()['errors'] == 1
@@ -0,0 +1,61 @@
+from utils.spotify_client import SpotifyClient, FeatureCache, AUDIO_FEATURES_BATCH_SIZE
+
+
+class RecordingSpotify:
+    """Stands in for spotipy: audio features for any ID, calls recorded"""
+
+    def __init__(self):
+        self.calls = []
+
+    def audio_features(self, track_ids):
+        self.calls.append(list(track_ids))
+        return [{'id': track_id, 'valence': 0.5} if track_id != 'gone' else None
+                for track_id in track_ids]
+
+
+def client_with(sp):
+    client = SpotifyClient(feature_cache=FeatureCache(), access_token='test')
+    client._sp = sp
+    return client
+
+
+def test_audio_features_are_fetched_in_batches():
+    sp = RecordingSpotify()
+    client = client_with(sp)
+    ids = [f't{i}' for i in range(AUDIO_FEATURES_BATCH_SIZE + 50)] + ['t0', 'gone', None]
+
+    features = client.get_audio_features_batch(ids)
+
+    assert [len(call) for call in sp.calls] == [AUDIO_FEATURES_BATCH_SIZE, 51]
+    assert len(features) == AUDIO_FEATURES_BATCH_SIZE + 51
+    assert features['t0'] == {'id': 't0', 'valence': 0.5}
+    assert features['gone'] is None
+
+
+def test_cached_features_are_not_fetched_again():
+    sp = RecordingSpotify()
+    client = client_with(sp)
+    client.get_audio_features_batch(['a', 'b'])
+
+    features = client.get_audio_features_batch(['a', 'b', 'c'])
+
+    assert sp.calls == [['a', 'b'], ['c']]
+    assert set(features) == {'a', 'b', 'c'}
+
+
+class FailingSpotify:
+    def __init__(self):
+        self.calls = 0
+
+    def audio_features(self, track_ids):
+        self.calls += 1
+        raise ConnectionError('Spotify unavailable')
+
+
+def test_failed_batches_are_retried_next_time():
+    sp = FailingSpotify()
+    client = client_with(sp)
+
+    assert client.get_audio_features_batch(['a']) == {'a': None}
+    client.get_audio_features_batch(['a'])
+    assert sp.calls == 2
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from utils import metrics
+from utils.spotify_client import SpotifyClient, TokenBucket
+
+
+class FakeSpotify(BaseHTTPRequestHandler):
+    """Answers /v1/search slowly; the first ``throttle`` requests get a 429"""
+
+    calls = 0
+    throttle = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            type(self).calls += 1
+            throttled = type(self).throttle > 0
+            type(self).throttle -= throttled
+
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        time.sleep(0.2)
+        body = json.dumps({'tracks': {'items': [{'id': 'track1', 'name': self.path}]}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_client(**kwargs):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeSpotify.calls, FakeSpotify.throttle = 0, 0
+    client = SpotifyClient(
+        api_prefix=f"http://127.0.0.1:{server.server_port}/v1/",
+        access_token='test-token', **kwargs
+    )
+    return client, server
+
+
+def test_identical_concurrent_searches_are_coalesced():
+    client, server = fake_client()
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: client.sp.search(q='calm songs', type='track', limit=5), range(8)
+            ))
+        assert FakeSpotify.calls == 1
+        assert client.stats()['coalesced'] == 7
+        assert all(result == results[0] for result in results)
+
+        client.search_tracks_many(['a', 'b', 'c'])
+        assert FakeSpotify.calls == 4
+    finally:
+        server.shutdown()
+
+
+def test_rate_limited_call_waits_for_retry_after():
+    client, server = fake_client()
+    FakeSpotify.throttle = 1
+    try:
+        start = time.monotonic()
+        result = client.sp.search(q='sad songs', type='track', limit=5)
+        assert result['tracks']['items'][0]['id'] == 'track1'
+        assert time.monotonic() - start >= 1.0
+        assert FakeSpotify.calls == 2
+        assert client.stats()['rate_limited'] == 1
+    finally:
+        server.shutdown()
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    assert time.monotonic() - start >= 10 / 50 * 0.9
+
+
+def test_each_concurrent_call_gets_its_own_deadline():
+    client = SpotifyClient(access_token='test-token', pool_workers=1)
+    calls = {key: (lambda: time.sleep(0.15) or True) for key in ('a', 'b', 'c')}
+    calls['hung'] = lambda: time.sleep(1)
+
+    # 'b' and 'c' wait behind 'a' longer than the timeout but still answer
+    results = client.run_concurrently(calls, timeout=0.2)
+    assert results == {'a': True, 'b': True, 'c': True}
+
+    hung = {'hung': lambda: time.sleep(1), 'queued': lambda: True}
+    start = time.monotonic()
+    assert client.run_concurrently(hung, timeout=0.2) == {}
+    assert time.monotonic() - start < 0.5
+
+
+def test_failed_connections_are_counted_as_upstream_calls():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpotify)
+    port = server.server_port
+    server.server_close()
+    client = SpotifyClient(api_prefix=f"http://127.0.0.1:{port}/v1/", access_token='test-token')
+
+    before = metrics.REGISTRY.value('moodtune_upstream_calls_total', endpoint='search',
+                                    status='ConnectionError')
+    with pytest.raises(requests.ConnectionError):
+        client.sp.search(q='calm songs', type='track', limit=5)
+    assert metrics.REGISTRY.value('moodtune_upstream_calls_total', endpoint='search',
+                                  status='ConnectionError') == before + 1
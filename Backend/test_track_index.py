@@ -0,0 +1,84 @@
+import time
+import numpy as np
+from utils.track_index import TrackIndex, FEATURE_KEYS, TEMPO_SCALE
+
+
+def synthetic_catalogue(n, seed=0):
+    """Random tracks with Spotify-shaped objects and audio features"""
+    rng = np.random.default_rng(seed)
+    tracks, features_by_id = [], {}
+    for i in range(n):
+        track_id = f"track{i}"
+        tracks.append({
+            'id': track_id,
+            'name': f"Song {i}",
+            'artists': [{'name': 'Artist', 'id': 'a1'}],
+            'album': {'name': 'Album', 'images': [{'url': 'http://img'}]},
+            'preview_url': None,
+            'external_urls': {'spotify': f"http://open/{track_id}"}
+        })
+        features_by_id[track_id] = {
+            'valence': float(rng.random()),
+            'energy': float(rng.random()),
+            'tempo': float(rng.uniform(60, 180)),
+            'danceability': float(rng.random()),
+            'acousticness': float(rng.random())
+        }
+    return tracks, features_by_id
+
+
+def brute_force(features_by_id, target, k):
+    keys = [key for key in FEATURE_KEYS if key in target]
+    scale = {key: TEMPO_SCALE if key == 'tempo' else 1.0 for key in keys}
+    distances = {
+        track_id: sum(((f[key] - target[key]) / scale[key]) ** 2 for key in keys)
+        for track_id, f in features_by_id.items()
+    }
+    return sorted(distances, key=distances.get)[:k]
+
+
+def test_query_matches_brute_force():
+    tracks, features_by_id = synthetic_catalogue(2000)
+    index = TrackIndex(capacity=16)
+    assert index.add_many(tracks, features_by_id) == len(tracks)
+
+    target = {'valence': 0.8, 'energy': 0.8, 'tempo': 120}
+    result = index.query(target, k=10)
+
+    assert [track['id'] for track, _ in result] == brute_force(features_by_id, target, 10)
+    assert np.isclose(result[0][1]['tempo'], features_by_id[result[0][0]['id']]['tempo'], rtol=1e-5)
+
+
+def test_updates_exclusions_and_persistence(tmp_path):
+    tracks, features_by_id = synthetic_catalogue(50)
+    path = str(tmp_path / 'index.npz')
+    index = TrackIndex(path=path)
+    index.add_many(tracks, features_by_id)
+
+    index.add(tracks[0], {'valence': 0.0, 'energy': 0.0, 'tempo': 0.0})
+    assert len(index) == 50
+    assert index.query({'valence': 0.0, 'energy': 0.0, 'tempo': 0.0}, k=1)[0][0]['id'] == 'track0'
+    assert index.query({'valence': 0.0, 'energy': 0.0}, k=1, exclude=['track0'])[0][0]['id'] != 'track0'
+    assert not index.add(tracks[1], None)
+
+    index.save()
+    reloaded = TrackIndex(path=path)
+    assert len(reloaded) == 50
+    target = {'valence': 0.3, 'energy': 0.6}
+    assert [t['id'] for t, _ in reloaded.query(target)] == [t['id'] for t, _ in index.query(target)]
+
+
+if __name__ == '__main__':
+    tracks, features_by_id = synthetic_catalogue(300000)
+
+    start = time.perf_counter()
+    index = TrackIndex()
+    index.add_many(tracks, features_by_id)
+    print(f"Indexed {len(index)} tracks in {time.perf_counter() - start:.2f}s")
+
+    target = {'valence': 0.8, 'energy': 0.8, 'tempo': 120}
+    index.query(target, k=60)
+    start = time.perf_counter()
+    for _ in range(100):
+        index.query(target, k=60)
+    print(f"k=60 query: {(time.perf_counter() - start) * 10:.2f} ms")
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+CHUNK_SIZE = 64 * 1024
+
+# Uploads up to this size are analyzed from memory; larger ones go to disk
+UPLOAD_MEMORY_LIMIT = 16 * 1024 * 1024
+
+
+def read_and_hash(stream, spill_path, memory_limit=UPLOAD_MEMORY_LIMIT, chunk_size=CHUNK_SIZE):
+    """Read an upload stream into memory while hashing it.
+
+    Returns ``(data, digest)``. Once more than ``memory_limit`` bytes have
+    arrived, what was buffered and the rest of the stream are written to
+    ``spill_path`` instead and ``data`` is None.
+    """
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return buffer.getvalue(), digest.hexdigest()
+        digest.update(chunk)
+        buffer.write(chunk)
+        if buffer.tell() > memory_limit:
+            break
+
+    with open(spill_path, 'wb') as out:
+        out.write(buffer.getbuffer())
+        buffer = None
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return None, digest.hexdigest()
+
+
+class UploadBuffer:
+    """Recent in-memory uploads, written to disk only when a remix needs one.
+
+    Keyed by upload filename and bounded to ``max_bytes`` in total; the
+    least recently stored uploads leave first. Uploads that leave (or never
+    fit) are handed to ``on_evict(filename, data)``, so they can be kept on
+    disk instead of lost.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, on_evict=None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.size = 0
+        self.flushed = 0
+        self.spilled = 0
+        self._entries = OrderedDict()
+        self._spilling = {}
+        self._lock = threading.Lock()
+
+    def put(self, filename, data):
+        dropped = []
+        with self._lock:
+            old = self._entries.pop(filename, None)
+            if old is not None:
+                self.size -= len(old)
+            if len(data) > self.max_bytes:
+                dropped.append((filename, data))
+            else:
+                self._entries[filename] = data
+                self.size += len(data)
+            while self.size > self.max_bytes:
+                item = self._entries.popitem(last=False)
+                self.size -= len(item[1])
+                dropped.append(item)
+            if self.on_evict is not None:
+                # Still flushable while being written out
+                self._spilling.update(dropped)
+        if self.on_evict is not None:
+            for name, dropped_data in dropped:
+                try:
+                    self.on_evict(name, dropped_data)
+                finally:
+                    with self._lock:
+                        self._spilling.pop(name, None)
+                        self.spilled += 1
+
+    def flush(self, filename, path):
+        """Write a buffered upload to ``path``; returns False if it is gone"""
+        with self._lock:
+            data = self._entries.pop(filename, None)
+            if data is None:
+                data = self._spilling.get(filename)
+                if data is None:
+                    return False
+            else:
+                self.size -= len(data)
+            self.flushed += 1
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'flushed': self.flushed,
+            'spilled': self.spilled
+        }
+
+
+class AnalysisCache:
+    """Bounded LRU of analysis results keyed by upload content digest.
+
+    With a ``shared`` cache, results are also published to it and local
+    misses are looked up there, so other worker processes reuse them.
+    """
+
+    def __init__(self, max_entries=512, shared=None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            result = self._entries.get(digest)
+            if result is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return result
+
+        result = self.shared.get(digest) if self.shared is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self._remember(digest, result)
+            self.hits += 1
+            return result
+
+    def set(self, digest, result):
+        with self._lock:
+            self._remember(digest, result)
+        if self.shared is not None:
+            self.shared.set(digest, result)
+
+    def _remember(self, digest, result):
+        self._entries[digest] = result
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
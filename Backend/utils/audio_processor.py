@@ -1,42 +1,466 @@
-import librosa
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
-from pydub import AudioSegment
-import soundfile as sf
 from config import Config
+from utils import metrics, remix_engine
+
+logger = logging.getLogger(__name__)
+
+# librosa's default analysis frame; every spectral feature shares this STFT
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Analysis modes: 'window' reads the first 30 s, 'stream' walks the whole file
+# in fixed-size blocks, 'segments' samples evenly spaced windows
+ANALYSIS_WINDOW_SECONDS = 30
+STREAM_BLOCK_SECONDS = 10
+SEGMENT_COUNT = 3
+SEGMENT_SECONDS = 10
+
+# Mood timeline: the whole track (up to TIMELINE_MAX_SECONDS) summarized per
+# window. Spectra are computed TIMELINE_BLOCK_SECONDS at a time so memory
+# stays bounded; only per-frame summaries of the whole track are kept.
+TIMELINE_WINDOW_SECONDS = 10
+TIMELINE_MAX_SECONDS = 600
+TIMELINE_BLOCK_SECONDS = 30
+
+# Per-window tempo is the tempogram peak weighted by a log-normal prior
+# around 120 BPM, as librosa's own tempo estimate does
+TIMELINE_PRIOR_BPM = 120.0
+TIMELINE_MAX_BPM = 320.0
+TEMPOGRAM_WIN_LENGTH = 384
+
+# Preview pass for a preliminary mood: a short, mono, low-rate decode and
+# only the cheap features. Typical values stand in for the chroma and tempo
+# it skips.
+PREVIEW_SAMPLE_RATE = 11025
+PREVIEW_SECONDS = 10
+PREVIEW_N_FFT = 1024
+PREVIEW_CHROMA_MEAN = 0.4
+PREVIEW_TEMPO = 120.0
+
+# Speed and gain (dB) applied for each mood remix
+REMIX_PRESETS = {
+    'Happy': {'speed': 1.0, 'volume': 2},
+    'Sad': {'speed': 0.9, 'volume': -2},
+    'Energetic': {'speed': 1.15, 'volume': 3},
+    'Calm': {'speed': 0.85, 'volume': -1}
+}
+DEFAULT_PRESET = {'speed': 1.0, 'volume': 0}
+
+# Per worker process, so it only helps when a later render of the same input
+# lands on the same pool worker. Remixing all moods at once (the app's
+# default) needs a single decode anyway; this mostly serves re-renders, and
+# one track of float32 stereo PCM is enough for that.
+_decoded = remix_engine.DecodeCache(
+    max_bytes=getattr(Config, 'REMIX_DECODE_CACHE_BYTES', 64 * 1024 * 1024)
+)
+
+
+@contextmanager
+def _temporary_copy(data, suffix=''):
+    """Path of a temporary file holding ``data``, removed afterwards"""
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+
+def _load(source, suffix='', **kwargs):
+    """``librosa.load`` from a file path or an upload's bytes.
+
+    Bytes are decoded in memory when soundfile can read the format; others
+    (such as m4a, which audioread only opens from a file) go through a
+    temporary file named with ``suffix``.
+    """
+    import librosa
+    
+    if not isinstance(source, bytes):
+        return librosa.load(source, **kwargs)
+    try:
+        return librosa.load(io.BytesIO(source), **kwargs)
+    except Exception as e:
+        logger.info("In-memory decode failed (%s), using a temporary file", e)
+    with _temporary_copy(source, suffix) as path:
+        return librosa.load(path, **kwargs)
+
+
+class _RunningFeatures:
+    """Combines per-block feature dicts into whole-track statistics.
+
+    Means (including the per-coefficient MFCC and chroma vectors) are
+    weighted by block length, the MFCC standard deviation is merged with the
+    parallel-variance formula, and tempo is the length-weighted median of
+    the block estimates so one odd block can't drag it off.
+    """
+    
+    MEAN_KEYS = ('spectral_centroid', 'zcr', 'energy', 'chroma_mean')
+    VECTOR_KEYS = ('mfcc_means', 'chroma_means')
+    
+    def __init__(self):
+        self.weight = 0.0
+        self.sums = dict.fromkeys(self.MEAN_KEYS, 0.0)
+        self.vector_sums = dict.fromkeys(self.VECTOR_KEYS, 0.0)
+        self.mfcc_mean = 0.0
+        self.mfcc_m2 = 0.0
+        self.tempos = []
+    
+    def add(self, features, weight):
+        if weight <= 0:
+            return
+        for key in self.MEAN_KEYS:
+            self.sums[key] += features[key] * weight
+        for key in self.VECTOR_KEYS:
+            self.vector_sums[key] = self.vector_sums[key] + np.asarray(features[key]) * weight
+        
+        total = self.weight + weight
+        delta = features['mfcc_mean'] - self.mfcc_mean
+        self.mfcc_m2 += features['mfcc_std'] ** 2 * weight + delta ** 2 * self.weight * weight / total
+        self.mfcc_mean += delta * weight / total
+        self.weight = total
+        self.tempos.append((features['tempo'], weight))
+    
+    def result(self):
+        if not self.weight:
+            return None
+        features = {key: self.sums[key] / self.weight for key in self.MEAN_KEYS}
+        for key in self.VECTOR_KEYS:
+            features[key] = (self.vector_sums[key] / self.weight).tolist()
+        features['mfcc_mean'] = self.mfcc_mean
+        features['mfcc_std'] = float(np.sqrt(self.mfcc_m2 / self.weight))
+        
+        tempos = sorted(self.tempos)
+        half, seen = self.weight / 2, 0.0
+        for tempo, weight in tempos:
+            seen += weight
+            if seen >= half:
+                features['tempo'] = tempo
+                break
+        return features
+
 
 class AudioProcessor:
     
     @staticmethod
-    def extract_features(file_path):
+    def extract_features(file_path, mode='window'):
+        import librosa
+        
         try:
-            y, sr = librosa.load(file_path, sr=Config.SAMPLE_RATE, duration=30)
-            
-            features = {}
+            if mode == 'stream':
+                return AudioProcessor.extract_features_streaming(file_path)
+            if mode == 'segments':
+                return AudioProcessor.extract_features_segments(file_path)
             
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            features['tempo'] = float(tempo)
+            with metrics.span('decode'):
+                y, sr = librosa.load(file_path, sr=Config.SAMPLE_RATE, duration=ANALYSIS_WINDOW_SECONDS)
+            return AudioProcessor.extract_features_from_signal(y, sr)
+        except Exception as e:
+            logger.error("Error extracting features: %s", e)
+            metrics.error('extract_features')
+            return None
+    
+    @staticmethod
+    def extract_features_from_buffer(data, mode='window', suffix=''):
+        """``extract_features`` for an upload held in memory.
+
+        The default window mode decodes straight from the bytes. Other modes,
+        and formats soundfile can't read from memory, go through a temporary
+        file that is removed afterwards.
+        """
+        if mode == 'window':
+            try:
+                with metrics.span('decode'):
+                    y, sr = _load(data, suffix, sr=Config.SAMPLE_RATE,
+                                  duration=ANALYSIS_WINDOW_SECONDS)
+                return AudioProcessor.extract_features_from_signal(y, sr)
+            except Exception as e:
+                logger.error("Error extracting features: %s", e)
+                metrics.error('extract_features')
+                return None
+        
+        with _temporary_copy(data, suffix) as tmp_path:
+            return AudioProcessor.extract_features(tmp_path, mode)
+    
+    @staticmethod
+    def extract_preview_features(source, suffix=''):
+        """RMS and spectral centroid of the first few seconds, for a quick mood.
+        
+        ``source`` is a file path or the upload's bytes, with its extension
+        as ``suffix`` for formats only decoded from a file. Returns None if
+        the audio can't be decoded; the full pass still runs.
+        """
+        import librosa
+        
+        try:
+            with metrics.span('preview'):
+                y, sr = _load(source, suffix, sr=PREVIEW_SAMPLE_RATE, mono=True,
+                              duration=PREVIEW_SECONDS, res_type='soxr_lq')
+                if len(y) < PREVIEW_N_FFT:
+                    return None
+                S = np.abs(librosa.stft(y, n_fft=PREVIEW_N_FFT, hop_length=HOP_LENGTH))
+                centroid = librosa.feature.spectral_centroid(S=S, sr=sr)[0]
+                rms = librosa.feature.rms(y=y, frame_length=PREVIEW_N_FFT, hop_length=HOP_LENGTH)[0]
+            return {
+                'spectral_centroid': float(np.mean(centroid)),
+                'energy': float(np.mean(rms)),
+                'chroma_mean': PREVIEW_CHROMA_MEAN,
+                'tempo': PREVIEW_TEMPO
+            }
+        except Exception as e:
+            logger.info("Preview analysis failed: %s", e)
+            return None
+    
+    @staticmethod
+    def extract_features_streaming(file_path, block_seconds=STREAM_BLOCK_SECONDS):
+        """Analyze the whole track in fixed-size blocks with constant memory.
+
+        Falls back to segment sampling for formats soundfile can't stream.
+        """
+        import librosa
+        
+        # librosa.stream is lazy, so decode errors only surface once blocks
+        # are read; the whole pass is covered for the fallback to catch them
+        try:
+            native_sr = librosa.get_samplerate(file_path)
+            stream = librosa.stream(
+                file_path,
+                block_length=max(1, int(block_seconds * native_sr / HOP_LENGTH)),
+                frame_length=N_FFT,
+                hop_length=HOP_LENGTH,
+                # No padding: a zero-filled last block would dilute the
+                # length-weighted means
+                mono=True
+            )
+            running = _RunningFeatures()
+            for block in stream:
+                if native_sr != Config.SAMPLE_RATE:
+                    block = librosa.resample(block, orig_sr=native_sr, target_sr=Config.SAMPLE_RATE)
+                if len(block) < N_FFT:
+                    continue
+                running.add(
+                    AudioProcessor.extract_features_from_signal(block, Config.SAMPLE_RATE),
+                    len(block)
+                )
+            return running.result()
+        except RuntimeError as e:
+            # soundfile's errors (e.g. an m4a it can't read) are RuntimeErrors
+            logger.info("Streaming unavailable (%s), sampling segments instead", e)
+            return AudioProcessor.extract_features_segments(file_path)
+    
+    @staticmethod
+    def extract_features_segments(file_path, segments=SEGMENT_COUNT,
+                                  segment_seconds=SEGMENT_SECONDS):
+        """Analyze ``segments`` evenly spaced windows spread over the track"""
+        import librosa
+        
+        duration = librosa.get_duration(path=file_path)
+        running = _RunningFeatures()
+        
+        for i in range(segments):
+            center = duration * (i + 0.5) / segments
+            offset = max(0.0, min(center - segment_seconds / 2, duration - segment_seconds))
+            y, sr = librosa.load(file_path, sr=Config.SAMPLE_RATE, offset=offset,
+                                 duration=segment_seconds)
+            if len(y) < N_FFT:
+                continue
+            running.add(AudioProcessor.extract_features_from_signal(y, sr), len(y))
             
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+            # Short tracks: one window already covers everything
+            if duration <= segment_seconds:
+                break
+        return running.result()
+    
+    @staticmethod
+    def extract_features_from_signal(y, sr):
+        """Compute the feature dict from a decoded signal in a single pass.
+
+        The magnitude STFT is computed once; centroid and chroma are derived
+        from it directly, and one log-mel spectrogram feeds both the MFCCs and
+        the onset envelope used for beat tracking. ZCR and RMS stay in the time
+        domain, which needs no transform and keeps their values unchanged.
+        Besides the scalar summaries, ``mfcc_means`` and ``chroma_means``
+        keep the mean of every MFCC coefficient and pitch class.
+        """
+        import librosa
+        
+        features = {}
+        
+        with metrics.span('stft'):
+            S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+            S_power = S ** 2
+            mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=S_power, sr=sr))
+        
+        with metrics.span('beat_track'):
+            onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP_LENGTH)
+            tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH)
+        features['tempo'] = float(np.atleast_1d(tempo)[0])
+        
+        with metrics.span('spectral_features'):
+            spectral_centroids = librosa.feature.spectral_centroid(S=S, sr=sr)[0]
             features['spectral_centroid'] = float(np.mean(spectral_centroids))
             
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=Config.N_MFCC)
+            mfccs = librosa.feature.mfcc(S=mel_db, n_mfcc=Config.N_MFCC)
             features['mfcc_mean'] = float(np.mean(mfccs))
             features['mfcc_std'] = float(np.std(mfccs))
+            features['mfcc_means'] = np.mean(mfccs, axis=1).tolist()
             
-            zcr = librosa.feature.zero_crossing_rate(y)[0]
+            zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
             features['zcr'] = float(np.mean(zcr))
             
-            rms = librosa.feature.rms(y=y)[0]
+            rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
             features['energy'] = float(np.mean(rms))
             
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+            chroma = librosa.feature.chroma_stft(S=S_power, sr=sr)
             features['chroma_mean'] = float(np.mean(chroma))
+            features['chroma_means'] = np.mean(chroma, axis=1).tolist()
             
-            return features
+        return features
+    
+    @staticmethod
+    def extract_timeline(source, window_seconds=TIMELINE_WINDOW_SECONDS, suffix=''):
+        """Per-window features over the whole track, for a mood timeline.
+        
+        ``source`` is a file path or the upload's bytes, with its extension
+        as ``suffix`` for formats only decoded from a file. The track-level
+        features are left to ``extract_features``; this pass only computes
+        what ``summarize_windows`` needs. Returns None if the audio can't be
+        decoded.
+        """
+        try:
+            with metrics.span('decode'):
+                y, sr = _load(source, suffix, sr=Config.SAMPLE_RATE, duration=TIMELINE_MAX_SECONDS)
+            if len(y) < N_FFT:
+                return None
+            with metrics.span('timeline'):
+                rms, centroid, chroma_mean, onset_env = AudioProcessor._frame_features(y, sr)
+                return AudioProcessor.summarize_windows(
+                    rms, centroid, chroma_mean, onset_env, sr, window_seconds
+                )
         except Exception as e:
-            print(f"Error extracting features: {e}")
+            logger.error("Error extracting timeline: %s", e)
+            metrics.error('extract_timeline')
             return None
     
+    @staticmethod
+    def _frame_features(y, sr):
+        """Frame-level RMS, centroid, mean chroma and onset strength of ``y``.
+        
+        The frames are those of one centered STFT over the whole signal,
+        but the spectra are computed a block at a time from zero-padded
+        slices of ``y``, so only the per-frame results of the whole track
+        are held at once.
+        """
+        import librosa
+        
+        pad = N_FFT // 2
+        n_frames = 1 + len(y) // HOP_LENGTH
+        block_frames = max(1, int(TIMELINE_BLOCK_SECONDS * sr / HOP_LENGTH))
+        rms, centroid, chroma_mean, mel = [], [], [], []
+        for first in range(0, n_frames, block_frames):
+            last = min(first + block_frames, n_frames)
+            # Samples behind frames first..last-1 of the centered STFT
+            start = first * HOP_LENGTH - pad
+            stop = (last - 1) * HOP_LENGTH + N_FFT - pad
+            block = y[max(start, 0):min(stop, len(y))]
+            block = np.pad(block, (max(0, -start), max(0, stop - len(y))))
+            
+            S = np.abs(librosa.stft(block, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+            S_power = S ** 2
+            rms.append(librosa.feature.rms(y=block, frame_length=N_FFT, hop_length=HOP_LENGTH,
+                                           center=False)[0])
+            centroid.append(librosa.feature.spectral_centroid(S=S, sr=sr)[0])
+            chroma_mean.append(librosa.feature.chroma_stft(S=S_power, sr=sr).mean(axis=0))
+            mel.append(librosa.feature.melspectrogram(S=S_power, sr=sr))
+        
+        # dB scaling clips relative to the loudest frame, so it runs once
+        # over the whole track, as it does in extract_features_from_signal
+        mel_db = librosa.power_to_db(np.concatenate(mel, axis=1))
+        onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP_LENGTH)
+        return np.concatenate(rms), np.concatenate(centroid), np.concatenate(chroma_mean), onset_env
+    
+    @staticmethod
+    def summarize_windows(rms, spectral_centroid, chroma_mean, onset_env, sr, window_seconds):
+        """Per-window means of frame-level features, all windows at once.
+
+        Frames are grouped into consecutive windows of ``window_seconds``
+        (a trailing piece shorter than half a window joins the one before)
+        and every feature is reduced with a single ``np.add.reduceat``. Tempo
+        comes from the onset envelope's tempogram, averaged per window the
+        same way; it is computed a block of windows at a time, since the
+        whole track's tempogram would be hundreds of megabytes. Returns
+        lists keyed like the track-level features, plus each window's
+        ``start`` and ``end`` in seconds.
+        """
+        import librosa
+        
+        n_frames = min(len(rms), len(spectral_centroid), len(chroma_mean), len(onset_env))
+        per_window = max(1, int(round(window_seconds * sr / HOP_LENGTH)))
+        starts = np.arange(0, n_frames, per_window)
+        if len(starts) > 1 and n_frames - starts[-1] < per_window / 2:
+            starts = starts[:-1]
+        ends = np.append(starts[1:], n_frames)
+        counts = ends - starts
+        
+        frames = np.vstack([
+            rms[:n_frames],
+            spectral_centroid[:n_frames],
+            chroma_mean[:n_frames]
+        ])
+        means = np.add.reduceat(frames, starts, axis=1) / counts
+        
+        # Padded as librosa centers the tempogram, so column t is the
+        # autocorrelation of padded[t:t + TEMPOGRAM_WIN_LENGTH]
+        padded = np.pad(onset_env[:n_frames], TEMPOGRAM_WIN_LENGTH // 2,
+                        mode='linear_ramp', end_values=[0, 0])
+        block_windows = max(1, int(TIMELINE_BLOCK_SECONDS // window_seconds))
+        tempogram = np.empty((TEMPOGRAM_WIN_LENGTH, len(starts)))
+        for i in range(0, len(starts), block_windows):
+            block = slice(i, i + block_windows)
+            first, last = starts[block][0], ends[block][-1]
+            columns = librosa.feature.tempogram(
+                onset_envelope=padded[first:last + TEMPOGRAM_WIN_LENGTH - 1], sr=sr,
+                hop_length=HOP_LENGTH, win_length=TEMPOGRAM_WIN_LENGTH, center=False
+            )
+            tempogram[:, block] = np.add.reduceat(columns, starts[block] - first, axis=1)
+        tempogram /= counts
+        bpms = librosa.tempo_frequencies(tempogram.shape[0], hop_length=HOP_LENGTH, sr=sr)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_prior = -0.5 * (np.log2(bpms) - np.log2(TIMELINE_PRIOR_BPM)) ** 2
+        log_prior[~((bpms > 0) & (bpms <= TIMELINE_MAX_BPM))] = -np.inf
+        tempo = bpms[np.argmax(np.log1p(1e6 * tempogram) + log_prior[:, None], axis=0)]
+        
+        seconds_per_frame = HOP_LENGTH / sr
+        return {
+            'window_seconds': window_seconds,
+            'start': (starts * seconds_per_frame).tolist(),
+            'end': (ends * seconds_per_frame).tolist(),
+            'energy': means[0].tolist(),
+            'spectral_centroid': means[1].tolist(),
+            'chroma_mean': means[2].tolist(),
+            'tempo': tempo.tolist()
+        }
+    
+    @staticmethod
+    def warm_up(seconds=1.0):
+        """Import librosa and JIT-compile its numba kernels on a tiny signal.
+
+        The first real extraction otherwise pays several seconds of
+        compilation. Returns True once the kernels are ready.
+        """
+        sr = Config.SAMPLE_RATE
+        t = np.arange(int(sr * seconds)) / sr
+        y = (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+        y[::sr // 2] = 1.0
+        AudioProcessor.extract_features_from_signal(y, sr)
+        return True
+    
     @staticmethod
     def estimate_valence_energy(features):
         valence = min(1.0, max(0.0, 
@@ -52,37 +476,102 @@ class AudioProcessor:
         return valence, energy
     
     @staticmethod
-    def modify_audio(input_path, output_path, speed=1.0, volume_change=0):
+    def estimate_valence_energy_batch(spectral_centroid, chroma_mean, rms, tempo):
+        """Vectorized ``estimate_valence_energy`` over arrays of raw features"""
+        valence = np.clip(
+            (np.asarray(spectral_centroid, dtype=float) / 5000) * 0.5 +
+            np.asarray(chroma_mean, dtype=float) * 0.5,
+            0.0, 1.0
+        )
+        energy = np.clip(
+            (np.asarray(rms, dtype=float) * 2) * 0.6 +
+            (np.asarray(tempo, dtype=float) / 200) * 0.4,
+            0.0, 1.0
+        )
+        return valence, energy
+    
+    @staticmethod
+    def decode_for_remix(input_path):
+        """Decoded PCM of ``input_path``, from this process's cache when possible"""
+        missed = []
+        
+        def decode(path):
+            missed.append(path)
+            with metrics.span('remix_decode'):
+                return remix_engine.decode_audio(path)
+        
+        decoded = _decoded.get(input_path, decode)
+        metrics.inc('moodtune_remix_decodes_total', result='miss' if missed else 'hit')
+        return decoded
+    
+    @staticmethod
+    def render_remix(samples, frame_rate, output_path, speed=1.0, volume_change=0):
+        """Render and encode one remix from already decoded samples.
+        
+        The file is encoded under a hidden ``.part`` name and moved into
+        place when complete, so nobody sees a half-written remix.
+        """
+        folder, name = os.path.split(output_path)
+        part_path = os.path.join(folder, f".{name}.part")
         try:
-            audio = AudioSegment.from_file(input_path)
-            audio = audio + volume_change
-            
-            if speed != 1.0:
-                new_frame_rate = int(audio.frame_rate * speed)
-                audio = audio._spawn(audio.raw_data, overrides={
-                    'frame_rate': new_frame_rate
-                })
-                audio = audio.set_frame_rate(44100)
-            
-            audio = audio.fade_in(2000).fade_out(3000)
-            audio.export(output_path, format='mp3')
+            with metrics.span('remix_render'):
+                samples, frame_rate = remix_engine.render(samples, frame_rate, speed, volume_change)
+            with metrics.span('remix_encode'):
+                remix_engine.encode_audio(samples, frame_rate, part_path,
+                                          format=os.path.splitext(name)[1][1:] or 'mp3')
+            os.replace(part_path, output_path)
             return True
         except Exception as e:
-            print(f"Error modifying audio: {e}")
+            logger.error("Error modifying audio: %s", e)
+            metrics.error('modify_audio')
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return False
+    
+    @staticmethod
+    def modify_audio(input_path, output_path, speed=1.0, volume_change=0):
+        try:
+            samples, frame_rate = AudioProcessor.decode_for_remix(input_path)
+        except Exception as e:
+            logger.error("Error decoding audio: %s", e)
+            metrics.error('modify_audio')
             return False
+        return AudioProcessor.render_remix(samples, frame_rate, output_path, speed, volume_change)
     
     @staticmethod
     def create_remix(input_path, output_path, mood):
-        modifications = {
-            'Happy': {'speed': 1.0, 'volume': 2},
-            'Sad': {'speed': 0.9, 'volume': -2},
-            'Energetic': {'speed': 1.15, 'volume': 3},
-            'Calm': {'speed': 0.85, 'volume': -1}
-        }
-        
-        mod = modifications.get(mood, {'speed': 1.0, 'volume': 0})
+        mod = REMIX_PRESETS.get(mood, DEFAULT_PRESET)
         return AudioProcessor.modify_audio(
             input_path, output_path, 
             speed=mod['speed'], 
             volume_change=mod['volume']
         )
+    
+    @staticmethod
+    def create_remixes(input_path, outputs, parallel=True):
+        """Render several mood remixes of one input from a single decode.
+        
+        ``outputs`` maps mood to output path. With ``parallel`` the renders
+        run on threads; resampling in NumPy and encoding in ffmpeg both
+        release the GIL. Returns True only if every remix was written.
+        """
+        try:
+            samples, frame_rate = AudioProcessor.decode_for_remix(input_path)
+        except Exception as e:
+            logger.error("Error decoding audio: %s", e)
+            metrics.error('modify_audio')
+            return False
+        
+        def remix(item):
+            mood, output_path = item
+            mod = REMIX_PRESETS.get(mood, DEFAULT_PRESET)
+            return AudioProcessor.render_remix(
+                samples, frame_rate, output_path, mod['speed'], mod['volume']
+            )
+        
+        if parallel and len(outputs) > 1:
+            with ThreadPoolExecutor(max_workers=len(outputs)) as pool:
+                results = list(pool.map(remix, outputs.items()))
+        else:
+            results = [remix(item) for item in outputs.items()]
+        return all(results)
@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+MOOD_LABELS = ('Happy', 'Sad', 'Energetic', 'Calm')
+
+# ``extract_features`` keys stored as scalar columns. Its ``energy`` is RMS
+# loudness, kept as ``rms`` so ``energy`` can hold the mood estimate.
+SCALAR_FEATURES = {
+    'tempo': 'tempo',
+    'spectral_centroid': 'spectral_centroid',
+    'zcr': 'zcr',
+    'rms': 'energy',
+    'chroma_mean': 'chroma_mean',
+    'mfcc_mean': 'mfcc_mean',
+    'mfcc_std': 'mfcc_std'
+}
+
+# Rows scanned per step, so a scan's working set stays small however many
+# rows the store holds
+SCAN_ROWS = 65536
+
+
+def feature_columns(n_mfcc, n_chroma=12):
+    """Column names of a stored feature vector, in order"""
+    return (
+        tuple(SCALAR_FEATURES) + ('valence', 'energy', 'mood')
+        + tuple(f'mfcc_{i}' for i in range(n_mfcc))
+        + tuple(f'chroma_{i}' for i in range(n_chroma))
+    )
+
+
+class FeatureStore:
+    """Append-only store of analyzed tracks' features as float32 rows.
+
+    Rows live in one raw ``features.f32`` file that readers memory-map, so
+    any number of processes scan the same page cache instead of each
+    loading the table into its own heap. ``ids.txt`` maps each track ID to
+    its row; an ID appended again points at its newest row. Moods are
+    stored as an index into ``MOOD_LABELS``.
+    """
+
+    def __init__(self, path, n_mfcc=13, n_chroma=12):
+        self.path = path
+        self.columns = feature_columns(n_mfcc, n_chroma)
+        self._col = {name: i for i, name in enumerate(self.columns)}
+        self._row_bytes = len(self.columns) * 4
+        self._data_path = os.path.join(path, 'features.f32')
+        self._ids_path = os.path.join(path, 'ids.txt')
+        self._rows = {}
+        self._ids_by_row = {}
+        self._live_rows = None
+        self._row_count = 0
+        self._ids_offset = 0
+        self._ids_stat = None
+        self._map = None
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'columns.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = tuple(json.load(f))
+            if stored != self.columns:
+                raise ValueError(f'{path} holds {len(stored)} feature columns, expected {len(self.columns)}')
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump(self.columns, f)
+        open(self._data_path, 'ab').close()
+        open(self._ids_path, 'ab').close()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def __contains__(self, track_id):
+        with self._lock:
+            self._refresh()
+            return track_id in self._rows
+
+    def append(self, track_id, features, valence, energy, mood):
+        """Store one analysis; returns its row"""
+        if '\n' in track_id:
+            raise ValueError(f'Track ID {track_id!r} contains a newline')
+        vector = self.vector(features, valence, energy, mood)
+        with self._lock, open(self._data_path, 'ab') as data, open(self._ids_path, 'ab') as ids:
+            if fcntl is not None:
+                fcntl.flock(data, fcntl.LOCK_EX)
+            try:
+                # Drop a partial row left by a writer that died mid-append
+                size = os.fstat(data.fileno()).st_size
+                if size % self._row_bytes:
+                    size -= size % self._row_bytes
+                    data.truncate(size)
+                row = size // self._row_bytes
+                # Row data first, so an ID line always has a complete row
+                data.write(vector.tobytes())
+                data.flush()
+                ids.write(f'{row}\t{track_id}\n'.encode())
+                ids.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(data, fcntl.LOCK_UN)
+            self._refresh()
+            return row
+
+    def vector(self, features, valence, energy, mood):
+        """One stored row built from an ``extract_features`` dict"""
+        row = np.full(len(self.columns), np.nan, dtype=np.float32)
+        for name, key in SCALAR_FEATURES.items():
+            if features.get(key) is not None:
+                row[self._col[name]] = features[key]
+        row[self._col['valence']] = valence
+        row[self._col['energy']] = energy
+        row[self._col['mood']] = MOOD_LABELS.index(mood) if mood in MOOD_LABELS else -1
+        for prefix, key in (('mfcc', 'mfcc_means'), ('chroma', 'chroma_means')):
+            for i, value in enumerate(features.get(key) or ()):
+                if f'{prefix}_{i}' in self._col:
+                    row[self._col[f'{prefix}_{i}']] = value
+        return row
+
+    def get(self, track_id):
+        """Stored columns of a track as a dict, or None"""
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(track_id)
+            if row is None:
+                return None
+            values = self._map[row].tolist()
+        record = dict(zip(self.columns, values))
+        mood = int(record['mood'])
+        record['mood'] = MOOD_LABELS[mood] if 0 <= mood < len(MOOD_LABELS) else None
+        return record
+
+    def matrix(self):
+        """Read-only memory-mapped ``(rows, columns)`` view of every row"""
+        with self._lock:
+            self._refresh()
+            return self._map
+
+    def similar(self, track_id, k=10, columns=None):
+        """The ``k`` stored tracks nearest to ``track_id``, as ``(id, distance)``.
+
+        Compares the per-coefficient MFCC and chroma means unless other
+        ``columns`` are given, scanning the mapped file in chunks.
+        """
+        if columns is None:
+            columns = [name for name in self.columns
+                       if name.startswith(('mfcc_', 'chroma_')) and name[-1].isdigit()]
+        cols = [self._col[name] for name in columns]
+        with self._lock:
+            self._refresh()
+            matrix = self._map
+            row = self._rows.get(track_id)
+            tracks = len(self._rows)
+            if self._live_rows is None:
+                self._live_rows = np.zeros(len(matrix), dtype=bool)
+                self._live_rows[list(self._ids_by_row)] = True
+            live = self._live_rows
+        if row is None:
+            return []
+
+        point = np.asarray(matrix[row, cols])
+        distances = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCAN_ROWS):
+            diff = matrix[start:start + SCAN_ROWS, cols] - point
+            distances[start:start + SCAN_ROWS] = np.einsum('ij,ij->i', diff, diff)
+        distances[np.isnan(distances)] = np.inf
+        # Superseded rows and the track itself never count as neighbours
+        distances[~live] = np.inf
+        distances[row] = np.inf
+
+        k = min(k, tracks - 1)
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        nearest = [i for i in nearest if np.isfinite(distances[i])]
+        with self._lock:
+            ids = [self._ids_by_row.get(i) for i in nearest]
+        # A row superseded meanwhile has no ID any more
+        return [(track_id, float(np.sqrt(distances[i])))
+                for track_id, i in zip(ids, nearest) if track_id is not None]
+
+    def reclassify(self, mood_classifier, estimate=None):
+        """Moods for every stored track without reanalysing any audio.
+
+        ``estimate(spectral_centroid, chroma_mean, rms, tempo)`` recomputes
+        valence and energy from the stored features first, e.g. after its
+        weights change; otherwise the stored values are classified again.
+        Returns ``(ids, moods, confidences)`` for each track's newest row.
+        """
+        with self._lock:
+            self._refresh()
+            matrix = self._map
+            ids = list(self._rows)
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(ids))
+        moods = np.empty(len(rows), dtype=object)
+        confidences = np.empty(len(rows))
+
+        for start in range(0, len(rows), SCAN_ROWS):
+            block = matrix[rows[start:start + SCAN_ROWS]]
+            column = lambda name: block[:, self._col[name]].astype(np.float64)
+            if estimate is not None:
+                valence, energy = estimate(column('spectral_centroid'), column('chroma_mean'),
+                                           column('rms'), column('tempo'))
+            else:
+                valence, energy = column('valence'), column('energy')
+            block_moods, block_confidences, _ = mood_classifier.classify_mood_batch(
+                valence, energy, column('tempo')
+            )
+            moods[start:start + SCAN_ROWS] = block_moods
+            confidences[start:start + SCAN_ROWS] = block_confidences
+        return ids, moods, confidences
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'tracks': len(self._rows),
+                'rows': self._row_count,
+                'bytes': self._row_count * self._row_bytes
+            }
+
+    def _refresh(self):
+        """Pick up rows appended since the last look, by this or another process"""
+        # Lookups are far more common than appends, so an unchanged ID file
+        # costs one stat instead of a read
+        stat = os.stat(self._ids_path)
+        if (stat.st_size, stat.st_mtime_ns) == self._ids_stat and self._map is not None:
+            return
+        with open(self._ids_path, 'rb') as f:
+            f.seek(self._ids_offset)
+            tail = f.read()
+        # Only complete lines; a writer may be mid-append
+        complete = tail[:tail.rfind(b'\n') + 1]
+        if len(complete) == len(tail):
+            self._ids_stat = (stat.st_size, stat.st_mtime_ns)
+        if not complete and self._map is not None:
+            return
+        self._ids_offset += len(complete)
+        for line in complete.decode().split('\n')[:-1]:
+            row, track_id = line.split('\t', 1)
+            row = int(row)
+            old = self._rows.get(track_id)
+            if old is not None:
+                del self._ids_by_row[old]
+            self._rows[track_id] = row
+            self._ids_by_row[row] = track_id
+            self._row_count = max(self._row_count, row + 1)
+        self._live_rows = None
+
+        if self._row_count:
+            self._map = np.memmap(self._data_path, dtype=np.float32, mode='r',
+                                  shape=(self._row_count, len(self.columns)))
+        else:
+            self._map = np.empty((0, len(self.columns)), dtype=np.float32)
@@ -0,0 +1,286 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from utils.job_runner import pid_alive
+
+logger = logging.getLogger(__name__)
+
+# Characters of the SHA-256 digest used in stored upload names
+ID_LENGTH = 32
+
+# Scratch files older than this were left by an interrupted write; younger
+# ones may belong to another process still writing them
+SCRATCH_MAX_AGE = 3600
+
+# In a shared folder, the evicting process also sweeps it this often, to
+# catch files the other processes added
+EVICT_INTERVAL = 60
+
+# Reference markers: hidden files named after the holder's pid and the
+# referenced file, so every process sharing the folder can see them
+REF_PREFIX = '.ref-'
+
+
+def upload_id(digest, original_filename):
+    """Content-addressed name for an upload: digest prefix plus its extension"""
+    ext = os.path.splitext(original_filename)[1].lower()
+    return f"{digest[:ID_LENGTH]}{ext}"
+
+
+def remix_id(input_id, mood):
+    """Name of the remix rendered from ``input_id`` for ``mood``"""
+    return f"remix_{mood.lower()}_{os.path.splitext(input_id)[0]}.mp3"
+
+
+class FileStore:
+    """Flat folder of immutable files keyed by content-derived names.
+
+    Uploads are named by their content digest, so identical uploads share
+    one file and different uploads never overwrite each other; remixes are
+    named by their input and mood. When the folder grows past ``max_bytes``
+    or a file goes unused for ``max_age`` seconds, the least recently used
+    files are deleted. Files with outstanding references (``acquire`` /
+    ``release``), such as the input of a queued remix, are never evicted.
+
+    Several processes may share the folder (``shared=True``). Then only
+    the one created with ``owner=True`` deletes anything. It decides from
+    a scan of the folder: file modification times record the last use,
+    since every process stamps them on ``touch``, and references are
+    marker files that name the holder's pid. Markers left by processes
+    that have exited are ignored and removed. A file another process
+    added is picked up the first time it is looked up here. Hidden (dot)
+    files are scratch space and markers and are never tracked.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, max_age=7 * 24 * 3600,
+                 shared=False, owner=True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.shared = shared
+        self.owner = owner
+        self.size = 0
+        self.evictions = 0
+        self._files = {}
+        self._refs = {}
+        self._markers = {}
+        self._foreign_refs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def temp_path(self):
+        """Scratch path inside the store for writing a file before it is named"""
+        return os.path.join(self.root, f".incoming-{uuid.uuid4().hex}")
+
+    def exists(self, name):
+        with self._lock:
+            if name in self._files:
+                return True
+        return self._adopt(name)
+
+    def commit(self, temp_path, name):
+        """Move a finished scratch file into place under ``name``"""
+        if self.exists(name):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, self.path(name))
+        self.add(name)
+
+    def write(self, name, data):
+        """Store ``data`` under ``name`` unless an identical file is already there"""
+        if not self.exists(name):
+            temp_path = self.temp_path()
+            with open(temp_path, 'wb') as out:
+                out.write(data)
+            os.replace(temp_path, self.path(name))
+        self.add(name)
+
+    def add(self, name):
+        """Start tracking a file written straight to ``path(name)``"""
+        size = os.path.getsize(self.path(name))
+        if self.shared:
+            self._stamp(name)
+        with self._lock:
+            old = self._files.get(name)
+            self.size += size - (old[0] if old else 0)
+            self._files[name] = (size, time.time())
+        self.evict()
+
+    def touch(self, name):
+        """Mark a file as used now; returns False if it isn't stored"""
+        if not self.exists(name):
+            return False
+        if self.shared:
+            self._stamp(name)
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is None:
+                return False
+            self._files[name] = (entry[0], time.time())
+            return True
+
+    def acquire(self, name):
+        marker = None
+        if self.shared:
+            marker = self.path(f"{REF_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}-{name}")
+            open(marker, 'wb').close()
+        with self._lock:
+            self._refs[name] = self._refs.get(name, 0) + 1
+            if marker is not None:
+                self._markers.setdefault(name, []).append(marker)
+
+    def release(self, name):
+        marker = None
+        with self._lock:
+            count = self._refs.get(name, 0) - 1
+            if count > 0:
+                self._refs[name] = count
+            else:
+                self._refs.pop(name, None)
+            markers = self._markers.get(name)
+            if markers:
+                marker = markers.pop()
+                if not markers:
+                    del self._markers[name]
+        if marker is not None:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+
+    def start(self):
+        """Sweep a shared folder in the background, if this process evicts"""
+        if self.shared and self.owner and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='file-store-evict', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def evict(self):
+        """Delete expired files, then least recently used ones over the size cap"""
+        if not self.owner:
+            return
+        if self.shared:
+            self._rescan()
+        now = time.time()
+        with self._lock:
+            candidates = sorted(
+                (used_at, name) for name, (_, used_at) in self._files.items()
+                if name not in self._refs and name not in self._foreign_refs
+            )
+            doomed = []
+            size = self.size
+            for used_at, name in candidates:
+                if now - used_at <= self.max_age and size <= self.max_bytes:
+                    break
+                doomed.append(name)
+                size -= self._files[name][0]
+            for name in doomed:
+                self.size -= self._files.pop(name)[0]
+                self.evictions += 1
+
+        for name in doomed:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'bytes': self.size,
+                'referenced': len(self._refs.keys() | self._foreign_refs),
+                'evictions': self.evictions
+            }
+
+    def _run(self):
+        while not self._stop.wait(EVICT_INTERVAL):
+            try:
+                self.evict()
+            except OSError as e:
+                logger.warning("File store sweep failed: %s", e)
+
+    def _stamp(self, name):
+        # The last-use time other processes sharing the folder go by
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def _rescan(self):
+        """Replace this process's view with the folder's current contents.
+
+        Files come with their modification time as last use, and the names
+        other live processes hold references to are collected from their
+        markers.
+        """
+        files, refs, size = {}, set(), 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(REF_PREFIX):
+                try:
+                    pid, _, name = entry.name[len(REF_PREFIX):].split('-', 2)
+                    pid = int(pid)
+                except ValueError:
+                    pid = None
+                if pid == os.getpid():
+                    continue
+                if pid is not None and pid_alive(pid):
+                    refs.add(name)
+                else:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files[entry.name] = (stat.st_size, stat.st_mtime)
+            size += stat.st_size
+        with self._lock:
+            self._files = files
+            self.size = size
+            self._foreign_refs = refs
+
+    def _adopt(self, name):
+        """Track a file that another process sharing the folder wrote"""
+        if not name or name.startswith('.'):
+            return False
+        try:
+            stat = os.stat(self.path(name))
+        except OSError:
+            return False
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = (stat.st_size, time.time())
+                self.size += stat.st_size
+        return True
+
+    def _scan(self):
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.startswith('.'):
+                scratch = entry.name.startswith('.incoming-') or entry.name.endswith('.part')
+                if scratch and now - stat.st_mtime > SCRATCH_MAX_AGE:
+                    # Left behind by an interrupted upload or remix
+                    os.remove(entry.path)
+                continue
+            self._files[entry.name] = (stat.st_size, stat.st_mtime)
+            self.size += stat.st_size
@@ -0,0 +1,354 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# The process running a job republishes its shared record this often; a
+# live record not refreshed for STALE_SECONDS, or whose owner process is
+# gone, belongs to a job that was lost with its worker
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 3 * HEARTBEAT_SECONDS
+
+# How long other processes can still look up a job's record
+SHARED_RECORD_TTL = 3600
+
+
+class QueueFullError(Exception):
+    """Raised when every worker slot and queue slot is already taken"""
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job does not finish within its timeout"""
+
+
+def _init_worker(queue, warmup):
+    metrics.init_worker(queue)
+    if warmup is not None:
+        try:
+            warmup()
+        except Exception:
+            metrics.error('worker_warmup')
+            return
+        metrics.inc('moodtune_worker_warmups_total')
+
+
+def _noop():
+    return None
+
+
+def pid_alive(pid):
+    """Whether a process with ``pid`` exists on this machine"""
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobRunner:
+    """Runs CPU-bound audio work in a process pool sized to the machine.
+
+    At most ``max_pending`` jobs may be running or queued at once; beyond
+    that ``submit`` raises ``QueueFullError`` straight away so callers can
+    answer 429 instead of piling up requests. A job that times out stops
+    being waited on, but keeps its slot until the worker finishes it, so
+    the bound stays honest. A worker that dies (e.g. killed for memory)
+    breaks a ``ProcessPoolExecutor`` for good, failing its other jobs; the
+    pool is then replaced, so later jobs run on fresh workers.
+
+    ``warmup`` is run once in every worker process before it takes jobs;
+    ``start`` brings the whole pool up ahead of the first request.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=120, warmup=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.timeout = timeout
+        self.warmup = warmup
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        # Bumped whenever a broken pool is replaced, so completions of the
+        # old pool's jobs don't release slots of the new one
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` on the pool and return its future"""
+        for attempt in range(2):
+            with self._lock:
+                slots, generation = self._slots, self._generation
+            if not slots.acquire(blocking=False):
+                raise QueueFullError('Too many audio jobs in progress')
+
+            try:
+                future = self._get_executor().submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # A worker died since the last job; retry once on a new pool
+                self._replace_pool(generation)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                slots.release()
+                raise
+
+            with self._lock:
+                if generation == self._generation:
+                    self.pending += 1
+            future.add_done_callback(partial(self._release, generation))
+            return future
+
+    def start(self):
+        """Spawn every worker now so they warm up before real jobs arrive"""
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(_noop)
+
+    @property
+    def warm_workers(self):
+        if self.warmup is None:
+            return self.max_workers if self._executor is not None else 0
+        return min(self.max_workers, metrics.REGISTRY.value('moodtune_worker_warmups_total'))
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'warm_workers': self.warm_workers
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self):
+        # Created on first use so worker processes are not forked at import time
+        with self._lock:
+            if self._executor is None:
+                # Workers send their timings back to this process's registry
+                queue = multiprocessing.Queue()
+                metrics.collect_from(queue)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker, initargs=(queue, self.warmup)
+                )
+            return self._executor
+
+    def _release(self, generation, future):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.pending -= 1
+            slots = self._slots
+        slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            # Rebuilt now rather than on the next submit
+            self._replace_pool(generation)
+
+    def _replace_pool(self, generation):
+        """Drop a pool that lost a worker, with its slot accounting; the
+        next submit starts a fresh one"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            broken, self._executor = self._executor, None
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+            self.pending = 0
+            self._generation += 1
+        logger.warning("Audio worker pool broke (a worker died); starting a new one")
+        metrics.error('worker_pool')
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+
+class JobRegistry:
+    """Tracks asynchronous jobs submitted through a ``JobRunner``.
+
+    Jobs are keyed by an identity (e.g. input file and mood) so repeat
+    requests return the job already queued, running or finished instead of
+    starting the same work again. Failed jobs can be resubmitted. Only the
+    newest ``max_jobs`` records are kept. With a ``shared`` cache, records
+    are published to it so a job started by one worker process can be
+    looked up from any other. Live records there carry their owner's pid
+    and a heartbeat; one whose owner died reads as failed.
+    """
+
+    def __init__(self, runner, max_jobs=1000, shared=None):
+        self.runner = runner
+        self.shared = shared
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def submit(self, key, fn, *args, result=None, on_done=None, aliases=(), **kwargs):
+        """Start ``fn`` for ``key`` unless a live job for it already exists.
+
+        ``result`` is stored on the record and returned once the job has
+        succeeded (e.g. the output filename). A new job can also be found
+        under each of ``aliases``, for work that covers several keys at
+        once. ``on_done`` is called exactly
+        once with the job record: when the job this call started finishes,
+        or straight away if an existing job is returned instead. It is not
+        called if submitting raises. Returns the job record.
+        """
+        # Lookup and insert happen under one lock, so two identical requests
+        # arriving together can't both start the job
+        with self._lock:
+            job = self._jobs.get(self._by_key.get(key))
+            existing = None
+            if job is not None and job['status'] != 'failed':
+                existing = {k: v for k, v in job.items() if not k.startswith('_')}
+
+            if existing is None and self.shared is not None:
+                # Another worker process may already be running it
+                record = self._get_shared(self.shared.get(f"key:{key}"))
+                if record is not None and record['status'] in ('queued', 'running'):
+                    existing = record
+
+            if existing is None:
+                job = {
+                    'id': uuid.uuid4().hex,
+                    'status': 'queued',
+                    'result': result,
+                    'error': None,
+                    'created_at': time.time(),
+                    'finished_at': None
+                }
+                future = self.runner.submit(fn, *args, **kwargs)
+                job['_future'] = future
+                job['_keys'] = (key,) + tuple(aliases)
+                job['_on_done'] = on_done
+                self._jobs[job['id']] = job
+                for job_key in job['_keys']:
+                    self._by_key[job_key] = job['id']
+                self._prune()
+                self._start_heartbeat()
+
+        if existing is not None:
+            if on_done is not None:
+                on_done(existing)
+            return existing
+
+        self._publish(job)
+        future.add_done_callback(lambda f, job_id=job['id']: self._finish(job_id, f))
+        return self.get(job['id'])
+
+    def get(self, job_id):
+        """Public view of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return self._get_shared(job_id)
+            if job['status'] == 'queued' and job['_future'].running():
+                job['status'] = 'running'
+            return {k: v for k, v in job.items() if not k.startswith('_')}
+
+    def forget(self, key):
+        """Drop the finished job for ``key`` so the next submit starts afresh"""
+        with self._lock:
+            job_id = self._by_key.get(key)
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] not in ('queued', 'running'):
+                del self._by_key[key]
+
+    def find(self, key):
+        with self._lock:
+            job_id = self._by_key.get(key)
+        if job_id is None and self.shared is not None:
+            job_id = self.shared.get(f"key:{key}")
+        return self.get(job_id) if job_id else None
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['finished_at'] = time.time()
+            try:
+                ok = future.result()
+            except Exception as e:
+                job['status'], job['error'] = 'failed', str(e) or type(e).__name__
+            else:
+                if ok is False:
+                    job['status'], job['error'] = 'failed', 'Job reported failure'
+                else:
+                    job['status'] = 'done'
+            on_done = job['_on_done']
+            record = {k: v for k, v in job.items() if not k.startswith('_')}
+            self._publish(job)
+
+        if on_done is not None:
+            on_done(record)
+
+    def _publish(self, job):
+        if self.shared is None:
+            return
+        record = {k: v for k, v in job.items() if not k.startswith('_')}
+        items = {job['id']: {'record': record, 'owner': os.getpid(), 'heartbeat_at': time.time()}}
+        items.update((f"key:{key}", job['id']) for key in job['_keys'])
+        self.shared.set_many(items, ttl=SHARED_RECORD_TTL)
+
+    def _get_shared(self, job_id):
+        """A job record another process published, or None"""
+        if self.shared is None or not job_id:
+            return None
+        entry = self.shared.get(job_id)
+        if entry is None:
+            return None
+        record = entry['record']
+        if record['status'] in ('queued', 'running'):
+            stale = time.time() - entry['heartbeat_at'] > STALE_SECONDS
+            if stale or not pid_alive(entry['owner']):
+                record = dict(record, status='failed', error='The worker running this job exited')
+        return record
+
+    def _start_heartbeat(self):
+        # Called with the lock held
+        if self.shared is not None and self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        """Keep this process's live shared records fresh until none are left"""
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            # Under the lock so a stale heartbeat can't land after _finish
+            with self._lock:
+                live = [job for job in self._jobs.values() if job['status'] in ('queued', 'running')]
+                if not live:
+                    self._heartbeat = None
+                    return
+                for job in live:
+                    self._publish(job)
+
+    def _prune(self):
+        # Oldest finished jobs first; live ones are kept wherever they are
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [
+            (job_id, job) for job_id, job in self._jobs.items()
+            if job['status'] not in ('queued', 'running')
+        ][:excess]
+        for job_id, job in finished:
+            del self._jobs[job_id]
+            for job_key in job['_keys']:
+                if self._by_key.get(job_key) == job_id:
+                    del self._by_key[job_key]
@@ -0,0 +1,47 @@
+import json
+import logging
+
+# Attributes every LogRecord has; any others were passed through ``extra``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def record_fields(formatter, record):
+    """Timestamp, level, logger, message and ``extra`` fields of a record"""
+    fields = {
+        'ts': formatter.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+        'level': record.levelname,
+        'logger': record.name,
+        'msg': record.getMessage()
+    }
+    for key, value in vars(record).items():
+        if key not in _STANDARD_ATTRS and key not in fields:
+            fields[key] = value
+    if record.exc_info:
+        fields['exc'] = formatter.formatException(record.exc_info)
+    return fields
+
+
+class KeyValueFormatter(logging.Formatter):
+    """One ``key=value`` line per record (logfmt); values with spaces,
+    quotes or newlines are quoted"""
+
+    def format(self, record):
+        return ' '.join(f'{key}={_logfmt_value(value)}'
+                        for key, value in record_fields(self, record).items())
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        return json.dumps(record_fields(self, record), default=str)
+
+
+FORMATTERS = {'logfmt': KeyValueFormatter, 'json': JsonFormatter}
+
+
+def _logfmt_value(value):
+    text = str(value)
+    if text and not any(c in text for c in ' ="\\\n'):
+        return text
+    return json.dumps(text)
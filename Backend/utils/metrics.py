@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit up to a long full-track render
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    'moodtune_request_seconds': 'HTTP request latency by endpoint and status',
+    'moodtune_stage_seconds': 'Time spent in each analysis, remix and recommendation stage',
+    'moodtune_upstream_calls_total': 'Requests sent to the Spotify API by endpoint and status (ok, HTTP code or exception)',
+    'moodtune_errors_total': 'Errors caught and handled, by where they happened',
+    'moodtune_worker_warmups_total': 'Audio worker processes that finished warming up',
+    'moodtune_remix_decodes_total': 'Remix input lookups in the decoded audio cache, by result'
+}
+
+
+class Registry:
+    """Counters and histograms kept in memory and rendered for Prometheus.
+
+    Series are identified by a metric name plus a sorted tuple of label
+    pairs. Collectors registered with ``register_collector`` are called at
+    render time for values other components already track themselves.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def value(self, name, **labels):
+        """Current value of a counter (0 if it was never incremented)"""
+        with self._lock:
+            return self._counters.get((name, _key(labels)), 0)
+
+    def register_collector(self, collector):
+        """``collector()`` returns ``(name, type, labels, value)`` tuples"""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name, 'histogram')
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        collected = []
+        for collector in self._collectors:
+            try:
+                collected.extend(collector())
+            except Exception as e:
+                # The rest of the page is still worth serving
+                logger.warning("Metrics collector %r failed: %s", collector, e, exc_info=True)
+        # Prometheus wants every sample of a metric in one group
+        for name, kind, labels, value in sorted(collected, key=lambda sample: sample[0]):
+            header(name, kind)
+            lines.append(f"{name}{_labels(_key(labels))} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    body = ','.join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return '{' + body + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+
+# Set in worker processes so their measurements reach the parent's registry
+_forward_queue = None
+
+
+def inc(name, value=1, **labels):
+    if _forward_queue is not None:
+        _forward_queue.put(('inc', name, value, labels))
+    else:
+        REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if _forward_queue is not None:
+        _forward_queue.put(('observe', name, value, labels))
+    else:
+        REGISTRY.observe(name, value, **labels)
+
+
+@contextmanager
+def span(stage):
+    """Time a block into ``moodtune_stage_seconds{stage=...}``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('moodtune_stage_seconds', time.perf_counter() - start, stage=stage)
+
+
+def error(where):
+    inc('moodtune_errors_total', where=where)
+
+
+def init_worker(queue):
+    """Process-pool initializer: forward measurements through ``queue``"""
+    global _forward_queue
+    _forward_queue = queue
+
+
+def collect_from(queue):
+    """Apply measurements forwarded by worker processes, on a daemon thread"""
+    def drain():
+        while True:
+            kind, name, value, labels = queue.get()
+            try:
+                getattr(REGISTRY, kind)(name, value, **labels)
+            except Exception as e:
+                logger.warning("Dropped a measurement from a worker: %s", e)
+
+    thread = threading.Thread(target=drain, name='metrics-collector', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,360 @@
+import logging
+import random
+import threading
+import time
+import numpy as np
+from models.mood_classifier import MOOD_THRESHOLDS
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Better search queries
+SEARCH_QUERIES = {
+    'Happy': [
+        'bollywood happy cheerful songs',
+        'upbeat hindi party music',
+        'feel good bollywood dance',
+        'positive energy hindi songs'
+    ],
+    'Sad': [
+        'sad bollywood heartbreak songs',
+        'emotional slow hindi songs',
+        'arijit singh sad songs',
+        'melancholic romantic hindi'
+    ],
+    'Energetic': [
+        'high energy bollywood dance',
+        'workout hindi gym songs',
+        'fast tempo party bollywood',
+        'energetic dance hindi music'
+    ],
+    'Calm': [
+        'peaceful bollywood romantic',
+        'soft acoustic hindi songs',
+        'soothing relaxing bollywood',
+        'calm unplugged hindi music'
+    ]
+}
+
+
+# Search results per query: the usual page, raised so a larger request
+# (such as a whole recommendation pool) sees about this many candidates
+# per track it asks for, up to Spotify's maximum page size
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+CANDIDATES_PER_TRACK = 3
+
+
+def _search_limit(limit, queries):
+    wanted = -(-limit * CANDIDATES_PER_TRACK // len(queries))
+    return min(MAX_SEARCH_LIMIT, max(SEARCH_LIMIT, wanted))
+
+
+def _strict_limits(mood):
+    """Min/max constraints for the Spotify Recommendations API"""
+    criteria = MOOD_THRESHOLDS.get(mood, {})
+    limits = {}
+    for feature in ('valence', 'energy'):
+        if f'{feature}_min' in criteria:
+            limits[f'min_{feature}'] = criteria[f'{feature}_min']
+        if f'{feature}_max' in criteria:
+            limits[f'max_{feature}'] = criteria[f'{feature}_max']
+    return limits
+
+
+def build_recommendations(spotify_client, mood_classifier, mood, limit=20, track_index=None,
+                          allow_unverified=True):
+    """Search, strictly filter and top up mood-matched tracks from Spotify.
+
+    Every candidate with audio features is also added to ``track_index``
+    when one is given, so the local index grows with each search. When no
+    candidate passes the mood check and the top-up fails, raw search hits
+    are returned as a last resort, or an empty list with
+    ``allow_unverified=False``.
+    """
+    logger.info("Building strict %s recommendations", mood)
+
+    targets = mood_classifier.get_mood_recommendations(mood)
+    queries = SEARCH_QUERIES.get(mood, ['bollywood'])
+
+    # Collect MANY candidates (we'll filter strictly)
+    all_candidates = []
+
+    # All searches go out at once; a slow query only drops its own results
+    with metrics.span('spotify_search'):
+        search_results = spotify_client.search_tracks_many(
+            queries, limit=_search_limit(limit, queries), market='IN'
+        )
+
+    for query in queries:
+        if query not in search_results:
+            continue
+        items = search_results[query]
+        all_candidates.extend(items)
+        logger.debug("Searched %r: %d songs", query, len(items))
+
+    logger.info("Total candidates: %d", len(all_candidates))
+
+    # Fetch audio features for every candidate in bulk (100 IDs per call)
+    with metrics.span('audio_features_lookup'):
+        features_by_id = spotify_client.get_audio_features_batch(
+            [track['id'] for track in all_candidates]
+        )
+    if track_index is not None:
+        track_index.add_many(all_candidates, features_by_id)
+
+    # Strict mood check for every candidate at once
+    scored_ids = [tid for tid, features in features_by_id.items() if features]
+    matches = mood_classifier.mood_matches(
+        np.array([features_by_id[tid]['valence'] for tid in scored_ids], dtype=float),
+        np.array([features_by_id[tid]['energy'] for tid in scored_ids], dtype=float)
+    ).get(mood, np.zeros(len(scored_ids), dtype=bool))
+    passes_by_id = dict(zip(scored_ids, matches.tolist()))
+
+    # Strictly filter using audio features
+    verified_tracks = []
+    verified_ids = set()
+    checked = 0
+    rejected = 0
+
+    for track in all_candidates:
+        if len(verified_tracks) >= limit:
+            break
+
+        # Skip duplicates
+        if track['id'] in verified_ids:
+            continue
+
+        checked += 1
+
+        try:
+            features = features_by_id.get(track['id'])
+
+            if not features:
+                rejected += 1
+                continue
+
+            valence = features['valence']
+            energy = features['energy']
+            tempo = features['tempo']
+
+            if passes_by_id[track['id']]:
+                verified_tracks.append(track)
+                verified_ids.add(track['id'])
+                logger.debug("Accepted %s | V:%.2f E:%.2f T:%.0f", track['name'], valence, energy, tempo)
+            else:
+                rejected += 1
+                logger.debug("Rejected %s | V:%.2f E:%.2f", track['name'], valence, energy)
+
+        except Exception:
+            rejected += 1
+            continue
+
+    logger.info("Checked: %d, passed: %d, rejected: %d", checked, len(verified_tracks), rejected)
+
+    # If we have enough verified tracks, use them
+    if len(verified_tracks) >= limit * 3 // 4:
+        tracks = verified_tracks[:limit]
+        logger.info("Using %d strictly verified songs", len(tracks))
+        return tracks
+
+    # Not enough strict matches, use Spotify Recommendations API with strict filters
+    logger.info("Only %d strict matches, using Spotify Recommendations API", len(verified_tracks))
+
+    try:
+        # Get seed from verified tracks or search
+        if verified_tracks:
+            seed_ids = [t['id'] for t in verified_tracks[:5]]
+        elif search_results.get(queries[0]):
+            # The top hits of the first query are already in hand
+            seed_ids = [t['id'] for t in search_results[queries[0]][:5]]
+        else:
+            search_result = spotify_client.call_with_timeout(
+                spotify_client.sp.search, q=queries[0], type='track', limit=5, market='IN'
+            )
+            if not search_result:
+                raise RuntimeError('Seed search failed')
+            seed_ids = [t['id'] for t in search_result['tracks']['items']][:5]
+
+        # Use Spotify recommendations with MIN/MAX constraints
+        rec_params = {
+            'seed_tracks': seed_ids,
+            'target_valence': targets['valence'],
+            'target_energy': targets['energy'],
+            'target_tempo': targets['tempo'],
+            'limit': min(limit, 100)
+        }
+        rec_params.update(_strict_limits(mood))
+
+        with metrics.span('spotify_recommendations'):
+            recommendations = spotify_client.call_with_timeout(
+                spotify_client.sp.recommendations, **rec_params
+            )
+        if not recommendations:
+            raise RuntimeError('Recommendations request failed or timed out')
+        api_tracks = recommendations['tracks']
+
+        # Combine verified + API tracks
+        all_final = verified_tracks + api_tracks
+
+        # Remove duplicates
+        seen = set()
+        unique = []
+        for track in all_final:
+            if track['id'] not in seen:
+                seen.add(track['id'])
+                unique.append(track)
+
+        tracks = unique[:limit]
+        logger.info("Combined: %d songs", len(tracks))
+        return tracks
+
+    except Exception as e:
+        logger.warning("Recommendations API error: %s", e)
+        metrics.error('spotify_recommendations')
+        # Last resort: use what we have
+        if verified_tracks or not allow_unverified:
+            return verified_tracks[:limit]
+        return all_candidates[:limit]
+
+
+def recommend_from_index(track_index, mood_classifier, mood, features=None, limit=20):
+    """Nearest indexed tracks to a song's features or the mood's targets.
+
+    Neighbours are searched around ``features`` (e.g. an uploaded song's
+    valence, energy and tempo) when given, otherwise around the mood's
+    target features, and must still pass the mood's strict check. Returns
+    None when the index can't yet supply ``limit * 3 // 4`` such tracks.
+    """
+    if mood not in MOOD_THRESHOLDS or len(track_index) < limit:
+        return None
+
+    target = features or mood_classifier.get_mood_recommendations(mood)
+    with metrics.span('index_query'):
+        neighbours = track_index.query(target, k=limit * 3)
+    passes = mood_classifier.mood_matches(
+        np.array([f.get('valence', np.nan) for _, f in neighbours], dtype=float),
+        np.array([f.get('energy', np.nan) for _, f in neighbours], dtype=float)
+    )[mood]
+    tracks = [track for (track, _), ok in zip(neighbours, passes) if ok]
+    if len(tracks) < limit * 3 // 4:
+        return None
+    return tracks[:limit]
+
+
+def format_track(track):
+    """Shape a Spotify track object for the API response"""
+    return {
+        'id': track['id'],
+        'name': track['name'],
+        'artist': ', '.join([artist['name'] for artist in track['artists']]),
+        'album': track['album']['name'],
+        'preview_url': track['preview_url'],
+        'spotify_url': track['external_urls']['spotify'],
+        'image': track['album']['images'][0]['url'] if track['album']['images'] else None
+    }
+
+
+class RecommendationPool:
+    """Keeps a verified pool of tracks per mood warm in the background.
+
+    A daemon thread rebuilds every mood's pool with ``build_recommendations``
+    each ``refresh_interval`` seconds, so requests can sample from memory
+    instead of waiting on Spotify. A failed refresh keeps the previous pool.
+    With a ``shared`` cache, refreshed pools are published to it and pools
+    that are cold or stale are read from it, so only one worker process
+    needs to run the refresh thread.
+    """
+
+    def __init__(self, spotify_client, mood_classifier, pool_size=60,
+                 refresh_interval=30 * 60, moods=None, track_index=None, shared=None):
+        self.spotify_client = spotify_client
+        self.shared = shared
+        self.mood_classifier = mood_classifier
+        self.track_index = track_index
+        self.pool_size = pool_size
+        self.refresh_interval = refresh_interval
+        self.moods = moods or list(MOOD_THRESHOLDS)
+        self._pools = {}
+        self._refreshed_at = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='recommendation-pool', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh(self, mood):
+        """Rebuild the pool for one mood"""
+        try:
+            # Unchecked search hits would be served for a whole interval,
+            # so without verified tracks the previous pool stays
+            tracks = build_recommendations(
+                self.spotify_client, self.mood_classifier, mood,
+                limit=self.pool_size, track_index=self.track_index, allow_unverified=False
+            )
+            if self.track_index is not None:
+                self.track_index.save()
+        except Exception as e:
+            logger.warning("Pool refresh failed for %s: %s", mood, e)
+            metrics.error('pool_refresh')
+            return
+
+        if not tracks:
+            logger.warning("Pool refresh for %s found no verified tracks, keeping the previous pool", mood)
+            metrics.error('pool_refresh')
+            return
+
+        refreshed_at = time.time()
+        with self._lock:
+            self._pools[mood] = tracks
+            self._refreshed_at[mood] = refreshed_at
+        if self.shared is not None:
+            self.shared.set(mood, (tracks, refreshed_at), ttl=self.refresh_interval * 2)
+
+    def sample(self, mood, k=20):
+        """Random sample of up to ``k`` pooled tracks, or None if the pool is cold"""
+        with self._lock:
+            pool = self._pools.get(mood)
+            refreshed_at = self._refreshed_at.get(mood, 0)
+        if self.shared is not None and time.time() - refreshed_at > self.refresh_interval:
+            pool = self._load_shared(mood) or pool
+        if not pool:
+            return None
+        return random.sample(pool, min(k, len(pool)))
+
+    def _load_shared(self, mood):
+        entry = self.shared.get(mood)
+        if entry is None:
+            return None
+        tracks, refreshed_at = entry
+        with self._lock:
+            if refreshed_at > self._refreshed_at.get(mood, 0):
+                self._pools[mood] = tracks
+                self._refreshed_at[mood] = refreshed_at
+            return self._pools.get(mood)
+
+    def stats(self):
+        with self._lock:
+            return {
+                mood: {
+                    'size': len(self._pools.get(mood, [])),
+                    'refreshed_at': self._refreshed_at.get(mood)
+                }
+                for mood in self.moods
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            for mood in self.moods:
+                if self._stop.is_set():
+                    return
+                self.refresh(mood)
+            self._stop.wait(self.refresh_interval)
@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+FADE_IN_MS = 2000
+FADE_OUT_MS = 3000
+OUTPUT_FRAME_RATE = 44100
+
+_SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def decode_audio(input_path):
+    """Decode a file once into a float32 ``(frames, channels)`` array.
+
+    Returns the samples scaled to [-1, 1) and the source frame rate.
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(input_path)
+    if audio.sample_width not in _SAMPLE_DTYPES:
+        audio = audio.set_sample_width(4)
+
+    pcm = np.frombuffer(audio.raw_data, dtype=_SAMPLE_DTYPES[audio.sample_width])
+    samples = pcm.reshape(-1, audio.channels).astype(np.float32)
+    samples *= 1.0 / (1 << (8 * audio.sample_width - 1))
+    return samples, audio.frame_rate
+
+
+class DecodeCache:
+    """Decoded PCM of recently remixed inputs, bounded to ``max_bytes``.
+
+    Entries are keyed by path, modification time and size, so a file
+    replaced on disk is decoded afresh. Cached arrays are read-only;
+    ``render`` never writes to its input, so every mood can share them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, input_path, decode=decode_audio):
+        """Decoded ``(samples, frame_rate)`` for a file, decoding it on a miss"""
+        stat = os.stat(input_path)
+        key = (os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        samples, frame_rate = decode(input_path)
+        samples.flags.writeable = False
+        entry = (samples, frame_rate)
+        if samples.nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = entry
+                    self.size += samples.nbytes
+                while self.size > self.max_bytes:
+                    _, (dropped, _) = self._entries.popitem(last=False)
+                    self.size -= dropped.nbytes
+        return entry
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def render(samples, frame_rate, speed=1.0, volume_change=0):
+    """Apply a speed change, gain and fades to decoded samples.
+
+    ``samples`` is left untouched and a new array is returned, so one
+    decode can feed several renders. A speed change replays the audio at
+    ``frame_rate * speed`` (tempo and pitch move together) and resamples
+    it to ``OUTPUT_FRAME_RATE`` in a single interpolation pass, matching the
+    old pydub frame-rate override followed by ``set_frame_rate``. Returns the
+    samples and their frame rate.
+    """
+    if speed != 1.0:
+        step = frame_rate * speed / OUTPUT_FRAME_RATE
+        n_out = int(len(samples) / step)
+        positions = np.arange(n_out) * step
+        source = np.arange(len(samples))
+        resampled = np.empty((n_out, samples.shape[1]), dtype=np.float32)
+        for channel in range(samples.shape[1]):
+            resampled[:, channel] = np.interp(positions, source, samples[:, channel])
+        samples, frame_rate = resampled, OUTPUT_FRAME_RATE
+    else:
+        samples = samples.copy()
+
+    # Gain commutes with the linear resampling, so it is applied to the copy
+    if volume_change:
+        samples *= np.float32(10 ** (volume_change / 20))
+
+    apply_fades(samples, frame_rate)
+    return samples, frame_rate
+
+
+def apply_fades(samples, frame_rate, fade_in_ms=FADE_IN_MS, fade_out_ms=FADE_OUT_MS):
+    """Linear fade-in and fade-out envelopes, applied in place"""
+    fade_in = min(len(samples), int(frame_rate * fade_in_ms / 1000))
+    fade_out = min(len(samples), int(frame_rate * fade_out_ms / 1000))
+    if fade_in:
+        samples[:fade_in] *= np.linspace(0.0, 1.0, fade_in, endpoint=False, dtype=np.float32)[:, None]
+    if fade_out:
+        samples[-fade_out:] *= np.linspace(1.0, 0.0, fade_out, endpoint=False, dtype=np.float32)[:, None]
+
+
+def encode_audio(samples, frame_rate, output_path, format='mp3'):
+    """Clip to 16-bit PCM and encode once"""
+    from pydub import AudioSegment
+
+    np.clip(samples, -1.0, 1.0, out=samples)
+    pcm = (samples * 32767).astype(np.int16)
+    audio = AudioSegment(
+        data=pcm.tobytes(),
+        sample_width=2,
+        frame_rate=frame_rate,
+        channels=samples.shape[1]
+    )
+    audio.export(output_path, format=format)
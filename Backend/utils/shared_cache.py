@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+logger = logging.getLogger(__name__)
+
+# Where preforked workers find the cache server; set by serve.py
+ADDRESS_ENV = 'MOODTUNE_SHARED_CACHE'
+AUTHKEY_ENV = 'MOODTUNE_SHARED_CACHE_KEY'
+
+# After a failed call, go without the shared tier for this long
+RETRY_SECONDS = 5.0
+
+
+class _Store:
+    """Bounded LRU per namespace, living in the cache server process"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace, keys):
+        """Values of the ``keys`` present and unexpired, as a dict"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is None:
+                return found
+            for key in keys:
+                entry = entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= now:
+                    del entries[key]
+                    continue
+                entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, namespace, items, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            for key, value in items.items():
+                entries[key] = (value, expires_at)
+                entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {namespace: len(entries) for namespace, entries in self._namespaces.items()}
+
+
+_server_store = None
+
+
+def _init_server(max_entries):
+    global _server_store
+    _server_store = _Store(max_entries)
+
+
+def _get_server_store():
+    return _server_store
+
+
+class _Manager(BaseManager):
+    pass
+
+
+class _ServerManager(BaseManager):
+    pass
+
+
+_Manager.register('store')
+_ServerManager.register('store', callable=_get_server_store)
+
+
+def start_server(max_entries=100000):
+    """Start the cache server process on a local socket.
+
+    Its address and key are put in the environment, so worker processes
+    started afterwards connect to it. Returns the running manager.
+    """
+    authkey = os.urandom(16)
+    manager = _ServerManager(address=('127.0.0.1', 0), authkey=authkey)
+    manager.start(_init_server, (max_entries,))
+    host, port = manager.address
+    os.environ[ADDRESS_ENV] = f"{host}:{port}"
+    os.environ[AUTHKEY_ENV] = authkey.hex()
+    return manager
+
+
+class SharedCache:
+    """One namespace of the cache server, shared by every worker process.
+
+    With no server configured (the single-process development server) the
+    cache is disabled: lookups miss and writes are dropped. Errors talking
+    to the server are treated the same way for ``RETRY_SECONDS`` so a dead
+    server slows nothing down.
+    """
+
+    def __init__(self, namespace, address=None, authkey=None, ttl=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        address = address or os.environ.get(ADDRESS_ENV)
+        if address and isinstance(address, str):
+            host, port = address.rsplit(':', 1)
+            address = (host, int(port))
+        self._address = address
+        if authkey is None and os.environ.get(AUTHKEY_ENV):
+            authkey = bytes.fromhex(os.environ[AUTHKEY_ENV])
+        self._authkey = authkey
+        self._store = None
+        self._pid = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._address is not None
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = self._call('get_many', self.namespace, keys)
+        found = found or {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items, ttl=None):
+        if items:
+            self._call('set_many', self.namespace, items, ttl or self.ttl)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors
+        }
+
+    def _call(self, method, *args):
+        if self._address is None or time.time() < self._down_until:
+            return None
+        try:
+            return getattr(self._connect(), method)(*args)
+        except Exception as e:
+            logger.warning("Shared cache unavailable: %s", str(e) or type(e).__name__)
+            self.errors += 1
+            self._down_until = time.time() + RETRY_SECONDS
+            with self._lock:
+                self._store = None
+            return None
+
+    def _connect(self):
+        # Connections don't survive fork; each process opens its own
+        with self._lock:
+            if self._store is None or self._pid != os.getpid():
+                manager = _Manager(address=self._address, authkey=self._authkey)
+                manager.connect()
+                self._store = manager.store()
+                self._pid = os.getpid()
+            return self._store
@@ -1,31 +1,464 @@
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from config import Config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Spotify accepts at most 100 IDs per audio-features request
+AUDIO_FEATURES_BATCH_SIZE = 100
+
+# Bounded pool for fanning out independent API calls, and how long a single
+# call may take before the caller gives up on it and uses partial results
+API_POOL_WORKERS = 8
+API_CALL_TIMEOUT = 5.0
+
+# Client-side request budget; see utils.spotify_transport for 429 handling
+RATE_LIMIT_PER_SECOND = 10.0
+RATE_LIMIT_BURST = 20
+
+# The SQLite tier is trimmed after this many rows were written, not on
+# every write
+DB_PRUNE_EVERY = 1000
+
+_MISSING = object()
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every Spotify API call"""
+    
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    delay = self._paused_until - now
+            time.sleep(delay)
+    
+    def pause(self, seconds):
+        """Hold every caller back for ``seconds`` (e.g. a Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+class RequestCoalescer:
+    """Lets identical concurrent requests share one upstream call.
+
+    The first caller for a key runs the call; callers arriving while it is
+    in flight wait for and receive the same result (or exception).
+    """
+    
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def run(self, key, fn):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {'done': threading.Event()}
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call['done'].set()
+
+
+class FeatureCache:
+    """Two-tier cache for track audio features.
+
+    Tier one is an in-process LRU bounded by ``max_entries``; tier two is an
+    optional SQLite file that survives restarts. Entries expire after ``ttl``
+    seconds; tracks Spotify has no features for are remembered as ``None``
+    for the shorter ``negative_ttl``. An optional ``shared`` cache sits
+    between the two so worker processes see each other's lookups without
+    going to disk.
+    """
+    
+    def __init__(self, max_entries=10000, ttl=30 * 24 * 3600, negative_ttl=3600,
+                 db_path=None, max_db_entries=200000, shared=None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_db_entries = max_db_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_writes = 0
+        
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS track_features ('
+                'track_id TEXT PRIMARY KEY, features TEXT, expires_at REAL)'
+            )
+            self._db.commit()
+    
+    def get(self, track_id):
+        """Return cached features (possibly None), or _MISSING on a miss"""
+        return self.get_many([track_id]).get(track_id, _MISSING)
+    
+    def get_many(self, track_ids):
+        """Cached features of whichever ``track_ids`` are cached, as a dict"""
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for track_id in track_ids:
+                entry = self._entries.get(track_id)
+                if entry is not None:
+                    features, expires_at = entry
+                    if expires_at > now:
+                        self._entries.move_to_end(track_id)
+                        self.hits += 1
+                        found[track_id] = features
+                        continue
+                    del self._entries[track_id]
+                missing.append(track_id)
+        
+        # One round trip for everything the shared tier might have
+        if missing and self.shared is not None:
+            shared = self.shared.get_many(missing)
+            with self._lock:
+                for track_id, (features, expires_at) in shared.items():
+                    if expires_at > now:
+                        self._remember(track_id, features, expires_at)
+                        self.hits += 1
+                        found[track_id] = features
+            missing = [track_id for track_id in missing if track_id not in found]
+        
+        for track_id in missing:
+            features = self._get_disk(track_id, now)
+            if features is not _MISSING:
+                found[track_id] = features
+        return found
+    
+    def _get_disk(self, track_id, now):
+        with self._lock:
+            row = None
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        'SELECT features, expires_at FROM track_features WHERE track_id = ?',
+                        (track_id,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    # E.g. locked by another worker: a miss, not a failure
+                    logger.warning("Feature cache read failed: %s", e)
+                    metrics.error('feature_cache_db')
+                if row and row[1] > now:
+                    features = json.loads(row[0])
+                    self._remember(track_id, features, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return features
+            
+            self.misses += 1
+            return _MISSING
+    
+    def set(self, track_id, features):
+        self.set_many({track_id: features})
+    
+    def set_many(self, features_by_id):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for track_id, features in features_by_id.items():
+                ttl = self.ttl if features else self.negative_ttl
+                self._remember(track_id, features, now + ttl)
+                rows.append((track_id, json.dumps(features), now + ttl))
+            
+            if self.shared is not None and rows:
+                self.shared.set_many({
+                    track_id: (features_by_id[track_id], expires_at)
+                    for track_id, _, expires_at in rows
+                }, ttl=self.ttl)
+            
+            if self._db is not None and rows:
+                # The features are already in memory; losing the disk copy
+                # only costs a refetch after a restart
+                try:
+                    self._db.executemany(
+                        'INSERT OR REPLACE INTO track_features VALUES (?, ?, ?)', rows
+                    )
+                    self._db_writes += len(rows)
+                    if self._db_writes >= DB_PRUNE_EVERY:
+                        self._prune_db(now)
+                        self._db_writes = 0
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Feature cache write failed: %s", e)
+                    metrics.error('feature_cache_db')
+                    self._db.rollback()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _remember(self, track_id, features, expires_at):
+        self._entries[track_id] = (features, expires_at)
+        self._entries.move_to_end(track_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _prune_db(self, now):
+        self._db.execute('DELETE FROM track_features WHERE expires_at <= ?', (now,))
+        count = self._db.execute('SELECT COUNT(*) FROM track_features').fetchone()[0]
+        if count > self.max_db_entries:
+            self._db.execute(
+                'DELETE FROM track_features WHERE track_id IN ('
+                'SELECT track_id FROM track_features ORDER BY expires_at LIMIT ?)',
+                (count - self.max_db_entries,)
+            )
+
 
 class SpotifyClient:
-    def __init__(self, use_oauth=False):
-        if use_oauth:
-            self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
+    def __init__(self, use_oauth=False, feature_cache=None,
+                 pool_workers=API_POOL_WORKERS, call_timeout=API_CALL_TIMEOUT,
+                 rate_limit=RATE_LIMIT_PER_SECOND, rate_burst=RATE_LIMIT_BURST,
+                 api_prefix=None, access_token=None, token_cache=None):
+        """``api_prefix`` and ``access_token`` point the client at another
+        server (such as a local fake) with a fixed token instead of OAuth.
+        ``token_cache`` is a ``SharedCache`` for the client-credentials token.
+        """
+        self.feature_cache = feature_cache if feature_cache is not None else FeatureCache()
+        self.call_timeout = call_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_workers, thread_name_prefix='spotify'
+        )
+        self.limiter = TokenBucket(rate_limit, rate_burst)
+        self.coalescer = RequestCoalescer()
+        self._use_oauth = use_oauth
+        self._transport = dict(
+            limiter=self.limiter, coalescer=self.coalescer,
+            pool_size=pool_workers, prefix=api_prefix
+        )
+        self._access_token = access_token
+        self._token_cache = token_cache
+        self._sp = None
+        self._sp_lock = threading.Lock()
+    
+    @property
+    def sp(self):
+        """The spotipy client, built (and spotipy imported) on first use"""
+        if self._sp is None:
+            with self._sp_lock:
+                if self._sp is None:
+                    self._sp = self._build_spotify()
+        return self._sp
+    
+    @property
+    def ready(self):
+        return self._sp is not None
+    
+    def _build_spotify(self):
+        from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
+        from utils.spotify_transport import PooledSpotify, SharedTokenCache
+        
+        if self._access_token:
+            return PooledSpotify(auth=self._access_token, **self._transport)
+        if self._use_oauth:
+            return PooledSpotify(auth_manager=SpotifyOAuth(
                 client_id=Config.SPOTIFY_CLIENT_ID,
                 client_secret=Config.SPOTIFY_CLIENT_SECRET,
                 redirect_uri=Config.SPOTIFY_REDIRECT_URI,
                 scope="user-library-read user-top-read playlist-modify-public"
-            ))
-        else:
-            self.sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-                client_id=Config.SPOTIFY_CLIENT_ID,
-                client_secret=Config.SPOTIFY_CLIENT_SECRET
-            ))
+            ), **self._transport)
+        cache_handler = None
+        if self._token_cache is not None and self._token_cache.enabled:
+            cache_handler = SharedTokenCache(self._token_cache)
+        return PooledSpotify(auth_manager=SpotifyClientCredentials(
+            client_id=Config.SPOTIFY_CLIENT_ID,
+            client_secret=Config.SPOTIFY_CLIENT_SECRET,
+            cache_handler=cache_handler
+        ), **self._transport)
+    
+    def stats(self):
+        return {
+            'coalesced': self.coalescer.coalesced,
+            'rate_limited': self._sp.rate_limited if self._sp is not None else 0
+        }
     
     def get_audio_features(self, track_id):
         """Get audio features for a track"""
+        cached = self.feature_cache.get(track_id)
+        if cached is not _MISSING:
+            return cached
+        
         try:
             features = self.sp.audio_features([track_id])[0]
+            self.feature_cache.set(track_id, features)
             return features
         except Exception as e:
-            print(f"Error fetching audio features: {e}")
+            logger.warning("Error fetching audio features: %s", e)
+            metrics.error('audio_features')
             return None
     
+    def get_audio_features_batch(self, track_ids):
+        """Get audio features for many tracks, up to 100 IDs per API call.
+
+        Returns a dict mapping each track ID to its features (or None when
+        Spotify has no features for it or the batch request failed). Cached
+        tracks are answered locally; only the misses go to the network.
+        """
+        unique_ids = list(dict.fromkeys(tid for tid in track_ids if tid))
+        features_by_id = {}
+        missing_ids = []
+        
+        cached = self.feature_cache.get_many(unique_ids)
+        for track_id in unique_ids:
+            if track_id in cached:
+                features_by_id[track_id] = cached[track_id]
+            else:
+                missing_ids.append(track_id)
+        
+        for start in range(0, len(missing_ids), AUDIO_FEATURES_BATCH_SIZE):
+            chunk = missing_ids[start:start + AUDIO_FEATURES_BATCH_SIZE]
+            try:
+                results = self.sp.audio_features(chunk) or []
+            except Exception as e:
+                logger.warning("Error fetching audio features batch: %s", e)
+                metrics.error('audio_features')
+                # Leave failed lookups uncached so they are retried next time
+                features_by_id.update({track_id: None for track_id in chunk})
+                continue
+            
+            fetched = {
+                track_id: results[i] if i < len(results) else None
+                for i, track_id in enumerate(chunk)
+            }
+            self.feature_cache.set_many(fetched)
+            features_by_id.update(fetched)
+        
+        return features_by_id
+    
+    def run_concurrently(self, calls, timeout=None):
+        """Run independent API calls at the same time on the shared pool.
+
+        ``calls`` maps a key to a zero-argument callable. Returns a dict with
+        the result of every call that finished in time; calls that fail or
+        run late are reported and left out, so one slow request never stalls
+        the rest. Each call gets ``timeout`` seconds from when it starts, so
+        calls queued behind a busy pool are not charged for the wait; those
+        still queued after ``timeout`` seconds without any call starting are
+        dropped too.
+        """
+        timeout = self.call_timeout if timeout is None else timeout
+        started = {}
+        # When the pool last picked up one of these calls
+        last_start = [time.monotonic()]
+
+        def timed(key, fn):
+            started[key] = last_start[0] = time.monotonic()
+            return fn()
+
+        def deadline(future):
+            key = futures[future]
+            if key in started:
+                return started[key] + timeout
+            # Still queued: given up only once no call has started for a while
+            return last_start[0] + timeout
+
+        futures = {
+            self._executor.submit(timed, key, fn): key for key, fn in calls.items()
+        }
+
+        results = {}
+        pending = set(futures)
+        while pending:
+            next_deadline = min(deadline(future) for future in pending)
+            done, pending = wait(pending, timeout=max(0, next_deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logger.warning("API call %r failed: %s", key, e)
+                    metrics.error('spotify_call')
+
+            now = time.monotonic()
+            for future in [f for f in pending if deadline(f) <= now]:
+                key = futures[future]
+                pending.discard(future)
+                future.cancel()
+                if key in started:
+                    logger.warning("API call %r timed out after %ss", key, timeout)
+                else:
+                    logger.warning("API call %r never started; the pool was stuck for %ss", key, timeout)
+                metrics.error('spotify_timeout')
+
+        return results
+    
+    def call_with_timeout(self, fn, *args, timeout=None, **kwargs):
+        """Run a single API call with a timeout; returns None if it fails"""
+        results = self.run_concurrently({'call': lambda: fn(*args, **kwargs)}, timeout)
+        return results.get('call')
+    
+    def search_tracks_many(self, queries, limit=20, market=None, timeout=None):
+        """Search several queries concurrently.
+
+        Returns a dict mapping each query that answered in time to its list
+        of track items.
+        """
+        calls = {
+            query: (lambda q=query: self.sp.search(q=q, type='track', limit=limit, market=market))
+            for query in dict.fromkeys(queries)
+        }
+        results = self.run_concurrently(calls, timeout)
+        return {query: result['tracks']['items'] for query, result in results.items()}
+    
     def search_track(self, query):
         """Search for a track"""
         try:
@@ -34,7 +467,7 @@ class SpotifyClient:
                 return results['tracks']['items'][0]
             return None
         except Exception as e:
-            print(f"Error searching track: {e}")
+            logger.warning("Error searching track: %s", e)
             return None
     
     def get_seed_tracks_by_mood(self, mood):
@@ -54,7 +487,7 @@ class SpotifyClient:
             track_ids = [track['id'] for track in results['tracks']['items']]
             return track_ids[:5]  # Spotify allows max 5 seeds
         except Exception as e:
-            print(f"Error getting seed tracks: {e}")
+            logger.warning("Error getting seed tracks: %s", e)
             # Fallback to popular tracks
             return self.get_popular_seed_tracks()
     
@@ -66,7 +499,7 @@ class SpotifyClient:
             track_ids = [track['id'] for track in results['tracks']['items']]
             return track_ids[:5]
         except Exception as e:
-            print(f"Error getting popular seeds: {e}")
+            logger.warning("Error getting popular seeds: %s", e)
             # Hard-coded fallback seeds (popular tracks that usually exist)
             return [
                 '3n3Ppam7vgaVa1iaRUc9Lp',  # Mr. Brightside - The Killers
@@ -92,8 +525,9 @@ class SpotifyClient:
             # Spotify API requires at least one seed
             seed_tracks = seed_tracks[:5]  # Max 5 seeds allowed
             
-            print(f"Using seed tracks: {seed_tracks}")
-            print(f"Target values - Valence: {target_valence}, Energy: {target_energy}, Tempo: {target_tempo}")
+            logger.info("Using seed tracks: %s", seed_tracks)
+            logger.info("Target values - valence: %s, energy: %s, tempo: %s",
+                        target_valence, target_energy, target_tempo)
             
             # Get recommendations with seeds AND target values
             recommendations = self.sp.recommendations(
@@ -106,7 +540,7 @@ class SpotifyClient:
             
             return recommendations['tracks']
         except Exception as e:
-            print(f"Error getting recommendations: {e}")
+            logger.warning("Error getting recommendations: %s", e)
             # Try without target values as fallback
             try:
                 recommendations = self.sp.recommendations(
@@ -115,5 +549,5 @@ class SpotifyClient:
                 )
                 return recommendations['tracks']
             except Exception as e2:
-                print(f"Fallback also failed: {e2}")
+                logger.warning("Fallback also failed: %s", e2)
                 return []
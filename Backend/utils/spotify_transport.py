@@ -0,0 +1,112 @@
+"""spotipy transport used by ``SpotifyClient``.
+
+Kept apart from ``utils.spotify_client`` so spotipy and requests are only
+imported when the first Spotify call is made.
+"""
+import json
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheHandler, MemoryCacheHandler
+from spotipy.exceptions import SpotifyException
+from urllib3.util.retry import Retry
+from utils import metrics
+
+# A 429 empties the shared token bucket for the server's Retry-After
+# (capped at MAX_RETRY_AFTER) and the call is retried
+RATE_LIMIT_RETRIES = 3
+MAX_RETRY_AFTER = 30.0
+
+# Transient server errors are retried by the connection pool itself; 429 is
+# left to the rate limiter so the whole client backs off, not one call
+SERVER_ERROR_CODES = (500, 502, 503, 504)
+
+
+class SharedTokenCache(CacheHandler):
+    """Client-credentials token kept in a ``SharedCache``, so every worker
+    process reuses the token the first one fetched. Falls back to memory
+    when the shared cache has nothing or is unreachable."""
+    
+    KEY = 'client_credentials'
+    
+    def __init__(self, shared):
+        self.shared = shared
+        self.local = MemoryCacheHandler()
+    
+    def get_cached_token(self):
+        return self.local.get_cached_token() or self.shared.get(self.KEY)
+    
+    def save_token_to_cache(self, token_info):
+        self.local.save_token_to_cache(token_info)
+        self.shared.set(self.KEY, token_info)
+
+
+class PooledSpotify(spotipy.Spotify):
+    """``spotipy.Spotify`` over a sized keep-alive pool with rate limiting.
+
+    Every request takes a token from ``limiter``; a 429 pauses the limiter
+    for the Retry-After and the request is retried. Identical concurrent GET
+    requests are coalesced into one upstream call.
+    """
+    
+    def __init__(self, limiter, coalescer, pool_size=8,
+                 rate_limit_retries=RATE_LIMIT_RETRIES, prefix=None, **kwargs):
+        self.limiter = limiter
+        self.coalescer = coalescer
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limited = 0
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=3, connect=None, read=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                status=3, backoff_factor=0.3, status_forcelist=SERVER_ERROR_CODES,
+                respect_retry_after_header=False
+            )
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        super().__init__(requests_session=session, status_forcelist=SERVER_ERROR_CODES, **kwargs)
+        if prefix:
+            self.prefix = prefix
+    
+    def _internal_call(self, method, url, payload, params):
+        if method != 'GET':
+            return self._limited_call(method, url, payload, params)
+        key = (url, json.dumps(params, sort_keys=True, default=str))
+        return self.coalescer.run(key, lambda: self._limited_call(method, url, payload, params))
+    
+    def _limited_call(self, method, url, payload, params):
+        for attempt in range(self.rate_limit_retries + 1):
+            self.limiter.acquire()
+            path = url[len(self.prefix):] if url.startswith(self.prefix) else url
+            endpoint = path.split('?')[0].split('/')[0]
+            try:
+                # spotipy pops keys off params, so every attempt gets a copy
+                result = super()._internal_call(method, url, payload, dict(params))
+                metrics.inc('moodtune_upstream_calls_total', endpoint=endpoint, status='ok')
+                return result
+            except SpotifyException as e:
+                metrics.inc('moodtune_upstream_calls_total', endpoint=endpoint, status=e.http_status)
+                if e.http_status != 429:
+                    raise
+                self.rate_limited += 1
+                retry_after = _retry_after(e.headers)
+                self.limiter.pause(min(retry_after, MAX_RETRY_AFTER))
+                if attempt == self.rate_limit_retries or retry_after > MAX_RETRY_AFTER:
+                    raise
+            except Exception as e:
+                # Connection errors, timeouts and retries given up on
+                metrics.inc('moodtune_upstream_calls_total', endpoint=endpoint, status=type(e).__name__)
+                raise
+
+
+def _retry_after(headers):
+    try:
+        return max(0.0, float((headers or {}).get('Retry-After', 1)))
+    except (TypeError, ValueError):
+        return 1.0
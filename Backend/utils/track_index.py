@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Audio features stored per track, in column order. Tempo is divided by
+# TEMPO_SCALE so every column sits roughly in [0, 1] and no single feature
+# dominates the distance.
+FEATURE_KEYS = ('valence', 'energy', 'tempo', 'danceability', 'acousticness')
+TEMPO_SCALE = 200.0
+
+# Only the fields format_track needs are kept for each indexed track
+_TRACK_FIELDS = ('id', 'name', 'artists', 'album', 'preview_url', 'external_urls')
+
+
+def _slim_track(track):
+    slim = {key: track.get(key) for key in _TRACK_FIELDS}
+    slim['artists'] = [{'name': artist['name']} for artist in track.get('artists') or []]
+    album = track.get('album') or {}
+    slim['album'] = {'name': album.get('name'), 'images': (album.get('images') or [])[:1]}
+    return slim
+
+
+class TrackIndex:
+    """Local nearest-neighbour index of tracks by audio features.
+
+    Features live in one contiguous float32 matrix that doubles in size as
+    tracks are added, and a query is a single vectorized distance pass plus
+    ``argpartition``, so hundreds of thousands of tracks answer in a few
+    milliseconds without touching Spotify. Re-adding a track updates its row
+    in place. With a ``path`` the index is loaded at start-up and ``save``
+    writes it back atomically.
+    """
+
+    def __init__(self, path=None, capacity=1024):
+        self.path = path
+        self._features = np.full((capacity, len(FEATURE_KEYS)), np.nan, dtype=np.float32)
+        self._tracks = []
+        self._rows = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except Exception as e:
+                logger.warning("Could not load track index from %s: %s", path, e)
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def add(self, track, features):
+        """Insert or update one track; returns False if it has no features"""
+        return self.add_many([track], {track['id']: features}) == 1
+
+    def add_many(self, tracks, features_by_id):
+        """Insert or update every track that has features; returns the count"""
+        added = 0
+        with self._lock:
+            for track in tracks:
+                features = features_by_id.get(track.get('id'))
+                if not features:
+                    continue
+                row = self._rows.get(track['id'])
+                if row is None:
+                    row = len(self._tracks)
+                    self._grow(row + 1)
+                    self._rows[track['id']] = row
+                    self._tracks.append(_slim_track(track))
+                self._features[row] = self._vector(features)
+                added += 1
+            self._dirty = self._dirty or added > 0
+        return added
+
+    def query(self, target, k=20, exclude=()):
+        """The ``k`` tracks closest to ``target``, nearest first.
+
+        ``target`` is a dict of audio features; only the keys it provides
+        are compared, so mood targets (valence, energy, tempo) and the
+        features of an uploaded song both work. Tracks missing one of those
+        features are skipped. Returns ``(track, features)`` pairs.
+        """
+        columns = [i for i, key in enumerate(FEATURE_KEYS) if target.get(key) is not None]
+        if not columns:
+            return []
+        point = self._vector(target)[columns]
+
+        with self._lock:
+            count = len(self._tracks)
+            matrix = self._features[:count, columns]
+            tracks = self._tracks
+            excluded = [self._rows[tid] for tid in exclude if tid in self._rows]
+
+        if not count:
+            return []
+
+        diff = matrix - point
+        distances = np.einsum('ij,ij->i', diff, diff)
+        distances[np.isnan(distances)] = np.inf
+        distances[excluded] = np.inf
+
+        k = min(k, count)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [
+            (tracks[row], self._row_features(row))
+            for row in nearest if np.isfinite(distances[row])
+        ]
+
+    def save(self, path=None):
+        """Write the index to ``path`` (or the one it was loaded from)"""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            if not self._dirty and path == self.path:
+                return
+            features = self._features[:len(self._tracks)].copy()
+            tracks = json.dumps(self._tracks)
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as out:
+            np.savez(out, features=features, tracks=np.array(tracks))
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        return {
+            'tracks': len(self._tracks),
+            'capacity': len(self._features)
+        }
+
+    def _load(self, path):
+        with np.load(path) as data:
+            features = data['features'].astype(np.float32)
+            tracks = json.loads(str(data['tracks']))
+        self._grow(len(tracks))
+        self._features[:len(tracks)] = features
+        self._tracks = tracks
+        self._rows = {track['id']: row for row, track in enumerate(tracks)}
+
+    def _grow(self, size):
+        capacity = len(self._features)
+        if size <= capacity:
+            return
+        capacity = max(capacity, 1)
+        while capacity < size:
+            capacity *= 2
+        grown = np.full((capacity, len(FEATURE_KEYS)), np.nan, dtype=np.float32)
+        grown[:len(self._tracks)] = self._features[:len(self._tracks)]
+        self._features = grown
+
+    def _row_features(self, row):
+        features = {}
+        for key, value in zip(FEATURE_KEYS, self._features[row].tolist()):
+            if value == value:
+                features[key] = value * TEMPO_SCALE if key == 'tempo' else value
+        return features
+
+    @staticmethod
+    def _vector(features):
+        vector = np.full(len(FEATURE_KEYS), np.nan, dtype=np.float32)
+        for i, key in enumerate(FEATURE_KEYS):
+            value = features.get(key)
+            if value is not None:
+                vector[i] = value / TEMPO_SCALE if key == 'tempo' else value
+        return vector
@@ -10,13 +10,14 @@ function App() {
   const [remixFilename, setRemixFilename] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  const handleAnalyze = async (file) => {
+  const handleAnalyze = async (file, options) => {
     setLoading(true);
     try {
-      const result = await analyzeAudio(file);
+      // A quick preliminary mood shows first; the full result replaces it
+      const result = await analyzeAudio(file, setMoodData, options);
       setMoodData(result);
 
-      const recs = await getRecommendations(result.mood);
+      const recs = await getRecommendations(result.mood, result.audio_features);
       setRecommendations(recs.recommendations);
     } catch (error) {
       console.error('Error:', error);
@@ -4,6 +4,7 @@ const FileUpload = ({ onAnalyze }) => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [isDragging, setIsDragging] = useState(false);
+  const [withTimeline, setWithTimeline] = useState(false);
 
   const handleFileSelect = (event) => {
     const file = event.target.files[0];
@@ -41,7 +42,7 @@ const FileUpload = ({ onAnalyze }) => {
 
     setIsAnalyzing(true);
     try {
-      await onAnalyze(selectedFile);
+      await onAnalyze(selectedFile, { timeline: withTimeline });
     } catch (error) {
       alert('Error analyzing file: ' + error.message);
     } finally {
@@ -102,6 +103,15 @@ const FileUpload = ({ onAnalyze }) => {
         </label>
       </div>
 
+      <label style={styles.option}>
+        <input
+          type="checkbox"
+          checked={withTimeline}
+          onChange={(e) => setWithTimeline(e.target.checked)}
+        />
+        Mood timeline (analyzes the whole track, takes longer)
+      </label>
+
       <button
         onClick={handleAnalyze}
         disabled={!selectedFile || isAnalyzing}
@@ -248,6 +258,16 @@ const styles = {
     fontWeight: '500',
     textDecoration: 'underline'
   },
+  option: {
+    display: 'flex',
+    alignItems: 'center',
+    justifyContent: 'center',
+    gap: '8px',
+    marginBottom: '20px',
+    fontSize: '14px',
+    color: '#666',
+    cursor: 'pointer'
+  },
   button: {
     position: 'relative',
     padding: '18px 50px',
@@ -174,6 +174,33 @@ const MoodDisplay = ({ moodData, onCreateRemix }) => {
             </div>
           </div>
         </div>
+
+        {moodData.timeline && moodData.timeline.length > 1 && (
+          <div style={styles.timelineBox}>
+            <div style={styles.featureLabel}>Mood Timeline</div>
+            <div style={styles.timelineBar}>
+              {moodData.timeline.map((segment) => (
+                <div
+                  key={segment.start}
+                  title={`${Math.floor(segment.start)}s–${Math.floor(segment.end)}s: ${segment.mood}`}
+                  style={{
+                    ...styles.timelineSegment,
+                    flexGrow: segment.end - segment.start,
+                    background: (moodColors[segment.mood] || moodColors.Calm).gradient
+                  }}
+                >
+                  {moodEmojis[segment.mood]}
+                </div>
+              ))}
+            </div>
+          </div>
+        )}
+        {moodData.timeline_error && (
+          <div style={styles.timelineBox}>
+            <div style={styles.featureLabel}>Mood Timeline</div>
+            <div style={styles.timelineError}>{moodData.timeline_error}</div>
+          </div>
+        )}
       </div>
 
       {/* Remix Button */}
@@ -426,6 +453,30 @@ const styles = {
     transition: 'width 1s cubic-bezier(0.175, 0.885, 0.32, 1.275)',
     animation: 'shimmer 2s ease-in-out infinite'
   },
+  timelineBox: {
+    marginTop: '25px',
+    textAlign: 'center'
+  },
+  timelineBar: {
+    display: 'flex',
+    height: '32px',
+    borderRadius: '8px',
+    overflow: 'hidden',
+    marginTop: '10px'
+  },
+  timelineError: {
+    marginTop: '10px',
+    fontSize: '14px',
+    color: '#999'
+  },
+  timelineSegment: {
+    flexBasis: 0,
+    display: 'flex',
+    alignItems: 'center',
+    justifyContent: 'center',
+    fontSize: '14px',
+    minWidth: 0
+  },
   tempoIndicator: {
     display: 'flex',
     justifyContent: 'center',
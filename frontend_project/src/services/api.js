@@ -2,9 +2,76 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:5000/api';
 
-export const analyzeAudio = async (file) => {
+// Errors from the fetch path in the shape the axios path throws: the
+// server's { error } body, or one carrying the network error's message
+const toApiError = (error) => (
+  error && error.error ? error : { error: error?.message || 'Network error' }
+);
+
+// Reads the server-sent events of a progressive analysis: calls
+// onPreliminary with the quick first-pass mood and resolves with the result
+const readAnalysisEvents = async (response, onPreliminary) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === 'preliminary') onPreliminary(payload);
+      else if (event === 'result') return payload;
+      else if (event === 'error') throw payload;
+    }
+  }
+  throw { error: 'Analysis stream ended early' };
+};
+
+export const analyzeAudio = async (file, onPreliminary, options = {}) => {
   const formData = new FormData();
   formData.append('file', file);
+  if (options.timeline) {
+    formData.append('timeline', '1');
+  }
+
+  if (onPreliminary && typeof fetch !== 'undefined' && typeof TextDecoder !== 'undefined') {
+    let response;
+    try {
+      response = await fetch(`${API_BASE_URL}/analyze?progressive=1`, {
+        method: 'POST',
+        body: formData
+      });
+    } catch (error) {
+      throw toApiError(error);
+    }
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!contentType.startsWith('text/event-stream')) {
+      const body = await response.json().catch(() => null);
+      if (!response.ok || !body) {
+        throw body?.error ? body : { error: `Server error (${response.status})` };
+      }
+      return body;
+    }
+    try {
+      return await readAnalysisEvents(response, onPreliminary);
+    } catch (error) {
+      throw toApiError(error);
+    }
+  }
   
   try {
     const response = await axios.post(`${API_BASE_URL}/analyze`, formData, {
@@ -18,22 +85,50 @@ export const analyzeAudio = async (file) => {
   }
 };
 
-export const getRecommendations = async (mood) => {
+export const getRecommendations = async (mood, audioFeatures) => {
   try {
-    const response = await axios.post(`${API_BASE_URL}/recommend`, { mood });
+    const response = await axios.post(`${API_BASE_URL}/recommend`, {
+      mood,
+      audio_features: audioFeatures
+    });
     return response.data;
   } catch (error) {
     throw error.response?.data || error;
   }
 };
 
-export const createRemix = async (filename, mood) => {
+const REMIX_POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export const getJob = async (jobId) => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || error;
+  }
+};
+
+export const createRemix = async (filename, mood, onProgress) => {
   try {
     const response = await axios.post(`${API_BASE_URL}/remix`, {
       filename,
       mood
     });
-    return response.data;
+    let job = response.data;
+
+    // Remixes render in the background; poll until the job settles
+    while (job.status === 'queued' || job.status === 'running') {
+      if (onProgress) onProgress(job);
+      await sleep(REMIX_POLL_INTERVAL_MS);
+      job = { ...job, ...(await getJob(job.job_id)) };
+    }
+
+    if (job.status === 'failed') {
+      throw { error: job.error || 'Remix failed' };
+    }
+    return { ...job, remix_filename: job.remix_filename || job.result };
   } catch (error) {
     throw error.response?.data || error;
   }